@@ -0,0 +1,332 @@
+"""
+Multiple sequence alignment with MAFFT.
+
+MAFFT writes the alignment to stdout; here stdout is streamed straight into the output
+file instead of being held in memory and re-parsed, so memory use does not grow with
+the size of the alignment. Several fasta files can be aligned concurrently with a
+bounded pool of workers, each running MAFFT with its own number of threads.
+
+Identical sequences only need to be aligned once. align_deduplicated() collapses them to
+one representative, aligns the unique sequences and re-expands the alignment to every
+original name. The alignment of the unique sequences is cached on disk, keyed by a hash
+of the unique-sequence set and the MAFFT options, so unchanged inputs return instantly.
+
+The MAFFT executable is taken from the MAFFT_EXECUTABLE environment variable (default
+"mafft"), so any executable with the same command line can stand in for it, e.g. a
+stub script in tests.
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+FASTA_EXTENSIONS = [".fasta", ".fa", ".fas", ".fna", ".ffn", ".faa"]
+
+CACHE_DIR = ".alignment_cache"
+
+
+def mafft_command(input_file, threads=1, options=(), executable=None):
+    """
+    Build the MAFFT command line.
+
+    Parameters
+    ----------
+    input_file : str
+        The fasta file to align.
+    threads : int
+        Number of threads MAFFT may use (--thread). -1 lets MAFFT use all cores. Default is 1.
+    options : sequence of str
+        Extra MAFFT options, e.g. ["--auto"] or ["--maxiterate", "1000", "--localpair"]. Default is ().
+    executable : str
+        The MAFFT executable. Default is None (MAFFT_EXECUTABLE or "mafft").
+
+    Returns
+    -------
+    command : list of str
+    """
+    executable = executable or os.environ.get("MAFFT_EXECUTABLE", "mafft")
+    return [executable, "--thread", str(threads)] + list(options) + [input_file]
+
+
+def align(input_file, output_file, threads=1, options=(), executable=None):
+    """
+    Align a fasta file with MAFFT, streaming the alignment into output_file.
+
+    The alignment is written to a temporary file next to output_file and renamed when
+    MAFFT succeeds, so a failed run never leaves a truncated alignment behind.
+
+    Parameters
+    ----------
+    input_file : str
+        The fasta file to align.
+    output_file : str
+        Where to write the aligned fasta file.
+    threads, options, executable
+        See mafft_command.
+
+    Returns
+    -------
+    result : dict
+        The input and output files, the number of threads and the wall time in seconds.
+    """
+    if not os.path.isfile(input_file): # Check if the file exists
+        raise FileNotFoundError(f"File not found: {input_file}")
+
+    command = mafft_command(input_file, threads, options, executable)
+    temporary = f"{output_file}.{os.getpid()}.tmp"
+    start = time.perf_counter()
+    try:
+        with open(temporary, "wb") as handle:
+            process = subprocess.run(command, stdout=handle, stderr=subprocess.PIPE)
+        wall_time = time.perf_counter() - start
+
+        if process.returncode != 0:
+            message = process.stderr.decode(errors="replace").strip().splitlines()[-5:]
+            raise RuntimeError(f"MAFFT failed on {input_file} (exit code {process.returncode}): " + " ".join(message))
+        os.replace(temporary, output_file)
+    finally: # Also when MAFFT could not be started at all
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+    return {"input": input_file, "output": output_file, "threads": threads, "wall_time": wall_time}
+
+
+def read_fasta(path):
+    """Yield (name, sequence) for every record of a fasta file, one record at a time."""
+    name, chunks = None, []
+    with open(path) as handle:
+        for line in handle:
+            line = line.strip()
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, "".join(chunks)
+                name, chunks = line[1:].strip(), []
+            elif line:
+                chunks.append(line)
+    if name is not None:
+        yield name, "".join(chunks)
+
+
+def deduplicate(records):
+    """
+    Collapse identical sequences.
+
+    Parameters
+    ----------
+    records : iterable of (str, str)
+        (name, sequence) pairs, e.g. from read_fasta.
+
+    Returns
+    -------
+    unique : list of str
+        The distinct sequences, in order of first appearance.
+    names : list of (str, int)
+        Every original name with the position of its sequence in unique, in input order.
+    """
+    positions = {}
+    unique = []
+    names = []
+    for name, sequence in records:
+        if sequence not in positions:
+            positions[sequence] = len(unique)
+            unique.append(sequence)
+        names.append((name, positions[sequence]))
+    return unique, names
+
+
+def _write_fasta(path, records):
+    """Write (name, sequence) pairs to a fasta file, one line per sequence."""
+    with open(path, "w") as handle:
+        for name, sequence in records:
+            handle.write(f">{name}\n{sequence}\n")
+
+
+def align_deduplicated(input_file, output_file, threads=1, options=(), executable=None, cache_dir=CACHE_DIR):
+    """
+    Align only the distinct sequences of a fasta file, using a cache of earlier alignments.
+
+    The distinct sequences are written in a canonical (sorted) order under internal names,
+    so the same set of sequences always gives the same MAFFT input and cache key. The
+    aligned sequences are matched back by those names, so options that make MAFFT
+    reorder its output (e.g. --reorder) are safe. The aligned output keeps the original
+    names and order.
+
+    Parameters
+    ----------
+    input_file : str
+        The fasta file to align.
+    output_file : str
+        Where to write the aligned fasta file.
+    threads, options, executable
+        See mafft_command.
+    cache_dir : str
+        Directory holding cached alignments. Default is ".alignment_cache". None disables the cache.
+
+    Returns
+    -------
+    result : dict
+        As align, plus the number of sequences, the number of distinct sequences and whether the
+        alignment came from the cache.
+    """
+    if not os.path.isfile(input_file): # Check if the file exists
+        raise FileNotFoundError(f"File not found: {input_file}")
+
+    start = time.perf_counter()
+    unique, names = deduplicate(read_fasta(input_file))
+    canonical = sorted(range(len(unique)), key=lambda position: unique[position])
+    rank = {position: number for number, position in enumerate(canonical)}
+
+    executable = executable or os.environ.get("MAFFT_EXECUTABLE", "mafft")
+    digest = hashlib.sha256(json.dumps({"options": list(options), "executable": os.path.basename(executable)}).encode())
+    for position in canonical:
+        digest.update(unique[position].encode() + b"\n")
+    key = digest.hexdigest()
+
+    cache_file = None if cache_dir is None else os.path.join(cache_dir, key + ".fasta")
+    cached = cache_file is not None and os.path.isfile(cache_file)
+
+    if cached:
+        aligned = dict(read_fasta(cache_file))
+    elif len(unique) == 1: # Nothing to align
+        aligned = {"seq0": unique[0]}
+    else:
+        directory = cache_dir if cache_dir is not None else os.path.dirname(os.path.abspath(output_file))
+        os.makedirs(directory, exist_ok=True)
+        unique_input = os.path.join(directory, f"{key}.{os.getpid()}.input.fasta")
+        unique_output = os.path.join(directory, f"{key}.{os.getpid()}.output.fasta")
+        _write_fasta(unique_input, ((f"seq{number}", unique[position]) for number, position in enumerate(canonical)))
+        try:
+            align(unique_input, unique_output, threads, options, executable)
+        finally:
+            os.remove(unique_input)
+        aligned = dict(read_fasta(unique_output)) # Keyed by the internal names, whatever the output order
+        if cache_file is not None:
+            os.replace(unique_output, cache_file)
+        else:
+            os.remove(unique_output)
+
+    missing = [number for number in range(len(unique)) if f"seq{number}" not in aligned]
+    if missing or len(aligned) != len(unique):
+        raise RuntimeError(f"Expected the aligned sequences seq0 to seq{len(unique) - 1}, got {len(aligned)} sequences"
+                           + (f" without seq{missing[0]}" if missing else ""))
+
+    # Re-expand to every original name, in the original order
+    temporary = f"{output_file}.{os.getpid()}.tmp"
+    _write_fasta(temporary, ((name, aligned[f"seq{rank[position]}"]) for name, position in names))
+    os.replace(temporary, output_file)
+
+    return {"input": input_file, "output": output_file, "threads": threads,
+            "wall_time": time.perf_counter() - start,
+            "sequences": len(names), "unique": len(unique), "cached": cached}
+
+
+def fasta_files(inputs):
+    """The fasta files of a directory, or the given file(s) as a list."""
+    if isinstance(inputs, str) and os.path.isdir(inputs):
+        return sorted(path for path in glob.glob(os.path.join(inputs, "*"))
+                      if os.path.splitext(path)[1].lower() in FASTA_EXTENSIONS)
+    if isinstance(inputs, str):
+        return [inputs]
+    return list(inputs)
+
+
+def align_many(inputs, output_dir, workers=2, threads=1, options=(), executable=None, suffix="_aligned",
+               deduplicated=False, cache_dir=CACHE_DIR):
+    """
+    Align several fasta files concurrently.
+
+    Parameters
+    ----------
+    inputs : str or list of str
+        A directory of fasta files, or a list of fasta files.
+    output_dir : str
+        Directory for the alignments; each is named after its input with suffix appended.
+    workers : int
+        Number of alignments running at the same time. Default is 2.
+    threads : int
+        Number of MAFFT threads per alignment. Default is 1.
+    options, executable
+        See mafft_command.
+    suffix : str
+        Appended to the input file name. Default is "_aligned".
+    deduplicated : bool
+        Align only the distinct sequences of each file, with caching (see align_deduplicated). Default is False.
+    cache_dir : str
+        See align_deduplicated.
+
+    Returns
+    -------
+    results : list of dict
+        One entry per input file, in input order, with its output file and wall time (see
+        align), or its error message when the alignment failed.
+    """
+    files = fasta_files(inputs)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run(input_file):
+        stem, extension = os.path.splitext(os.path.basename(input_file))
+        output_file = os.path.join(output_dir, f"{stem}{suffix}{extension or '.fasta'}")
+        try:
+            if deduplicated:
+                result = align_deduplicated(input_file, output_file, threads, options, executable, cache_dir)
+            else:
+                result = align(input_file, output_file, threads, options, executable)
+            return dict(result, error="")
+        except (OSError, RuntimeError) as error:
+            return {"input": input_file, "output": None, "threads": threads, "wall_time": None, "error": str(error)}
+
+    # The work happens in MAFFT processes, so threads are enough to keep them running
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(run, files))
+
+
+def main():
+    import argparse
+
+    # Create a command-line parser object
+    parser = argparse.ArgumentParser(description="Align fasta files with MAFFT.")
+    parser.add_argument("-i", "--input",
+                        help="A fasta file, or a directory of fasta files",
+                        default="Test.fasta")
+    parser.add_argument("-o", "--output",
+                        help="The output file (one input) or directory (several inputs)",
+                        default="alignment.fasta")
+    parser.add_argument("-t", "--threads",
+                        help="Number of MAFFT threads per alignment (default: 1)",
+                        type=int,
+                        default=1)
+    parser.add_argument("-w", "--workers",
+                        help="Number of alignments running at the same time (default: 2)",
+                        type=int,
+                        default=2)
+    parser.add_argument("-d", "--deduplicate",
+                        help="Align identical sequences only once and cache the alignment",
+                        action="store_true")
+
+    # Parse the command-line arguments
+    args, options = parser.parse_known_args() # Unknown options are passed on to MAFFT
+
+    if os.path.isdir(args.input):
+        results = align_many(args.input, args.output, args.workers, args.threads, options,
+                             deduplicated=args.deduplicate)
+    elif args.deduplicate:
+        results = [align_deduplicated(args.input, args.output, args.threads, options)]
+    else:
+        results = [align(args.input, args.output, args.threads, options)]
+
+    for result in results:
+        if result.get("error"):
+            print(f"{result['input']}: failed, {result['error']}")
+        else:
+            detail = ""
+            if "unique" in result:
+                detail = f", {result['unique']} of {result['sequences']} sequences distinct" + (", cached" if result["cached"] else "")
+            print(f"{result['input']} -> {result['output']} ({result['wall_time']:.2f} s{detail})")
+
+
+if __name__ == "__main__":
+    main()
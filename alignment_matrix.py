@@ -0,0 +1,340 @@
+"""
+Aligned sequences as one uint8 matrix (sequences x sites), one byte per residue.
+
+Holding an alignment as a single NumPy array instead of one record object per sequence
+keeps thousands of sequences cheap, lets the matrix be saved as .npy and memory-mapped
+back, and turns the usual QC statistics into array operations:
+
+    distances()         pairwise p-distances (or identities), computed over blocks of
+                        sites as matrix products of per-residue indicator matrices
+    site_variability()  per-site residue counts, gap fraction, entropy and whether the
+                        site is variable or parsimony informative
+    nj_tree()           a neighbor-joining tree from the distances, as Newick
+
+Gaps and unknown residues (the `missing` characters) are left out of every comparison,
+i.e. distances use pairwise deletion.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+MISSING = "-.?"
+BLOCK_SITES = 4096
+
+
+class AlignmentMatrix:
+    """
+    An alignment stored as a uint8 matrix.
+
+    Parameters
+    ----------
+    names : list of str
+        The sequence names.
+    matrix : numpy.ndarray
+        uint8 array of shape (sequences, sites) holding the upper-case residues as ASCII codes.
+    missing : str
+        Characters counted as gaps or unknown residues. Default is "-.?"; use "-.?N" for nucleotides.
+    """
+
+    def __init__(self, names, matrix, missing=MISSING):
+        if matrix.dtype != np.uint8 or matrix.ndim != 2:
+            raise ValueError("The alignment matrix must be a 2-dimensional uint8 array")
+        if len(names) != matrix.shape[0]:
+            raise ValueError(f"{len(names)} names for {matrix.shape[0]} sequences")
+        self.names = list(names)
+        self.matrix = matrix
+        self.missing = missing
+
+    @classmethod
+    def from_fasta(cls, path, missing=MISSING):
+        """Read an aligned fasta file."""
+        from alignment import read_fasta
+
+        if not os.path.isfile(path): # Check if the file exists
+            raise FileNotFoundError(f"File not found: {path}")
+        names, sequences = [], []
+        for name, sequence in read_fasta(path):
+            names.append(name)
+            sequences.append(sequence.upper())
+        lengths = {len(sequence) for sequence in sequences}
+        if len(lengths) > 1:
+            raise ValueError(f"The sequences of {path} are not aligned (lengths {sorted(lengths)})")
+        matrix = np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+        return cls(names, matrix.reshape(len(sequences), lengths.pop() if lengths else 0).copy(), missing)
+
+    def save(self, prefix):
+        """Save the matrix as "{prefix}.npy" and the names, one per line, as "{prefix}.names"."""
+        np.save(f"{prefix}.npy", self.matrix)
+        with open(f"{prefix}.names", "w") as handle:
+            handle.write("\n".join(self.names) + "\n")
+
+    @classmethod
+    def load(cls, prefix, mmap=True, missing=MISSING):
+        """Load a saved matrix; with mmap the residues stay on disk and are read as needed."""
+        matrix = np.load(f"{prefix}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{prefix}.names") as handle:
+            names = handle.read().splitlines()
+        return cls(names, matrix, missing)
+
+    @property
+    def n_sequences(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_sites(self):
+        return self.matrix.shape[1]
+
+    def _missing_codes(self):
+        return np.frombuffer(self.missing.encode("ascii"), dtype=np.uint8)
+
+    def _blocks(self, block_sites):
+        """Consecutive blocks of sites, read from the (possibly memory-mapped) matrix."""
+        for start in range(0, self.n_sites, block_sites):
+            yield np.asarray(self.matrix[:, start:start + block_sites])
+
+    def site_counts(self, block_sites=BLOCK_SITES):
+        """Number of sequences with each residue at each site, as a sites x 256 array (indexed by ASCII code)."""
+        counts = []
+        for block in self._blocks(block_sites):
+            offsets = block.astype(np.int64) + 256 * np.arange(block.shape[1]) # One bin range per site
+            counts.append(np.bincount(offsets.ravel(), minlength=256 * block.shape[1]).reshape(block.shape[1], 256))
+        return np.concatenate(counts) if counts else np.zeros((0, 256), dtype=np.int64)
+
+    def site_variability(self, block_sites=BLOCK_SITES):
+        """
+        Per-site QC statistics.
+
+        Returns
+        -------
+        sites : pandas.DataFrame
+            One row per site (numbered from 1) with the gap fraction, the number of distinct
+            residues, the most common residue and its frequency, the Shannon entropy (bits)
+            of the residues, and whether the site is variable and parsimony informative
+            (at least two residues that occur at least twice each).
+        """
+        counts = self.site_counts(block_sites)
+        missing = counts[:, self._missing_codes()].sum(axis=1)
+        counts[:, self._missing_codes()] = 0
+        present = counts.sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frequencies = counts / present[:, np.newaxis]
+            entropy = -np.sum(np.where(counts > 0, frequencies * np.log2(frequencies), 0), axis=1)
+        states = (counts > 0).sum(axis=1)
+        major = counts.argmax(axis=1)
+
+        return pd.DataFrame({"gap_fraction": missing / max(1, self.n_sequences),
+                             "n_states": states,
+                             "major_residue": [chr(code) if states[site] else "" for site, code in enumerate(major)],
+                             "major_frequency": np.where(present > 0, counts.max(axis=1) / np.maximum(present, 1), np.nan),
+                             "entropy": np.where(present > 0, entropy, np.nan),
+                             "variable": states > 1,
+                             "parsimony_informative": (counts >= 2).sum(axis=1) >= 2},
+                            index=pd.RangeIndex(1, self.n_sites + 1, name="site"))
+
+    def distances(self, metric="p", block_sites=BLOCK_SITES):
+        """
+        Pairwise distances between all sequences.
+
+        For every block of sites, an indicator matrix per residue gives the number of
+        matching sites of every pair as one matrix product; the number of comparable sites
+        (no gap in either sequence) is a product of the non-gap indicators.
+
+        Parameters
+        ----------
+        metric : str
+            'p' (proportion of differing sites, default), 'identity' (1 - p) or 'jc69'
+            (Jukes-Cantor corrected nucleotide distance).
+        block_sites : int
+            Number of sites per block. Default is 4096.
+
+        Returns
+        -------
+        distances : numpy.ndarray
+            Symmetric (sequences x sequences) array; NaN for pairs without comparable sites.
+        """
+        if metric not in ["p", "identity", "jc69"]:
+            raise ValueError(f"Invalid metric: {metric}")
+
+        # Counts are exact in float32 up to 2**24 sites
+        dtype = np.float32 if self.n_sites < 2**24 else np.float64
+        matches = np.zeros((self.n_sequences, self.n_sequences), dtype=dtype)
+        comparable = np.zeros_like(matches)
+        missing = self._missing_codes()
+        for block in self._blocks(block_sites):
+            valid = ~np.isin(block, missing)
+            comparable += valid.astype(dtype) @ valid.T.astype(dtype)
+            for code in np.unique(block[valid]):
+                indicator = (block == code).astype(dtype)
+                matches += indicator @ indicator.T
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_distance = 1 - matches.astype(float) / comparable
+        np.fill_diagonal(p_distance, 0)
+        return _from_p_distance(p_distance, metric)
+
+    def distance_table(self, metric="p", block_sites=BLOCK_SITES):
+        """The distances as a DataFrame labelled with the sequence names."""
+        return pd.DataFrame(self.distances(metric, block_sites), index=self.names, columns=self.names)
+
+    def nj_tree(self, metric="p", block_sites=BLOCK_SITES):
+        """The neighbor-joining tree of the sequences as a Newick string. See neighbor_joining."""
+        return neighbor_joining(self.distances(metric, block_sites), self.names)
+
+
+def _from_p_distance(p_distance, metric):
+    """Convert p-distances to the metric (see AlignmentMatrix.distances)."""
+    if metric == "identity":
+        return 1 - p_distance
+    if metric == "jc69":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return -0.75 * np.log(1 - 4 / 3 * p_distance) # inf when p >= 0.75
+    return p_distance
+
+
+def _newick_name(name):
+    """Quote characters that have a meaning in Newick."""
+    for character in " ():,;[]'":
+        name = name.replace(character, "_")
+    return name
+
+
+def neighbor_joining(distances, names):
+    """
+    Build a tree from a distance matrix with neighbor joining (Saitou and Nei, 1987).
+
+    Each step computes the Q matrix of all remaining nodes at once, joins the pair with the
+    smallest Q value and replaces it by the new node. Negative branch lengths are set to 0.
+
+    Parameters
+    ----------
+    distances : array_like
+        Symmetric matrix of pairwise distances.
+    names : list of str
+        The leaf names.
+
+    Returns
+    -------
+    tree : str
+        The unrooted tree in Newick format, with branch lengths.
+    """
+    distances = np.array(distances, dtype=float)
+    if not np.all(np.isfinite(distances)):
+        raise ValueError("Neighbor joining needs finite distances between all sequences")
+    nodes = [_newick_name(name) for name in names]
+    if len(nodes) == 1:
+        return f"{nodes[0]};"
+    if len(nodes) == 2:
+        return f"({nodes[0]}:{distances[0, 1] / 2:.6g},{nodes[1]}:{distances[0, 1] / 2:.6g});"
+
+    while len(nodes) > 3:
+        m = len(nodes)
+        totals = distances.sum(axis=1)
+        q = (m - 2) * distances - totals[:, np.newaxis] - totals[np.newaxis, :]
+        np.fill_diagonal(q, np.inf)
+        i, j = np.unravel_index(np.argmin(q), q.shape)
+
+        length_i = max(0.0, distances[i, j] / 2 + (totals[i] - totals[j]) / (2 * (m - 2)))
+        length_j = max(0.0, distances[i, j] - length_i)
+        new_distances = (distances[i] + distances[j] - distances[i, j]) / 2
+
+        keep = [node for node in range(m) if node not in (i, j)]
+        distances = np.vstack([np.append(distances[np.ix_(keep, keep)], new_distances[keep][:, np.newaxis], axis=1),
+                               np.append(new_distances[keep], 0)])
+        nodes = [nodes[node] for node in keep] + [f"({nodes[i]}:{length_i:.6g},{nodes[j]}:{length_j:.6g})"]
+
+    # Join the last three nodes at the center
+    lengths = [max(0.0, (distances[0, 1] + distances[0, 2] - distances[1, 2]) / 2),
+               max(0.0, (distances[0, 1] + distances[1, 2] - distances[0, 2]) / 2),
+               max(0.0, (distances[0, 2] + distances[1, 2] - distances[0, 1]) / 2)]
+    return "(" + ",".join(f"{node}:{length:.6g}" for node, length in zip(nodes, lengths)) + ");"
+
+
+def summarize(alignment, metric="p", output="alignment", block_sites=BLOCK_SITES):
+    """
+    Write the QC statistics and a neighbor-joining tree of an alignment.
+
+    Writes "{output}_distances.csv", "{output}_sites.csv" and "{output}_nj_tree.txt".
+
+    Parameters
+    ----------
+    alignment : AlignmentMatrix
+        The alignment.
+    metric : str
+        The distance, see AlignmentMatrix.distances. Default is 'p'.
+    output : str
+        The output file prefix. Default is "alignment".
+    block_sites : int
+        Number of sites per block. Default is 4096.
+
+    Returns
+    -------
+    summary : dict
+        The number of sequences and sites, the number of variable and parsimony informative
+        sites, the mean pairwise identity and the files written.
+    """
+    if metric not in ["p", "identity", "jc69"]:
+        raise ValueError(f"Invalid metric: {metric}")
+    p_distance = alignment.distances("p", block_sites) # Computed once; the metric and identity follow from it
+    distances = _from_p_distance(p_distance, metric)
+    sites = alignment.site_variability(block_sites)
+    tree = neighbor_joining(distances, alignment.names)
+
+    pd.DataFrame(distances, index=alignment.names, columns=alignment.names).to_csv(f"{output}_distances.csv")
+    sites.to_csv(f"{output}_sites.csv")
+    with open(f"{output}_nj_tree.txt", "w") as handle:
+        handle.write(tree + "\n")
+
+    identity = 1 - p_distance
+    upper = identity[np.triu_indices(alignment.n_sequences, 1)]
+    return {"sequences": alignment.n_sequences,
+            "sites": alignment.n_sites,
+            "variable_sites": int(sites["variable"].sum()),
+            "parsimony_informative_sites": int(sites["parsimony_informative"].sum()),
+            "mean_identity": float(np.nanmean(upper)) if upper.size else np.nan,
+            "files": [f"{output}_distances.csv", f"{output}_sites.csv", f"{output}_nj_tree.txt"]}
+
+
+def main():
+    import argparse
+
+    # Create a command-line parser object
+    parser = argparse.ArgumentParser(description="Distances, site statistics and a neighbor-joining tree of an alignment.")
+    parser.add_argument("-i", "--input",
+                        help="The aligned fasta file, or a saved matrix prefix with --load",
+                        default="alignment.fasta")
+    parser.add_argument("-o", "--output",
+                        help="The output file prefix (default: alignment)",
+                        default="alignment")
+    parser.add_argument("-m", "--metric",
+                        help="The distance: p, identity or jc69 (default: p)",
+                        default="p")
+    parser.add_argument("--missing",
+                        help="Characters treated as gaps or unknown residues (default: -.?)",
+                        default=MISSING)
+    parser.add_argument("--save",
+                        help="Also save the alignment as a memory-mappable matrix with this prefix",
+                        default=None)
+    parser.add_argument("--load",
+                        help="Read a matrix saved with --save instead of a fasta file",
+                        action="store_true")
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+
+    if args.load:
+        alignment = AlignmentMatrix.load(args.input, missing=args.missing)
+    else:
+        alignment = AlignmentMatrix.from_fasta(args.input, args.missing)
+    if args.save:
+        alignment.save(args.save)
+
+    summary = summarize(alignment, args.metric, args.output)
+    print(f"{summary['sequences']} sequences, {summary['sites']} sites, {summary['variable_sites']} variable, "
+          f"{summary['parsimony_informative_sites']} parsimony informative; mean identity {summary['mean_identity']:.4f}")
+    print(f"Written: {', '.join(summary['files'])}")
+
+
+if __name__ == "__main__":
+    main()
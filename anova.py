@@ -1,58 +1,469 @@
+import logging
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy import stats
-import statsmodels.api as sm
-import statsmodels.formula.api as smf
+import instrumentation
+
+# scipy and statsmodels are imported inside the branches that use them, so the
+# 1-way path never loads statsmodels/patsy and the command line starts quickly.
+
+logger = logging.getLogger(__name__)
+
+def anova_many(data, x_col = 'Group', y_cols = 'all', correction = None, alpha = 0.05):
+    """
+    Perform a 1-way ANOVA for many response columns that share one grouping.
+
+    All responses are tested in one vectorized pass: the rows are sorted by group once
+    and the group sums and sums of squares of every response are computed together.
+    Missing values are excluded per response, as when each column is tested on its own.
+
+    Parameters:
+    data: pandas.DataFrame - The dataset to be analyzed.
+    x_col: str - The name of the column containing the groups.
+    y_cols: list or str - The response columns, or 'all' for every numeric column except x_col.
+    correction: str - Multiple-testing correction across responses, any method accepted by
+                      statsmodels' multipletests (e.g. 'bonferroni', 'holm', 'fdr_bh'). Default is None.
+    alpha: float - Family-wise error rate / false discovery rate for the correction. Default is 0.05.
+
+    Returns:
+    results: pandas.DataFrame - One row per response with F, p_value, df_between, df_within and n
+                                (plus p_adjusted and reject when a correction is applied).
+    """
+    from scipy import stats
+
+    if isinstance(y_cols, str) and y_cols == 'all':
+        y_cols = [col for col in data.select_dtypes('number').columns if col != x_col]
+    elif isinstance(y_cols, str):
+        y_cols = [y_cols]
+    y_cols = list(y_cols)
+
+    codes, _ = pd.factorize(data[x_col], sort=True)
+    valid_rows = codes >= 0 # Rows without a group are dropped
+    codes = codes[valid_rows]
+    values = data.loc[valid_rows, y_cols].to_numpy(dtype=float)
+
+    # Sort once by group so every group is a contiguous block of rows
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    values = values[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    observed = ~np.isnan(values)
+    centered = values - np.nanmean(values, axis=0) # Centering keeps the sums of squares accurate
+    centered[~observed] = 0
+
+    counts = np.add.reduceat(observed, starts, axis=0).astype(float) # group sizes (groups x responses)
+    sums = np.add.reduceat(centered, starts, axis=0)
+    n = counts.sum(axis=0)
+    total = sums.sum(axis=0)
+    k = (counts > 0).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss_total = (centered**2).sum(axis=0) - total**2 / n
+        ss_between = np.where(counts > 0, sums**2 / counts, 0).sum(axis=0) - total**2 / n
+        ss_within = ss_total - ss_between
+        df_between = k - 1
+        df_within = n - k
+        f_value = (ss_between / df_between) / (ss_within / df_within)
+    p_value = stats.f.sf(f_value, df_between, df_within)
+
+    results = pd.DataFrame({'F': f_value,
+                            'p_value': p_value,
+                            'df_between': df_between.astype(int),
+                            'df_within': df_within.astype(int),
+                            'n': n.astype(int)},
+                           index=pd.Index(y_cols, name='response'))
+
+    if correction is not None: # Correct across responses
+        from statsmodels.stats.multitest import multipletests
+        tested = results['p_value'].notna()
+        reject, p_adjusted, _, _ = multipletests(results.loc[tested, 'p_value'], alpha=alpha, method=correction)
+        results['p_adjusted'] = np.nan
+        results['reject'] = False
+        results.loc[tested, 'p_adjusted'] = p_adjusted
+        results.loc[tested, 'reject'] = reject
+
+    return results
+
+class AnovaDesign:
+    """
+    A design matrix that is built and factorized once and reused for many responses.
+
+    The right-hand side of a model formula (e.g. "Group * C(Timepoint)") is turned into a
+    design matrix with patsy once. The minimum-norm least-squares solution (pseudo-inverse)
+    of the design is computed up front, and every term's Type II hypothesis (the term's
+    coefficients are zero, adjusted for the terms that contain it) is set up as a Wald test
+    on those coefficients, so a Type II ANOVA table for any number of responses only needs
+    a few matrix products instead of a new formula, design matrix and OLS fit per response.
+    The tables match statsmodels' anova_lm(typ=2), which tests the terms the same way, also
+    for rank-deficient designs with aliased columns. Terms without any column get NaN.
+
+    Parameters:
+    data: pandas.DataFrame - The dataset holding the factor columns.
+    formula: str - The right-hand side of the model formula, in patsy syntax. A full formula
+                   ("y ~ a * b") is accepted and its left-hand side ignored.
+    """
+
+    def __init__(self, data, formula):
+        import patsy
+        from scipy import linalg
+
+        self.formula = formula.split('~', 1)[-1].strip()
+        design = patsy.dmatrix(self.formula, data, return_type='dataframe')
+        self.index = design.index # Rows kept after dropping missing factor values
+        self.nobs = design.shape[0]
+        matrix = design.to_numpy(dtype=float)
+        info = design.design_info
+
+        self.rank = np.linalg.matrix_rank(matrix)
+        self._pinv = np.linalg.pinv(matrix, rcond=1e-15) # Coefficients are self._pinv @ y
+        self._matrix = matrix
+        covariance = self._pinv @ self._pinv.T # Unscaled covariance of the coefficients
+
+        tested = [term for term in info.terms if term.factors]
+        self.terms = [term.name() for term in tested]
+        self._hypotheses = []
+        identity = np.eye(matrix.shape[1])
+        for term in tested: # Type II: the term, adjusted for every term that contains it
+            term_columns = list(range(info.slice(term).start, info.slice(term).stop))
+            containing = [column for other in tested
+                          if other is not term and set(term.factors) < set(other.factors)
+                          for column in range(info.slice(other).start, info.slice(other).stop)]
+            restriction = identity[term_columns + containing]
+            if containing: # Keep the part of the restriction orthogonal to the containing terms
+                orthogonal, _ = linalg.qr(restriction @ covariance @ identity[containing].T)
+                restriction = orthogonal[:, -len(term_columns):].T @ restriction
+            weight = np.linalg.pinv(restriction @ covariance @ restriction.T)
+            self._hypotheses.append((restriction @ self._pinv, weight))
+
+    def _responses(self, y):
+        """The responses as a 2-D array aligned with the design rows, plus their names."""
+        if isinstance(y, pd.DataFrame):
+            names = list(y.columns)
+            values = y.loc[self.index].to_numpy(dtype=float)
+        elif isinstance(y, pd.Series):
+            names = [y.name]
+            values = y.loc[self.index].to_numpy(dtype=float)[:, np.newaxis]
+        else:
+            values = np.asarray(y, dtype=float)
+            values = values[:, np.newaxis] if values.ndim == 1 else values
+            names = list(range(values.shape[1]))
+        if values.shape[0] != self.nobs:
+            raise ValueError(f"Expected {self.nobs} observations, got {values.shape[0]}")
+        if np.isnan(values).any():
+            raise ValueError("Responses must not contain missing values")
+        return values, names
+
+    def anova_tables(self, y):
+        """
+        Compute Type II ANOVA tables for one or many responses.
+
+        Parameters:
+        y: pandas.DataFrame, pandas.Series or numpy.ndarray - The responses, one per column. Pandas
+           objects are aligned with the design rows by index; arrays must have one row per design row.
+
+        Returns:
+        tables: pandas.DataFrame - Indexed by (response, term) with the columns sum_sq, df, F and PR(>F),
+                                   one block per response laid out like statsmodels' anova_lm.
+        """
+        from scipy import stats
+
+        values, names = self._responses(y)
+
+        coefficients = self._pinv @ values
+        ss_residual = np.sum((values - self._matrix @ coefficients)**2, axis=0)
+        df_residual = self.nobs - self.rank
+
+        sum_sq = []
+        for projection, weight in self._hypotheses: # Wald statistic of every term, per response
+            contrast = projection @ values
+            sum_sq.append(np.sum(contrast * (weight @ contrast), axis=0))
+        sum_sq = np.array(sum_sq)
+        df = np.array([projection.shape[0] for projection, _ in self._hypotheses], dtype=float)
+        sum_sq[df == 0] = np.nan # Nothing to test
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f_value = (sum_sq / df[:, np.newaxis]) / (ss_residual / df_residual)
+        p_value = stats.f.sf(f_value, df[:, np.newaxis], df_residual)
+
+        # Stack the terms and the residual row for every response
+        terms = self.terms + ['Residual']
+        sum_sq = np.vstack([sum_sq, ss_residual])
+        df = np.append(df, df_residual)
+        f_value = np.vstack([f_value, np.full(len(names), np.nan)])
+        p_value = np.vstack([p_value, np.full(len(names), np.nan)])
+
+        index = pd.MultiIndex.from_product([names, terms], names=['response', 'term'])
+        return pd.DataFrame({'sum_sq': sum_sq.T.ravel(),
+                             'df': np.tile(df, len(names)),
+                             'F': f_value.T.ravel(),
+                             'PR(>F)': p_value.T.ravel()},
+                            index=index)
+
+    def anova_table(self, y):
+        """
+        Compute the Type II ANOVA table of a single response.
+
+        Parameters:
+        y: pandas.Series or numpy.ndarray - The response.
+
+        Returns:
+        table: pandas.DataFrame - Indexed by term, with the columns sum_sq, df, F and PR(>F).
+        """
+        return self.anova_tables(y).droplevel('response')
+
+def _sphericity_epsilon(covariance, n_subjects, n_groups=1):
+    """
+    Greenhouse-Geisser and Huynh-Feldt epsilon from the covariance of the within conditions.
+
+    With between-subject groups the Huynh-Feldt epsilon uses Lecoutre's (1991) correction,
+    which replaces the number of subjects by n_subjects - n_groups + 1 in the numerator;
+    with one group it is the original Huynh-Feldt epsilon.
+    """
+    k = covariance.shape[0]
+    if k < 3: # Sphericity always holds with two conditions
+        return 1.0, 1.0
+
+    # Orthonormal contrasts between the conditions
+    contrasts = np.linalg.qr(np.eye(k) - 1.0 / k)[0][:, :k - 1]
+    transformed = contrasts.T @ covariance @ contrasts
+    gg = np.trace(transformed)**2 / ((k - 1) * np.sum(transformed**2))
+    hf = ((n_subjects - n_groups + 1) * (k - 1) * gg - 2) / ((k - 1) * (n_subjects - n_groups - (k - 1) * gg))
+    return gg, float(np.clip(hf, gg, 1.0))
+
+def repeated_measures_anova(data, subject = 'Animal', within = 'Timepoint', y_col = 'Antibody', between = None):
+    """
+    Perform a within-subject or mixed-design repeated-measures ANOVA.
+
+    The long data is turned into a subjects x conditions matrix once (repeated measurements
+    of the same subject and condition are averaged) and all sums of squares are computed
+    from that matrix with NumPy. Subjects missing any condition are dropped. Within-subject
+    effects get Greenhouse-Geisser and Huynh-Feldt corrected p-values; with a between-subject
+    factor the sphericity is estimated from the pooled within-group covariance and the
+    Huynh-Feldt epsilon gets Lecoutre's correction.
+
+    Parameters:
+    data: pandas.DataFrame - The dataset to be analyzed, in long format.
+    subject: str - The name of the column identifying the subjects.
+    within: str - The name of the column containing the within-subject factor (e.g. time).
+    y_col: str - The name of the column containing the dependent variable.
+    between: str - The name of the column containing a between-subject factor (e.g. treatment group).
+                   Default is None (within-subject design only).
+
+    Returns:
+    anova_result: pandas.DataFrame - One row per source with SS, DF, MS, F, p-unc, p-GG-corr,
+                                     p-HF-corr and the epsilons (corrections apply to within effects).
+    """
+    from scipy import stats
+
+    subjects, subject_names = pd.factorize(data[subject], sort=True)
+    conditions, condition_names = pd.factorize(data[within], sort=True)
+    values = data[y_col].to_numpy(dtype=float)
+    keep = (subjects >= 0) & (conditions >= 0) & ~np.isnan(values)
+    subjects, conditions, values = subjects[keep], conditions[keep], values[keep]
+
+    # Long to wide: subjects x conditions matrix of cell means
+    n_subjects, k = len(subject_names), len(condition_names)
+    cells = subjects * k + conditions
+    sums = np.bincount(cells, weights=values, minlength=n_subjects * k).reshape(n_subjects, k)
+    counts = np.bincount(cells, minlength=n_subjects * k).reshape(n_subjects, k)
+    complete = (counts > 0).all(axis=1) # Listwise deletion of incomplete subjects
+    matrix = sums[complete] / counts[complete]
+    n = matrix.shape[0]
+    if n < 2 or k < 2:
+        raise ValueError("At least two complete subjects and two conditions are required")
+
+    if between is None:
+        group_codes = np.zeros(n, dtype=int)
+    else:
+        subject_groups = pd.Series(data[between].to_numpy()[keep]).groupby(subjects).first() # One group per subject
+        subject_groups = subject_groups.reindex(range(n_subjects)) # Subjects without kept rows are incomplete
+        group_codes = pd.factorize(subject_groups.to_numpy()[complete], sort=True)[0]
+    n_groups = group_codes.max() + 1
+    group_sizes = np.bincount(group_codes, minlength=n_groups)
+
+    grand_mean = matrix.mean()
+    subject_means = matrix.mean(axis=1)
+    condition_means = matrix.mean(axis=0)
+    cell_means = np.vstack([matrix[group_codes == g].mean(axis=0) for g in range(n_groups)]) # groups x conditions
+    group_means = cell_means.mean(axis=1)
+
+    # Sums of squares
+    ss_within = n * np.sum((condition_means - grand_mean)**2)
+    ss_subjects = k * np.sum((subject_means - group_means[group_codes])**2)
+    ss_interaction = np.sum(group_sizes[:, np.newaxis] * (cell_means - group_means[:, np.newaxis]
+                                                          - condition_means + grand_mean)**2)
+    residuals = matrix - cell_means[group_codes] - (subject_means - group_means[group_codes])[:, np.newaxis]
+    ss_error = np.sum(residuals**2)
+
+    df_within = k - 1
+    df_subjects = n - n_groups
+    df_interaction = (n_groups - 1) * (k - 1)
+    df_error = (n - n_groups) * (k - 1)
+
+    # Sphericity corrections from the pooled within-group covariance of the conditions
+    deviations = matrix - cell_means[group_codes]
+    covariance = deviations.T @ deviations / df_subjects
+    gg, hf = _sphericity_epsilon(covariance, n, n_groups)
+
+    def within_effect(ss, df):
+        f_value = (ss / df) / (ss_error / df_error)
+        return [ss, df, ss / df, f_value,
+                stats.f.sf(f_value, df, df_error),
+                stats.f.sf(f_value, gg * df, gg * df_error),
+                stats.f.sf(f_value, hf * df, hf * df_error),
+                gg, hf]
+
+    rows = {}
+    if between is not None:
+        ss_between = k * np.sum(group_sizes * (group_means - grand_mean)**2)
+        df_between = n_groups - 1
+        f_value = (ss_between / df_between) / (ss_subjects / df_subjects)
+        p_value = stats.f.sf(f_value, df_between, df_subjects)
+        rows[between] = [ss_between, df_between, ss_between / df_between, f_value, p_value, p_value, p_value, np.nan, np.nan]
+        rows['Subject'] = [ss_subjects, df_subjects, ss_subjects / df_subjects] + [np.nan] * 6
+        rows[within] = within_effect(ss_within, df_within)
+        rows[f"{between}:{within}"] = within_effect(ss_interaction, df_interaction)
+    else:
+        rows['Subject'] = [ss_subjects, df_subjects, ss_subjects / df_subjects] + [np.nan] * 6
+        rows[within] = within_effect(ss_within, df_within)
+    rows['Residual'] = [ss_error, df_error, ss_error / df_error] + [np.nan] * 6
+
+    return pd.DataFrame.from_dict(rows, orient='index',
+                                  columns=['SS', 'DF', 'MS', 'F', 'p-unc', 'p-GG-corr', 'p-HF-corr', 'eps-GG', 'eps-HF'])
+
+def _design_formula(model, x_col, group):
+    """Right-hand side of the model formula used by the 2-way and repeated-measures ANOVA."""
+    if model == '2-way':
+        return f"{x_col} + {x_col} * C({group})"
+    return f"C({x_col}) + C({x_col}, Treatment(reference='1'))*Time"
 
 def ANOVA(data = 'data.csv', 
         x_col = 'Group', 
         y_col = 'Antibody',
         group = 'Group', 
-        model='1-way'):
+        model='1-way',
+        correction=None,
+        subject=None,
+        resampling=None,
+        n_resamples=9999,
+        seed=None,
+        workers=1,
+        memory_budget=256_000_000,
+        log_titers=False,
+        zeros='half_lod',
+        lod=None,
+        offset=1):
     """
     Perform ANOVA analysis on a given dataset and create a plot of the result.
 
     Parameters:
     data: pandas.DataFrame - The dataset to be analyzed.
     x: str - The name of the column containing the independent variable.
-    y: str - The name of the column containing the dependent variable.
+    y: str - The name of the column containing the dependent variable. For a 1-way ANOVA this can also be
+             a list of columns, or 'all' for every numeric column, to test many responses at once (see anova_many).
     model: str - The type of ANOVA to be performed. Default is '1-way'. Other options include '2-way', 
                   'repeated-measures', and 'MANOVA'.
+    correction: str - Multiple-testing correction when several responses are tested, e.g. 'fdr_bh'. Default is None.
+    subject: str - The name of the column identifying the subjects. With a repeated-measures model, x is the
+                   within-subject factor and group (if different from x) the between-subject factor, see
+                   repeated_measures_anova. Default is None (OLS-based repeated-measures model).
+    resampling: str - 'permutation' or 'bootstrap' to compute the 1-way p-value by resampling instead of from the
+                      F distribution (see the resampling module). Default is None.
+    n_resamples: int - Number of resamples. Default is 9999.
+    seed: int - Seed for the resampling. Default is None.
+    workers: int - Number of worker processes for the resampling. Default is 1.
+    memory_budget: float - Approximate memory per worker for one block of resamples, in bytes. Default is 256 MB.
+    log_titers: bool - Convert the dependent variable(s) to log2 titers first, so geometric mean titers are
+                       compared (see the preprocess module). Default is False.
+    zeros: str - How titers below the limit of detection are handled with log_titers: 'half_lod', 'lod', 'drop'
+                 or 'offset' (see the preprocess module). Default is 'half_lod'.
+    lod: float - The limit of detection. Default is None (the smallest positive titer of each column).
+    offset: float - The value added to every titer with zeros='offset'. Default is 1.
 
     Returns:
     anova_result: pandas.DataFrame - The result of the ANOVA analysis.
     """
 
+    instrumentation.count(rows=len(data), groups=data[x_col].nunique() if x_col in data.columns else None)
+
+    if log_titers: # Compare geometric mean titers
+        from preprocess import log_titer_columns
+        with instrumentation.stage('preprocess'):
+            if isinstance(y_col, str) and y_col == 'all':
+                y_col = [col for col in data.select_dtypes('number').columns if col != x_col]
+            data = log_titer_columns(data, y_col, zeros, lod, offset)
+
+    with instrumentation.stage('fit'):
+        anova_result = _fit(data, x_col, y_col, group, model, correction, subject, resampling, n_resamples, seed,
+                            workers, memory_budget)
+    return anova_result
+
+
+def _fit(data, x_col, y_col, group, model, correction, subject, resampling, n_resamples, seed, workers, memory_budget):
+    """The model branches of ANOVA."""
+    if resampling is not None and (model != '1-way' or not isinstance(y_col, str) or y_col == 'all'):
+        raise ValueError("\nResampling is only available for a 1-way ANOVA of a single response")
+
+     # Perform 1-way ANOVA on many responses
+    if model == '1-way' and (not isinstance(y_col, str) or y_col == 'all'):
+        logger.info("Performing 1-way ANOVA on multiple responses...")
+        anova_result = anova_many(data, x_col, y_col, correction)
+
+    # Perform 2-way or repeated-measures ANOVA on many responses, sharing one design matrix
+    elif model in ['2-way', 'repeated-measures'] and not isinstance(y_col, str):
+        logger.info(f"Performing {model} ANOVA on multiple responses...")
+        design = AnovaDesign(data, _design_formula(model, x_col, group))
+        anova_result = design.anova_tables(data[list(y_col)])
+
+     # Perform 1-way ANOVA with a resampling p-value
+    elif model == '1-way' and resampling is not None:
+        import resampling as resample
+        logger.info(f"Performing 1-way ANOVA with a {resampling} test ({n_resamples} resamples)...")
+        tests = {'permutation': resample.anova_permutation_test, 'bootstrap': resample.anova_bootstrap_test}
+        if resampling not in tests:
+            raise ValueError(f"\nInvalid resampling method: {resampling}")
+        anova_result = tests[resampling](data[y_col], data[x_col], n_resamples, seed, workers, memory_budget)
+
      # Perform 1-way ANOVA
-    if model == '1-way':
-        print("\nPerforming 1-way ANOVA...")
+    elif model == '1-way':
+        from scipy import stats
+        logger.info("Performing 1-way ANOVA...")
         x = data[x_col]
         y = data[y_col]
-        groups = [group[y_col] for name, group in data.groupby(x_col)]
+        groups = [group[y_col].dropna() for name, group in data.groupby(x_col)] # Dropped titers are NaN
         anova_result = stats.f_oneway(*groups)
 
     # Perform 2-way ANOVA
     elif model == '2-way':
-        print("\nPerforming 2-way ANOVA...")
-        formula = f"{y_col} ~ {x_col} + {x_col} * C({group})"
+        import statsmodels.api as sm
+        import statsmodels.formula.api as smf
+        logger.info("Performing 2-way ANOVA...")
+        formula = f"{y_col} ~ {_design_formula('2-way', x_col, group)}"
         model = smf.ols(formula, data).fit()
         anova_table = sm.stats.anova_lm(model, typ=2)
         anova_result = anova_table['F'][0:len(data[x_col].unique())]
 
+    # Perform repeated-measures ANOVA keyed on the subjects
+    elif model == 'repeated-measures' and subject is not None:
+        logger.info("Performing repeated-measures ANOVA...")
+        between = group if group != x_col else None
+        anova_result = repeated_measures_anova(data, subject, x_col, y_col, between)
+
     # Perform repeated-measures ANOVA
     elif model == 'repeated-measures':
-        print("\nPerforming repeated-measures ANOVA...")
-        formula = f"{y_col} ~ C({x_col}) + C({x_col}, Treatment(reference='1'))*Time"
+        import statsmodels.api as sm
+        import statsmodels.formula.api as smf
+        logger.info("Performing repeated-measures ANOVA...")
+        formula = f"{y_col} ~ {_design_formula('repeated-measures', x_col, group)}"
         model = smf.ols(formula, data).fit()
         anova_table = sm.stats.anova_lm(model, typ=2)
         anova_result = anova_table['F'][0:len(data[x_col].unique())]
 
     # Perform MANOVA
     elif model == 'MANOVA':
-        print("\nPerforming MANOVA...")
+        from statsmodels.multivariate.manova import MANOVA
+        logger.info("Performing MANOVA...")
         y_var = [var for var in data.columns if var != x_col]
-        manova_result = sm.multivariate.manova.MANOVA(data[y_var], data[x_col]).mv_test()
+        manova_result = MANOVA(data[y_var], data[x_col]).mv_test()
         anova_result = manova_result.results['x0']['stat'].iloc[0:len(data[x_col].unique())]
 
     else:
@@ -77,8 +488,9 @@ def main(): # Function to call the anova function
                         default = 'Group',
                         required= False)
     parser.add_argument('-y', '--y_col',
-                        help='The name of the column containing the dependent variable.',
-                        default = 'Antibody',
+                        help="The name of the column containing the dependent variable. Several names, or 'all', test many responses (1-way only).",
+                        nargs='+',
+                        default = ['Antibody'],
                         required= False)
     parser.add_argument('-g', '--group',
                         help='The name of the column containing the group variable.',
@@ -89,18 +501,74 @@ def main(): # Function to call the anova function
                         choices=['1-way', '2-way', 'repeated-measures', 'MANOVA'],
                         default='1-way',
                         required=False)
+    parser.add_argument('-s', '--subject',
+                        help='The name of the column identifying the subjects (repeated-measures ANOVA).',
+                        default=None,
+                        required=False)
+    parser.add_argument('-r', '--resampling',
+                        help='Compute the 1-way ANOVA p-value of a single response by resampling.',
+                        choices=['permutation', 'bootstrap'],
+                        default=None,
+                        required=False)
+    parser.add_argument('-n', '--n_resamples',
+                        help='Number of resamples. Default is 9999.',
+                        type=int,
+                        default=9999,
+                        required=False)
+    parser.add_argument('--seed',
+                        help='Seed for the resampling.',
+                        type=int,
+                        default=None,
+                        required=False)
+    parser.add_argument('-w', '--workers',
+                        help='Number of worker processes for the resampling. Default is 1.',
+                        type=int,
+                        default=1,
+                        required=False)
+    parser.add_argument('-l', '--log_titers',
+                        help='Convert the dependent variable to log2 titers (compare geometric mean titers).',
+                        action='store_true')
+    parser.add_argument('-z', '--zeros',
+                        help="How titers below the limit of detection are handled with --log_titers. Default is 'half_lod'.",
+                        choices=['half_lod', 'lod', 'drop', 'offset'],
+                        default='half_lod',
+                        required=False)
+    parser.add_argument('--lod',
+                        help='The limit of detection. Default is the smallest positive titer.',
+                        type=float,
+                        default=None,
+                        required=False)
+    parser.add_argument('--offset',
+                        help="The value added to every titer with --zeros offset. Default is 1.",
+                        type=float,
+                        default=1,
+                        required=False)
+    parser.add_argument('-c', '--correction',
+                        help="Multiple-testing correction across responses, e.g. 'bonferroni', 'holm' or 'fdr_bh'.",
+                        default=None,
+                        required=False)
     
+    instrumentation.add_arguments(parser)
+
     # Parse the command-line arguments into a 'dict'-like container
     args = parser.parse_args()
 
-    # Load data from file
-    data = pd.read_csv(args.data)
+    with instrumentation.from_arguments(args, 'anova'):
+        # Load data from file (through the columnar cache)
+        from data_cache import load_csv
+        with instrumentation.stage('load'):
+            data = load_csv(args.data)
+
+        # A single response is passed as a column name
+        y_col = args.y_col[0] if len(args.y_col) == 1 else args.y_col
 
-    # Perform ANOVA
-    anova_result = ANOVA(data, args.x_col, args.y_col, args.group, args.model)
+        # Perform ANOVA
+        anova_result = ANOVA(data, y_col=y_col, x_col=args.x_col, group=args.group, model=args.model, correction=args.correction, subject=args.subject,
+                             resampling=args.resampling, n_resamples=args.n_resamples, seed=args.seed, workers=args.workers,
+                             log_titers=args.log_titers, zeros=args.zeros, lod=args.lod, offset=args.offset)
 
     # Print the result of the ANOVA analysis
-    print("\nsuccess!\n")
+    logger.info("success!")
     print(anova_result, "\n")
     
 if __name__ == "__main__":
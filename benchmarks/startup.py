@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark for the command line scripts.
+
+Every run starts a fresh interpreter, so the timings include the imports that a
+user pays each time a script is called. Besides the wall time, the heavy modules
+that ended up loaded are reported, which shows whether an analysis path pulls in
+libraries it does not need (e.g. the 1-way ANOVA loading matplotlib or patsy).
+
+Usage: python benchmarks/startup.py [-r REPEATS] [-o results.csv]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["matplotlib", "statsmodels", "patsy", "Bio"]
+
+# name: arguments passed to the script
+SCENARIOS = {
+    "anova.py --help": ["anova.py", "--help"],
+    "anova.py 1-way": ["anova.py"],
+    "power_analysis.py --help": ["power_analysis.py", "--help"],
+    "power_analysis.py ANOVA": ["power_analysis.py"],
+    "power_analysis.py chi-squared": ["power_analysis.py", "-t", "chi-squared"],
+    "linear_regression.py --help": ["linear_regression.py", "--help"],
+    "stats.py --help": ["stats.py", "--help"],
+}
+
+# Runs the script as __main__ and reports the heavy modules it loaded on stderr
+RUNNER = """
+import sys, runpy
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+finally:
+    sys.stderr.write("LOADED:" + ",".join(m for m in {modules!r} if m in sys.modules) + "\\n")
+"""
+
+
+def time_scenario(args, repeats=5):
+    """
+    Start a fresh interpreter for the script `repeats` times.
+
+    Returns
+    -------
+    times : list of float
+        Wall time of each run in seconds.
+    loaded : str
+        The heavy modules loaded by the last run.
+    """
+    runner = RUNNER.format(modules=HEAVY_MODULES)
+    times = []
+    loaded = ""
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", runner] + args, cwd=REPO,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        times.append(time.perf_counter() - start)
+        for line in process.stderr.splitlines():
+            if line.startswith("LOADED:"):
+                loaded = line[len("LOADED:"):]
+    return times, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of each command line script.")
+    parser.add_argument("-r", "--repeats",
+                        type=int,
+                        default=5,
+                        help="number of cold starts per scenario (default: 5)")
+    parser.add_argument("-o", "--output",
+                        default=None,
+                        help="path to save the results as a csv file (default: not saved)")
+    args = parser.parse_args()
+
+    rows = []
+    for name, script_args in SCENARIOS.items():
+        times, loaded = time_scenario(script_args, args.repeats)
+        rows.append((name, min(times) * 1000, statistics.median(times) * 1000, loaded or "-"))
+        print(f"{name:32s} min {rows[-1][1]:8.1f} ms  median {rows[-1][2]:8.1f} ms  loaded: {rows[-1][3]}")
+
+    if args.output is not None:
+        with open(args.output, "w") as handle:
+            handle.write("scenario,min_ms,median_ms,heavy_modules\n")
+            for row in rows:
+                handle.write(f"{row[0]},{row[1]:.1f},{row[2]:.1f},{row[3].replace(',', ' ')}\n")
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Benchmark suite for the analysis hot paths on synthetic data.
+
+Synthetic datasets are generated at the requested scale (rows, groups, responses,
+sequences, sequence length) in a temporary directory, and every case is timed in this
+process: the ANOVA models, the grouped and streaming linear regression, the power
+analysis per test type, and the alignment pipeline (deduplicated MAFFT alignment,
+alignment matrix distances and neighbor-joining tree, PHYLIP conversion). Each case is
+run `repeats` times for the wall time and once more under tracemalloc for the peak
+memory of the Python and NumPy allocations. External programs (MAFFT) are not included
+in the peak memory; MAFFT cases are skipped when no MAFFT is found.
+
+Results are appended to a CSV file together with the commit, so runs of different
+versions can be compared.
+
+Usage: python benchmarks/suite.py [--rows N] [--groups N] [--responses N] [--sequences N]
+                                  [--length N] [-r REPEATS] [-k CASE ...] [-o results.csv]
+"""
+
+import os
+import io
+import sys
+import csv
+import time
+import argparse
+import logging
+import tempfile
+import warnings
+import statistics
+import contextlib
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+FIELDS = ["timestamp", "commit", "case", "units", "size", "repeats", "min_s", "median_s",
+          "throughput_per_s", "peak_mb", "status"]
+
+
+def titer_data(rows, groups, timepoints=4, seed=0):
+    """
+    Long-format antibody titers: every animal is measured at every timepoint.
+
+    Titers are two-fold dilutions (10, 20, 40, ...) around a group and time dependent
+    mean, like the data.csv layout (Animal, Timepoint, Antibody, Group) plus a Time column.
+    """
+    rng = np.random.default_rng(seed)
+    animals = max(groups * 2, rows // timepoints)
+    group = np.arange(animals) % groups + 1
+    animal = np.repeat(np.arange(1, animals + 1), timepoints)
+    timepoint = np.tile(np.arange(timepoints), animals)
+    group_long = np.repeat(group, timepoints)
+    log_titer = 3 + 0.5 * group_long + 0.8 * timepoint + np.repeat(rng.normal(0, 0.7, animals), timepoints) \
+        + rng.normal(0, 0.5, len(animal))
+    return pd.DataFrame({"Animal": animal,
+                         "Timepoint": timepoint,
+                         "Antibody": 10 * 2.0 ** np.clip(np.round(log_titer), 0, None),
+                         "Group": group_long,
+                         "Time": timepoint})
+
+
+def response_data(rows, groups, responses, seed=0):
+    """A group column and `responses` numeric response columns, some with group effects."""
+    rng = np.random.default_rng(seed)
+    group = np.arange(rows) % groups + 1
+    values = rng.normal(0, 1, (rows, responses))
+    values[:, ::3] += 0.2 * group[:, np.newaxis] # Every third response differs between groups
+    data = pd.DataFrame(values, columns=[f"R{number}" for number in range(responses)])
+    data.insert(0, "Group", group)
+    return data
+
+
+def regression_data(rows, groups, seed=0):
+    """x, y and a string group column with a different line per group."""
+    rng = np.random.default_rng(seed)
+    group = np.arange(rows) % groups
+    x = rng.uniform(0, 10, rows)
+    y = (1 + 0.1 * group) * x + group + rng.normal(0, 1, rows)
+    return pd.DataFrame({"x": x, "y": y, "group": [f"g{number}" for number in group]})
+
+
+def fasta_data(path, sequences, length, duplicates=0.5, seed=0):
+    """
+    Write `sequences` related RNA sequences of equal length to a fasta file.
+
+    The sequences descend from one ancestor with per-clade and per-sequence substitutions;
+    a fraction `duplicates` of them are exact copies of an earlier sequence.
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACGU", dtype=np.uint8)
+    ancestor = rng.choice(alphabet, length)
+    clades = [np.where(rng.random(length) < 0.05, rng.choice(alphabet, length), ancestor) for _ in range(8)]
+    with open(path, "w") as handle:
+        written = []
+        for number in range(sequences):
+            if written and rng.random() < duplicates:
+                sequence = written[rng.integers(len(written))]
+            else:
+                clade = clades[number % len(clades)]
+                sequence = np.where(rng.random(length) < 0.01, rng.choice(alphabet, length), clade).tobytes().decode()
+                written.append(sequence)
+            handle.write(f">seq{number + 1}\n{sequence}\n")
+    return path
+
+
+def _mafft_available():
+    executable = os.environ.get("MAFFT_EXECUTABLE", "mafft")
+    return os.path.isfile(executable) or any(os.path.isfile(os.path.join(directory, executable))
+                                             for directory in os.environ.get("PATH", "").split(os.pathsep))
+
+
+def build_cases(args, workdir):
+    """
+    Generate the datasets and return the benchmark cases.
+
+    Returns
+    -------
+    cases : list of tuple
+        (name, units, size, function) for every case; size is the number of units
+        (rows, responses, sequences, ...) one call processes.
+    """
+    import anova
+    import power_analysis
+    import linear_regression
+    import alignment
+    import alignment_matrix
+    import phylogeny
+
+    titers = titer_data(args.rows, args.groups)
+    responses = response_data(args.rows, args.groups, args.responses)
+    manova = responses.iloc[:, :min(5, args.responses) + 1]
+    regression_path = os.path.join(workdir, "regression.csv")
+    regression_data(args.rows, args.groups).to_csv(regression_path, index=False)
+    fasta_path = fasta_data(os.path.join(workdir, "sequences.fasta"), args.sequences, args.length)
+    aligned_path = os.path.join(workdir, "aligned.fasta")
+    response_columns = [column for column in responses.columns if column != "Group"]
+
+    cases = [
+        ("ANOVA 1-way", "rows", len(titers),
+         lambda: anova.ANOVA(titers, "Group", "Antibody", "Group", "1-way")),
+        ("ANOVA 1-way many responses", "responses", args.responses,
+         lambda: anova.ANOVA(responses, "Group", response_columns, "Group", "1-way")),
+        ("ANOVA 2-way", "rows", len(titers),
+         lambda: anova.ANOVA(titers, "Group", "Antibody", "Timepoint", "2-way")),
+        ("ANOVA repeated-measures", "rows", len(titers),
+         lambda: anova.ANOVA(titers, "Timepoint", "Antibody", "Group", "repeated-measures", subject="Animal")),
+        ("ANOVA repeated-measures OLS", "rows", len(titers), # The formula refers to group '1' as text
+         lambda: anova.ANOVA(titers.astype({"Group": str}), "Group", "Antibody", "Group", "repeated-measures")),
+        ("ANOVA MANOVA", "rows", len(manova),
+         lambda: anova.ANOVA(manova, "Group", None, "Group", "MANOVA")),
+        ("ANOVA 1-way permutation", "resamples", 999,
+         lambda: anova.ANOVA(titers, "Group", "Antibody", "Group", "1-way", resampling="permutation",
+                             n_resamples=999, seed=1)),
+        ("linear_regression grouped", "rows", args.rows,
+         lambda: linear_regression.linear_regression("x", "y", "x", "y", os.path.join(workdir, "lr"), "group",
+                                                     regression_path, save_plots=False)),
+        ("linear_regression streaming", "rows", args.rows,
+         lambda: linear_regression.linear_regression("x", "y", "x", "y", os.path.join(workdir, "lr"), "group",
+                                                     regression_path, save_plots=False,
+                                                     chunksize=max(1, args.rows // 4))),
+    ]
+    for test in ["ANOVA", "t-test", "two-sample-t", "chi-squared"]:
+        cases.append((f"power_analysis {test}", "calls", 1,
+                      lambda test=test: power_analysis.power_analysis(0.3, 0.8, 0.05, test)))
+    cases.append(("power_analysis sample size grid", "cells", 100 * 3,
+                  lambda: power_analysis.solve_sample_size(np.linspace(0.1, 1, 100)[:, np.newaxis],
+                                                           np.array([0.7, 0.8, 0.9]), 0.05)))
+
+    if _mafft_available():
+        cases.append(("alignment deduplicated MAFFT", "sequences", args.sequences,
+                      lambda: alignment.align_deduplicated(fasta_path, aligned_path, args.threads, cache_dir=None)))
+    else: # Later cases use the generated sequences, which are already of equal length
+        aligned_path = fasta_path
+    cases += [
+        ("alignment deduplicate", "sequences", args.sequences,
+         lambda: alignment.deduplicate(alignment.read_fasta(fasta_path))),
+        ("alignment_matrix distances", "pairs", args.sequences * (args.sequences - 1) // 2,
+         lambda: alignment_matrix.AlignmentMatrix.from_fasta(aligned_path).distances()),
+        ("alignment_matrix site variability", "sites", args.length,
+         lambda: alignment_matrix.AlignmentMatrix.from_fasta(aligned_path).site_variability()),
+        ("alignment_matrix NJ tree", "sequences", args.sequences,
+         lambda: alignment_matrix.AlignmentMatrix.from_fasta(aligned_path).nj_tree()),
+        ("phylogeny PHYLIP conversion", "sequences", args.sequences,
+         lambda: phylogeny.fasta_to_phylip(aligned_path, os.path.join(workdir, "aligned.phy"))),
+    ]
+    return cases
+
+
+def measure(function, repeats=3):
+    """
+    Time a function and measure its peak memory.
+
+    Returns
+    -------
+    times : list of float
+        Wall time of each of the `repeats` runs in seconds.
+    peak : float
+        Peak memory allocated during one more run, traced with tracemalloc, in bytes.
+    """
+    times = []
+    # The analyses log their progress and results; keep the log handlers (and any other
+    # output or warnings) out of the timing. Errors are still logged.
+    logging.disable(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - start)
+            tracemalloc.start()
+            try:
+                function()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    finally:
+        logging.disable(logging.NOTSET)
+    return times, peak
+
+
+def _commit():
+    """The current commit of the repository, or "unknown"."""
+    process = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return process.stdout.strip() if process.returncode == 0 else "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the analyses on synthetic data of a given scale.")
+    parser.add_argument("--rows",
+                        type=int,
+                        default=100_000,
+                        help="rows of the titer, response and regression data (default: 100000)")
+    parser.add_argument("--groups",
+                        type=int,
+                        default=4,
+                        help="number of groups (default: 4)")
+    parser.add_argument("--responses",
+                        type=int,
+                        default=200,
+                        help="response columns for the many-response ANOVA (default: 200)")
+    parser.add_argument("--sequences",
+                        type=int,
+                        default=500,
+                        help="number of sequences (default: 500)")
+    parser.add_argument("--length",
+                        type=int,
+                        default=1000,
+                        help="sequence length (default: 1000)")
+    parser.add_argument("--threads",
+                        type=int,
+                        default=1,
+                        help="MAFFT threads (default: 1)")
+    parser.add_argument("-r", "--repeats",
+                        type=int,
+                        default=3,
+                        help="timed runs per case (default: 3)")
+    parser.add_argument("-k", "--cases",
+                        nargs="+",
+                        default=None,
+                        help="only run the cases whose name contains one of these words")
+    parser.add_argument("-o", "--output",
+                        default="benchmark_results.csv",
+                        help="csv file the results are appended to (default: benchmark_results.csv)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    commit = _commit()
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir) # Caches and plots of the analyses stay in the temporary directory
+        try:
+            for name, units, size, function in build_cases(args, workdir):
+                if args.cases and not any(word.lower() in name.lower() for word in args.cases):
+                    continue
+                try:
+                    times, peak = measure(function, args.repeats)
+                    status = "ok"
+                except Exception as error: # Keep going, a failing case is reported in the results
+                    times, peak, status = [np.nan], np.nan, f"{type(error).__name__}: {str(error).strip()}"
+                best = min(times)
+                rows.append({"timestamp": timestamp, "commit": commit, "case": name, "units": units, "size": size,
+                             "repeats": args.repeats, "min_s": f"{best:.6f}",
+                             "median_s": f"{statistics.median(times):.6f}",
+                             "throughput_per_s": f"{size / best:.1f}" if best > 0 else "",
+                             "peak_mb": f"{peak / 1e6:.2f}", "status": status})
+                print(f"{name:36s} min {best * 1000:10.1f} ms  {rows[-1]['throughput_per_s']:>14s} {units}/s  "
+                      f"peak {rows[-1]['peak_mb']:>9s} MB  {status}")
+        finally:
+            os.chdir(cwd)
+
+    new_file = not os.path.isfile(output)
+    with open(output, "a", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nResults appended to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Shared data loading with a columnar on-disk cache.
+
+The first time a CSV file is read, a typed copy is stored as an uncompressed Feather
+file, with the dtypes pandas.read_csv gives (and categoricals for the columns the
+caller asks for). Later reads load only the requested columns from that copy,
+memory-mapped, instead of parsing the whole CSV again. The cache is keyed by the
+absolute path, modification time and size of the CSV and by the categorical columns,
+so it is invalidated as soon as the CSV changes, and stale copies of the same CSV
+are removed.
+
+Feather files need pyarrow. Without it, load_csv falls back to pandas.read_csv.
+"""
+
+import os
+import glob
+import hashlib
+import contextlib
+import pandas as pd
+
+CACHE_DIR = ".data_cache"
+
+
+def _cache_paths(path, cache_dir, categorical=()):
+    """The cache file for the current state of path, and the pattern matching all its versions."""
+    source = os.path.abspath(path)
+    status = os.stat(source)
+    source_key = hashlib.sha256(source.encode()).hexdigest()[:16]
+    options_key = hashlib.sha256("\0".join(sorted(categorical)).encode()).hexdigest()[:8]
+    state_key = hashlib.sha256(f"{status.st_mtime_ns}:{status.st_size}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(source))[0]
+    prefix = os.path.join(cache_dir, f"{stem}-{source_key}-{options_key}-")
+    return prefix + state_key + ".feather", prefix + "*.feather"
+
+
+def _store(path, cache_file, pattern, categorical):
+    """Parse the CSV once, store the typed columnar copy and return the full table."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    data = pd.read_csv(path)
+    for column in data.columns:
+        if column in categorical:
+            data[column] = data[column].astype("category")
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    for stale in glob.glob(pattern): # Older versions of the same CSV
+        if stale == cache_file: # Another process may be reading the current copy
+            continue
+        with contextlib.suppress(FileNotFoundError): # Or removing the same stale copy
+            os.remove(stale)
+    temporary = cache_file + f".{os.getpid()}.tmp" # Write then rename, so readers never see a partial file
+    feather.write_feather(pa.Table.from_pandas(data, preserve_index=False), temporary, compression="uncompressed")
+    os.replace(temporary, cache_file)
+    return data
+
+
+def load_csv(path, columns=None, categorical=(), cache_dir=CACHE_DIR):
+    """
+    Read a CSV file through the columnar cache.
+
+    Parameters
+    ----------
+    path : str
+        The path to the CSV file.
+    columns : list of str
+        The columns to load. Default is None (all columns).
+    categorical : sequence of str
+        Columns to load as categoricals, e.g. string or integer group codes. Default is ()
+        (the dtypes of pandas.read_csv).
+    cache_dir : str
+        Directory holding the cached copies. Default is ".data_cache". None disables the cache.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        The requested columns.
+    """
+    if not os.path.isfile(path): # Check if the file exists
+        raise FileNotFoundError(f"File not found: {path}")
+
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        feather = None
+    if cache_dir is None or feather is None: # No cache, parse the CSV
+        data = pd.read_csv(path, usecols=columns)
+        return data.astype({column: "category" for column in categorical if column in data.columns})
+
+    cache_file, pattern = _cache_paths(path, cache_dir, categorical)
+    if os.path.isfile(cache_file):
+        table = feather.read_table(cache_file, columns=None if columns is None else list(columns), memory_map=True)
+        return table.to_pandas()
+
+    data = _store(path, cache_file, pattern, set(categorical))
+    return data if columns is None else data[list(columns)]
+
+
+def csv_columns(path, cache_dir=CACHE_DIR):
+    """The column names of a CSV file, from the cached copy when there is one."""
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        feather = None
+    if cache_dir is not None and feather is not None:
+        cache_file, pattern = _cache_paths(path, cache_dir)
+        state = os.path.basename(cache_file).rsplit("-", 1)[1]
+        cached = glob.glob(pattern.rsplit("-", 2)[0] + "-*-" + state) # Any copy of this state of the CSV
+        if cached:
+            import pyarrow.ipc as ipc
+            with ipc.open_file(cached[0]) as reader:
+                return list(reader.schema.names)
+    return list(pd.read_csv(path, nrows=0).columns)
@@ -0,0 +1,278 @@
+"""
+Timing, counting and profiling of analysis runs, and the logging setup of the scripts.
+
+An analysis is wrapped in run(); inside it, the code marks its stages with stage() and
+reports the size of its input with count():
+
+    with instrumentation.run("anova", report="table") as record:
+        with instrumentation.stage("load"):
+            data = load_csv(path)
+        instrumentation.count(rows=len(data))
+        ...
+
+The stages used across the analyses are load (reading files), preprocess (transforming
+the data), fit (the statistics), render (plots) and external (MAFFT, RAxML). Time spent
+in a stage is added up per stage name. When no run is active, stage() and count() only
+log at DEBUG level, so the analysis functions can be called on their own without
+overhead.
+
+At the end of a run its record (wall time, stage times, counts and, when requested, the
+peak traced memory and a cProfile dump) is logged as a table or as one JSON line, and
+can be appended to a JSON-lines file. Progress messages of the analyses go through the
+logging module; configure_logging() sets the level and plain or JSON output.
+"""
+
+import sys
+import json
+import time
+import logging
+import contextlib
+import contextvars
+
+
+STAGES = ["load", "preprocess", "fit", "render", "external"]
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("instrumentation_run", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format every log record as one JSON object."""
+
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        if hasattr(record, "run"): # Run records are logged as data, not only as text
+            entry["run"] = record.run
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level="INFO", json_logs=False, stream=None):
+    """
+    Send the log messages of the analyses to stderr (or stream).
+
+    Parameters
+    ----------
+    level : str or int
+        The lowest level shown, e.g. "DEBUG" (stage timings as they happen), "INFO"
+        (progress messages, default) or "WARNING" (quiet).
+    json_logs : bool
+        Write every message as a JSON object. Default is False (plain text).
+    stream : file
+        Where to write. Default is None (stderr).
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_logs else logging.Formatter("%(message)s"))
+    handler._instrumentation = True
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if getattr(h, "_instrumentation", False)]: # Configure only once
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class Run:
+    """
+    The record of one analysis run.
+
+    Attributes
+    ----------
+    name : str
+        The analysis.
+    stages : dict
+        Seconds spent per stage, in the order the stages were first entered.
+    counts : dict
+        Sizes reported with count(), e.g. rows and groups.
+    wall_time : float
+        Seconds from the start to the end of the run.
+    peak_memory_mb : float
+        Peak memory traced by tracemalloc, when requested.
+    profile : str
+        The file holding the cProfile statistics, when requested.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.counts = {}
+        self.wall_time = None
+        self.peak_memory_mb = None
+        self.profile = None
+        self.started = time.time()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        record = {"analysis": self.name,
+                  "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                  "wall_time": self.wall_time,
+                  "stages": dict(self.stages),
+                  "counts": dict(self.counts)}
+        if self.peak_memory_mb is not None:
+            record["peak_memory_mb"] = self.peak_memory_mb
+        if self.profile is not None:
+            record["profile"] = self.profile
+        return record
+
+    def table(self):
+        """The record as a small text table."""
+        lines = [f"{self.name}: {self.wall_time:.3f} s"]
+        for stage, seconds in self.stages.items():
+            share = seconds / self.wall_time * 100 if self.wall_time else 0
+            lines.append(f"  {stage:<12s}{seconds:10.3f} s {share:6.1f}%")
+        other = self.wall_time - sum(self.stages.values())
+        if self.stages and other > 0:
+            lines.append(f"  {'other':<12s}{other:10.3f} s {other / self.wall_time * 100:6.1f}%")
+        for key, value in self.counts.items():
+            lines.append(f"  {key:<12s}{value:>10}")
+        if self.peak_memory_mb is not None:
+            lines.append(f"  {'peak memory':<12s}{self.peak_memory_mb:10.2f} MB")
+        if self.profile is not None:
+            lines.append(f"  profile saved to {self.profile}")
+        return "\n".join(lines)
+
+
+def current():
+    """The active Run, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage of the active run (see the module docstring for the stage names)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record = _current.get()
+        if record is not None:
+            record.add(name, seconds)
+        logger.debug("%s: %.3f s", name, seconds)
+
+
+def count(**counts):
+    """Record sizes for the active run, e.g. count(rows=1000, groups=4)."""
+    record = _current.get()
+    if record is not None:
+        record.counts.update(counts)
+    logger.debug("counts: %s", counts)
+
+
+def emit(record, report="table", log_file=None):
+    """
+    Log a finished run as a table or as JSON, and append it to a JSON-lines file.
+
+    Parameters
+    ----------
+    record : Run
+        The finished run.
+    report : str
+        'table', 'json' or None (only log_file). Default is 'table'.
+    log_file : str
+        File the run is appended to as one JSON line. Default is None.
+    """
+    data = record.as_dict()
+    if report == "table":
+        logger.info(record.table(), extra={"run": data})
+    elif report == "json":
+        logger.info(json.dumps(data, default=str), extra={"run": data})
+    if log_file is not None:
+        with open(log_file, "a") as handle:
+            handle.write(json.dumps(data, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def run(name, report=None, log_file=None, profile=None, trace_memory=False):
+    """
+    Record the stages, counts and optionally the profile and peak memory of an analysis.
+
+    Parameters
+    ----------
+    name : str
+        The analysis.
+    report : str
+        How the record is logged at the end: 'table', 'json' or None. Default is None.
+    log_file : str
+        File the record is appended to as one JSON line. Default is None.
+    profile : str
+        Profile the run with cProfile and save the statistics to this file (read them with
+        pstats or snakeviz). The top functions are logged at DEBUG level. Default is None.
+    trace_memory : bool
+        Measure the peak memory of the run with tracemalloc (slows the run down). Default is False.
+
+    Yields
+    ------
+    record : Run
+        The record, complete once the block has finished.
+    """
+    record = Run(name)
+    token = _current.set(record)
+    profiler = None
+    tracing = False
+    if profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+    if trace_memory:
+        import tracemalloc
+        tracing = not tracemalloc.is_tracing() # A run inside a traced run shares its tracing
+        if tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record.wall_time = time.perf_counter() - start
+        if trace_memory:
+            record.peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            if tracing:
+                tracemalloc.stop()
+        if profiler is not None:
+            import io
+            import pstats
+            profiler.dump_stats(profile)
+            record.profile = profile
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(15)
+            logger.debug(text.getvalue())
+        _current.reset(token)
+        emit(record, report, log_file)
+
+
+def add_arguments(parser):
+    """Add the logging and instrumentation options to a script's argument parser."""
+    group = parser.add_argument_group("logging and instrumentation")
+    group.add_argument("--log_level",
+                       help="DEBUG, INFO (default) or WARNING",
+                       default="INFO")
+    group.add_argument("--log_json",
+                       help="Write log messages as JSON objects",
+                       action="store_true")
+    group.add_argument("--timings",
+                       help="Log the time spent per stage and the data size at the end, as a table or as JSON",
+                       choices=["table", "json"],
+                       default=None)
+    group.add_argument("--timings_file",
+                       help="Append the timings of every run to this JSON-lines file",
+                       default=None)
+    group.add_argument("--profile",
+                       help="Profile the run with cProfile and save the statistics to this file",
+                       default=None)
+    group.add_argument("--trace_memory",
+                       help="Measure the peak memory with tracemalloc",
+                       action="store_true")
+    return parser
+
+
+def from_arguments(args, name):
+    """Configure logging from the parsed options of add_arguments and return the run() context for them."""
+    configure_logging(args.log_level, args.log_json)
+    return run(name, args.timings, args.timings_file, args.profile, args.trace_memory)
@@ -1,7 +1,13 @@
 import os
+import sys
+import logging
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from scipy import stats
+import instrumentation
+from data_cache import load_csv, csv_columns
 
 """
 Testing the linear_regression function with the iris dataset.
@@ -9,11 +15,319 @@ If the group variable is not in the dataframe, the function will plot all data.
 If the group variable is in the dataframe, the function will plot each group.
 The check functions seem to be working. I need to create a test function to check.
 I would still like to add in the ability to add R2, p value, and slope to the plot. 
-I would also like to add a funciton to have group being present, but instead of producing
-a graph for each group, it would produce a graph with all the groups on the same plot.
+Group being present can also produce a graph with all the groups on the same plot (combined=True)
 """
 
 
+logger = logging.getLogger(__name__)
+
+
+def _pyplot(interactive=True):
+    """
+    Import matplotlib.pyplot on first use.
+
+    When the plots are only saved (interactive is False) and pyplot has not been
+    loaded yet, the non-interactive Agg backend is selected, which starts faster
+    and does not need a display.
+    """
+    if not interactive and "matplotlib.pyplot" not in sys.modules:
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+STATISTICS = ["n", "mean_x", "mean_y", "m2_x", "m2_y", "c_xy"]
+MERGE_EVERY = 256 # Chunk statistics kept by streaming_statistics before they are merged
+
+
+def sufficient_statistics(dataframe, x, y, group=None):
+    """
+    Compute the per-group moments needed for a linear regression.
+
+    The sums of squares are taken around the group means (two passes, with the values
+    first shifted by the group's first value), so a large offset in x or y does not
+    cancel the variation out, and a constant x gives a sum of squares of exactly 0.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        The data.
+    x : str
+        The column holding the independent variable.
+    y : str
+        The column holding the dependent variable.
+    group : str
+        Column to subdivide the data. Default is None (all rows form one group).
+
+    Returns
+    -------
+    statistics : pandas.DataFrame
+        One row per group with the columns n, mean_x, mean_y, m2_x and m2_y (sums of
+        squared deviations from the mean) and c_xy (sum of the products of the deviations).
+        Rows with a missing x or y are ignored.
+    """
+    x_data = dataframe[x].to_numpy(dtype=float)
+    y_data = dataframe[y].to_numpy(dtype=float)
+    complete = np.isfinite(x_data) & np.isfinite(y_data) # Drop incomplete rows
+
+    if group is None:
+        codes = np.zeros(len(x_data), dtype=np.intp)
+        index = pd.RangeIndex(1)
+    else:
+        codes, groups = pd.factorize(dataframe[group], sort=True)
+        complete &= codes >= 0 # Rows without a group are left out, as by groupby
+        index = pd.Index(groups, name=group)
+    x_data, y_data, codes = x_data[complete], y_data[complete], codes[complete]
+    size = len(index)
+
+    n = np.bincount(codes, minlength=size).astype(float)
+    present, first = np.unique(codes, return_index=True)
+    x_shift, y_shift = np.zeros(size), np.zeros(size)
+    x_shift[present] = x_data[first]
+    y_shift[present] = y_data[first]
+    dx = x_data - x_shift[codes]
+    dy = y_data - y_shift[codes]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx_mean = np.bincount(codes, dx, minlength=size) / n
+        dy_mean = np.bincount(codes, dy, minlength=size) / n
+    dx -= dx_mean[codes] # Deviations from the group means
+    dy -= dy_mean[codes]
+
+    statistics = pd.DataFrame({"n": n,
+                               "mean_x": x_shift + dx_mean,
+                               "mean_y": y_shift + dy_mean,
+                               "m2_x": np.bincount(codes, dx * dx, minlength=size),
+                               "m2_y": np.bincount(codes, dy * dy, minlength=size),
+                               "c_xy": np.bincount(codes, dx * dy, minlength=size)},
+                              index=index)
+    return statistics if group is None else statistics[n > 0]
+
+
+def merge_statistics(*statistics):
+    """
+    Combine sufficient statistics computed on separate parts of the data.
+
+    The moments are merged with the pairwise update of Chan, Golub and LeVeque,
+    generalized to any number of parts: the sums of squares of the parts are added to
+    the spread of the part means around the combined mean.
+
+    Parameters
+    ----------
+    *statistics : pandas.DataFrame
+        Outputs of sufficient_statistics, e.g. from different files, chunks or workers.
+
+    Returns
+    -------
+    statistics : pandas.DataFrame
+        The statistics of all parts together, one row per group.
+    """
+    combined = pd.concat(statistics)
+    combined = combined[combined["n"] > 0]
+    keys = combined.index.get_level_values(0)
+    grouped = combined.groupby(keys, sort=True)
+    n = grouped["n"].transform("sum")
+    reference = grouped[["mean_x", "mean_y"]].transform("first") # Equal part means merge exactly
+    dx = combined["mean_x"] - reference["mean_x"]
+    dy = combined["mean_y"] - reference["mean_y"]
+    dx_mean = (combined["n"] * dx).groupby(keys).transform("sum") / n
+    dy_mean = (combined["n"] * dy).groupby(keys).transform("sum") / n
+    dx, dy = dx - dx_mean, dy - dy_mean # Part means relative to the combined mean
+
+    merged = pd.DataFrame({"n": combined["n"],
+                           "mean_x": 0.0,
+                           "mean_y": 0.0,
+                           "m2_x": combined["m2_x"] + combined["n"] * dx * dx,
+                           "m2_y": combined["m2_y"] + combined["n"] * dy * dy,
+                           "c_xy": combined["c_xy"] + combined["n"] * dx * dy}).groupby(keys, sort=True).sum()
+    merged["mean_x"] = (reference["mean_x"] + dx_mean).groupby(keys, sort=True).first()
+    merged["mean_y"] = (reference["mean_y"] + dy_mean).groupby(keys, sort=True).first()
+    merged.index.name = combined.index.name
+    return merged[STATISTICS]
+
+
+def streaming_statistics(path, x, y, group=None, chunksize=1_000_000):
+    """
+    Accumulate sufficient statistics over a CSV file without loading it into memory.
+
+    Only the x, y and group columns are read, chunksize rows at a time, with x and y
+    as float64; the group keeps the type pandas.read_csv gives it, so the groups are
+    labelled as in grouped_regression. The statistics of the chunks are kept
+    and merged together at the end (every MERGE_EVERY chunks for long files), so
+    memory use is bounded by the chunk size and the number of groups.
+
+    Parameters
+    ----------
+    path : str
+        The path to the data file.
+    x : str
+        The column holding the independent variable.
+    y : str
+        The column holding the dependent variable.
+    group : str
+        Column to subdivide the data. Default is None (all rows form one group).
+    chunksize : int
+        Number of rows read at a time. Default is 1,000,000.
+
+    Returns
+    -------
+    statistics : pandas.DataFrame
+        One row per group, see sufficient_statistics.
+    """
+    columns = [x, y] if group is None else [x, y, group]
+    dtypes = {x: "float64", y: "float64"}
+
+    parts = []
+    rows = 0
+    reader = pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+    while True:
+        with instrumentation.stage("load"): # Parsing and fitting alternate, so both are timed per chunk
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        rows += len(chunk)
+        with instrumentation.stage("fit"):
+            parts.append(sufficient_statistics(chunk, x, y, group))
+            if len(parts) >= MERGE_EVERY: # Merge in batches, so memory stays bounded for very long files
+                parts = [merge_statistics(*parts)]
+
+    if not parts: # Empty file
+        raise ValueError(f"No data in {path}")
+    with instrumentation.stage("fit"):
+        statistics = merge_statistics(*parts)
+    instrumentation.count(rows=rows, groups=len(statistics))
+    return statistics
+
+
+def streaming_regression(path, x, y, group=None, chunksize=1_000_000):
+    """
+    Fit the linear regression of every group of a CSV file that does not fit in memory.
+
+    Gives the same results as grouped_regression on the full file. See
+    streaming_statistics for the parameters.
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per group, see regression_from_statistics.
+    """
+    return regression_from_statistics(streaming_statistics(path, x, y, group, chunksize))
+
+
+def regression_from_statistics(statistics):
+    """
+    Compute the linear regression of every group from its sufficient statistics.
+
+    Gives the same slope, intercept, r-value, p-value and standard error as
+    scipy.stats.linregress, for all groups at once.
+
+    Parameters
+    ----------
+    statistics : pandas.DataFrame
+        Output of sufficient_statistics (or merge_statistics).
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per group with the columns slope, intercept, r_value, p_value, stderr,
+        intercept_stderr and n. Groups whose x values are all identical get NaN.
+    """
+    n = statistics["n"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = statistics["mean_x"].to_numpy(dtype=float)
+        y_mean = statistics["mean_y"].to_numpy(dtype=float)
+        ssxm = statistics["m2_x"].to_numpy(dtype=float) / n # Biased (co)variances, as in linregress
+        ssym = statistics["m2_y"].to_numpy(dtype=float) / n
+        ssxym = statistics["c_xy"].to_numpy(dtype=float) / n
+        ssxm = np.where(ssxm > 0, ssxm, np.nan) # No slope when x is constant
+        ssym = np.maximum(ssym, 0)
+
+        r_value = np.where(ssym > 0, ssxym / np.sqrt(ssxm * ssym), 0.0)
+        r_value = np.clip(r_value, -1.0, 1.0)
+        slope = ssxym / ssxm
+        intercept = y_mean - slope * x_mean
+
+        dof = n - 2
+        t_value = r_value * np.sqrt(dof / ((1.0 - r_value) * (1.0 + r_value)))
+        p_value = 2 * stats.t.sf(np.abs(t_value), dof)
+        stderr = np.sqrt((1 - r_value**2) * ssym / ssxm / dof)
+
+    # Two points always lie on a line
+    two_points = n == 2
+    p_value = np.where(two_points, np.where(ssym > 0, 0.0, 1.0), p_value)
+    stderr = np.where(two_points, 0.0, stderr)
+    intercept_stderr = stderr * np.sqrt(ssxm + x_mean**2)
+
+    return pd.DataFrame({"slope": slope,
+                         "intercept": intercept,
+                         "r_value": r_value,
+                         "p_value": p_value,
+                         "stderr": stderr,
+                         "intercept_stderr": intercept_stderr,
+                         "n": n.astype(int)},
+                        index=statistics.index)
+
+
+def grouped_regression(dataframe, x, y, group):
+    """
+    Fit a linear regression of y on x for every group at once.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        The data.
+    x : str
+        The column holding the independent variable.
+    y : str
+        The column holding the dependent variable.
+    group : str
+        Column to subdivide the data.
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per group, see regression_from_statistics.
+    """
+    return regression_from_statistics(sufficient_statistics(dataframe, x, y, group))
+
+
+def resampled_slope(x_data, y_data, resampling, n_resamples=9999, seed=None, workers=1, memory_budget=256_000_000,
+                    executor=None):
+    """
+    Resampling inference for the slope of one regression.
+
+    Parameters
+    ----------
+    x_data, y_data : array_like
+        The independent and dependent variable.
+    resampling : str
+        'permutation' for a permutation p-value, 'bootstrap' for a bootstrap confidence interval.
+    n_resamples, seed, workers, memory_budget, executor
+        See the resampling module.
+
+    Returns
+    -------
+    values : dict
+        'p_value_permutation', or 'slope_stderr_bootstrap', 'slope_ci_low' and 'slope_ci_high'.
+    """
+    import resampling as resample
+
+    if resampling == "permutation":
+        result = resample.slope_permutation_test(x_data, y_data, n_resamples, seed, workers, memory_budget, executor)
+        return {"p_value_permutation": result["p_value"]}
+    elif resampling == "bootstrap":
+        result = resample.slope_bootstrap(x_data, y_data, n_resamples, seed, workers, memory_budget, executor=executor)
+        return {"slope_stderr_bootstrap": result["stderr"], "slope_ci_low": result["ci_low"], "slope_ci_high": result["ci_high"]}
+    raise ValueError(f"Invalid resampling method: {resampling}")
+
+
+def _log_results(results):
+    """Log the number of fitted groups; the full table (slow to format for many groups) only at DEBUG level."""
+    logger.info(f"Fitted {len(results)} groups")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(results.to_string())
+
+
 def linear_regression(x="petal_length_cm", 
                       y="sepal_length_cm", 
                       x_lab="Petal Length (cm)", 
@@ -23,7 +337,19 @@ def linear_regression(x="petal_length_cm",
                       path="iris.csv", 
                       save_plots=True,
                       point_color='b', 
-                      line_color='r'):
+                      line_color='r',
+                      chunksize=None,
+                      workers=None,
+                      combined=False,
+                      density="sample",
+                      resampling=None,
+                      n_resamples=9999,
+                      seed=None,
+                      memory_budget=256_000_000,
+                      log_titers=False,
+                      zeros="half_lod",
+                      lod=None,
+                      offset=1):
     """
     Perform linear regression and create a graph containing slope and trendline.
 
@@ -49,11 +375,42 @@ def linear_regression(x="petal_length_cm",
         The color of the scatter points. Default is '0.2'.
     line_color : str
         The color of the trendline. Default is 'k'.
+    chunksize : int
+        Read the data file in chunks of this many rows and fit from accumulated sums, for
+        files larger than memory. Plots, resampling and log_titers are not available in this
+        mode (ValueError), so save_plots must be False. Default is None (read the whole file).
+    workers : int
+        Number of processes rendering the group plots and running the resampling. Default is None
+        (one per CPU for plotting, one for resampling).
+    combined : bool
+        Draw all groups on one plot ("{output}_all.png") instead of one plot per group. Default is False.
+    density : str
+        How very large groups are drawn on the combined plot, 'sample' or 'hexbin'. Default is 'sample'.
+    resampling : str
+        'permutation' adds a permutation p-value of the slope, 'bootstrap' a bootstrap standard error and
+        95% confidence interval of the slope. Not available with chunksize. Default is None.
+    n_resamples : int
+        Number of resamples. Default is 9999.
+    seed : int
+        Seed for the resampling. Default is None.
+    memory_budget : float
+        Approximate memory per worker for one block of resamples, in bytes. Default is 256 MB.
+    log_titers : bool
+        Convert y to log2 titers before fitting (see the preprocess module). Not available with
+        chunksize. Default is False.
+    zeros : str
+        How titers below the limit of detection are handled with log_titers: 'half_lod', 'lod', 'drop'
+        or 'offset' (see the preprocess module). Default is 'half_lod'.
+    lod : float
+        The limit of detection. Default is None (the smallest positive titer).
+    offset : float
+        The value added to every titer with zeros='offset'. Default is 1.
 
     Returns
     -------
-    results : dict
-        A dictionary containing the slope, intercept, r-value, p-value, and standard error for each group.
+    results : dict or pandas.DataFrame
+        Without groups, a dictionary containing the slope, intercept, r-value, p-value, and standard error.
+        With groups, a DataFrame with one row per group, see grouped_regression.
     """
 
     #if not all(isinstance(arg, str) for arg in [x, y, x_lab, y_lab, group, path]): # Check if all arguments are strings
@@ -62,51 +419,39 @@ def linear_regression(x="petal_length_cm",
     if not os.path.isfile(path): # Check if the file exists
         raise FileNotFoundError("File not found")
 
-    dataframe = pd.read_csv(path) # Read the data file
+    if chunksize is not None: # Streaming mode, the data is never held in memory at once
+        unsupported = [name for name, value in [("save_plots", save_plots), ("combined", combined),
+                                                ("resampling", resampling), ("log_titers", log_titers)] if value]
+        if unsupported:
+            raise ValueError(f"Not available with chunksize: {', '.join(unsupported)}")
+        logger.info(f"Streaming data from {path} in chunks of {chunksize} rows")
+        header = csv_columns(path) # Only read the column names
+        group_column = group if group in header else None
+        results = streaming_regression(path, x, y, group_column, chunksize)
+        _log_results(results)
+        return results
 
-    print(f"\nReading data from {path}")
+    with instrumentation.stage("load"):
+        header = csv_columns(path)
+        columns = [x, y] + ([group] if group in header and group not in [x, y] else [])
+        dataframe = load_csv(path, columns) # Read only the needed columns of the data file
+
+    logger.info(f"Reading data from {path}")
+
+    if log_titers: # Fit the log2 titers
+        from preprocess import log_titer_columns
+        with instrumentation.stage("preprocess"):
+            dataframe = log_titer_columns(dataframe, y, zeros, lod, offset)
 
     if group not in dataframe.columns: # Check if the group variable is in the dataframe
-        print("\nGroup not found in dataframe. Plotting all data.")
+        logger.info("Group not found in dataframe. Plotting all data.")
+        instrumentation.count(rows=len(dataframe), groups=1)
         x_data = dataframe[x] # Set x_data to the x variable
-        print("\nThe independent variable is ", x)
+        logger.info(f"The independent variable is {x}")
         y_data = dataframe[y] # Set y_data to the y variable
-        print("\nThe dependent variable is ", y)
-
-        regression = stats.linregress(x_data, y_data) # Perform linear regression
-
-        slope = regression.slope # Set slope to the slope of the linear regression
-        intercept = regression.intercept # Set intercept to the intercept of the linear regression
-        r_value = regression.rvalue # Set r_value to the correlation coefficient
-        p_value = regression.pvalue # Set p_value to the p-value
-        stderr = regression.stderr # Set stderr to the standard error
-
-        plt.scatter(x_data, y_data, c=point_color) # Plot the data
-        print("\nPlotting data")
-        plt.plot(x_data, slope * x_data + intercept, c=line_color, label='Fitted line') # Plot the trendline
-        plt.xlabel(x_lab) # Set the x-axis label
-        plt.ylabel(y_lab) # Set the y-axis label
-        plt.legend() # Show the legend
-
-        if save_plots: # Save the plot if save_plots is True
-            plt.savefig(f"{output}.png") 
-            print("\nPlot saved as ", output, ".png")
-
-        plt.show() # Show the plot
-
-        return {"slope": slope, "intercept": intercept, "r_value": r_value, "p_value": p_value, "stderr": stderr}
-
-    else: # If the group variable is in the dataframe
-        print(f"\nGrouping data by {group}")
-        groups = dataframe.groupby(group) # Group the data by the group variable
-
-        for name, group_data in groups: # Loop through each group
-            x_data = group_data[x] # Set x_data to the x variable
-            print("\nThe independent variable is ", x)
-            y_data = group_data[y] # Set y_data to the y variable
-            print("\nThe dependent variable is ", y)
-            print("\nGroup name is ", name)
+        logger.info(f"The dependent variable is {y}")
 
+        with instrumentation.stage("fit"):
             regression = stats.linregress(x_data, y_data) # Perform linear regression
 
             slope = regression.slope # Set slope to the slope of the linear regression
@@ -114,22 +459,68 @@ def linear_regression(x="petal_length_cm",
             r_value = regression.rvalue # Set r_value to the correlation coefficient
             p_value = regression.pvalue # Set p_value to the p-value
             stderr = regression.stderr # Set stderr to the standard error
+            results = {"slope": slope, "intercept": intercept, "r_value": r_value, "p_value": p_value, "stderr": stderr}
+
+            if resampling is not None: # Resampling inference for the slope
+                logger.info(f"Resampling the slope ({resampling}, {n_resamples} resamples)")
+                results.update(resampled_slope(x_data, y_data, resampling, n_resamples, seed, workers or 1, memory_budget))
 
-            plt.scatter(x_data, y_data, c=point_color, label=name) # Plot the data
-            print("\nPlotting data")
-            plt.plot(x_data, slope * x_data + intercept, c=line_color) # Plot the trendline
+        with instrumentation.stage("render"):
+            plt = _pyplot(interactive=True) # The single plot is shown on screen
+            plt.scatter(x_data, y_data, c=point_color) # Plot the data
+            logger.info("Plotting data")
+            from plotting import _trendline
+            plt.plot(*_trendline(x_data.to_numpy(dtype=float), slope, intercept), c=line_color, label='Fitted line') # Plot the trendline between its endpoints
             plt.xlabel(x_lab) # Set the x-axis label
             plt.ylabel(y_lab) # Set the y-axis label
             plt.legend() # Show the legend
-            print("slope:", slope, "intercept:", intercept, "r_value:", r_value, "p_value:", p_value, "stderr:", stderr)
-
 
             if save_plots: # Save the plot if save_plots is True
-                plt.savefig(f"{output}_{name}.png") 
-                print("\nPlot saved as ", output, "_", name, ".png")
-            plt.clf() # Clear the plot
-                
-        print("\nPlots not shown because there are multiple groups.")
+                plt.savefig(f"{output}.png")
+                logger.info(f"Plot saved as {output}.png")
+
+        plt.show() # Show the plot
+
+        return results
+
+    else: # If the group variable is in the dataframe
+        logger.info(f"Grouping data by {group}")
+        with instrumentation.stage("fit"):
+            results = grouped_regression(dataframe, x, y, group) # Fit every group at once
+            logger.info(f"The independent variable is {x}, the dependent variable is {y}")
+
+            if resampling is not None: # Resampling inference for the slope of every group
+                logger.info(f"Resampling the slopes ({resampling}, {n_resamples} resamples)")
+                groups = list(dataframe.groupby(group, observed=True))
+                seeds = np.random.SeedSequence(seed).spawn(len(groups)) # An independent stream per group
+                pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else contextlib.nullcontext()
+                with pool as executor: # One pool for all groups
+                    resampled = {name: resampled_slope(group_data[x], group_data[y], resampling, n_resamples,
+                                                       group_seed, workers or 1, memory_budget, executor)
+                                 for (name, group_data), group_seed in zip(groups, seeds)}
+                results = results.join(pd.DataFrame.from_dict(resampled, orient="index"))
+        instrumentation.count(rows=len(dataframe), groups=len(results))
+        _log_results(results)
+
+        if save_plots and combined: # All groups on the same plot
+            from plotting import render_combined_plot
+            logger.info("Plotting data")
+            with instrumentation.stage("render"):
+                filename = render_combined_plot(dataframe, results, x, y, group, x_lab, y_lab, output, density)
+            logger.info(f"Plot saved as {filename}")
+        elif save_plots: # Plotting is a separate step after fitting
+            from plotting import render_group_plots
+            logger.info("Plotting data")
+            with instrumentation.stage("render"):
+                rendered = render_group_plots(dataframe, results, x, y, group, x_lab, y_lab, output,
+                                              point_color, line_color, workers=workers)
+            for filename in rendered:
+                logger.info(f"Plot saved as {filename}")
+            logger.info(f"{len(results) - len(rendered)} plots were unchanged and not redrawn.")
+            logger.info("Plots not shown because there are multiple groups.")
+
+        return results
+
 
 def main(): # Function to call the linear regression function
     import argparse
@@ -167,8 +558,8 @@ def main(): # Function to call the linear regression function
                         default="iris.csv",
                         required=False)
     parser.add_argument("-save_plots",
-                        help="Whether to save the plots or not",
-                        default=True,
+                        help="Whether to save the plots or not (default: yes, no with -chunksize)",
+                        default=None,
                         required=False)
     parser.add_argument("-point_color",
                         help="The color of the scatter points",
@@ -178,11 +569,65 @@ def main(): # Function to call the linear regression function
                         help="The color of the trendline",
                         default="k",
                         required=False)
+    parser.add_argument("-workers",
+                        help="Number of processes rendering the group plots",
+                        type=int,
+                        default=None,
+                        required=False)
+    parser.add_argument("-combined",
+                        help="Draw all groups on the same plot",
+                        action="store_true")
+    parser.add_argument("-density",
+                        help="How large groups are drawn on the combined plot",
+                        choices=["sample", "hexbin"],
+                        default="sample",
+                        required=False)
+    parser.add_argument("-resampling",
+                        help="Resampling inference for the slope",
+                        choices=["permutation", "bootstrap"],
+                        default=None,
+                        required=False)
+    parser.add_argument("-n_resamples",
+                        help="Number of resamples",
+                        type=int,
+                        default=9999,
+                        required=False)
+    parser.add_argument("-seed",
+                        help="Seed for the resampling",
+                        type=int,
+                        default=None,
+                        required=False)
+    parser.add_argument("-log_titers",
+                        help="Convert y to log2 titers before fitting",
+                        action="store_true")
+    parser.add_argument("-zeros",
+                        help="How titers below the limit of detection are handled with -log_titers",
+                        choices=["half_lod", "lod", "drop", "offset"],
+                        default="half_lod",
+                        required=False)
+    parser.add_argument("-lod",
+                        help="The limit of detection (default: the smallest positive titer)",
+                        type=float,
+                        default=None,
+                        required=False)
+    parser.add_argument("-offset",
+                        help="The value added to every titer with -zeros offset",
+                        type=float,
+                        default=1,
+                        required=False)
+    parser.add_argument("-chunksize",
+                        help="Read the data file in chunks of this many rows (for files larger than memory)",
+                        type=int,
+                        default=None,
+                        required=False)
+
+    instrumentation.add_arguments(parser)
 
     # Parse the command-line arguments into a 'dict'-like container
     args = parser.parse_args()
 
-    linear_regression(
+    with instrumentation.from_arguments(args, "linear_regression"):
+        results = linear_regression(
             args.x,
             args.y, 
             x_lab=args.x_lab,
@@ -190,9 +635,23 @@ def main(): # Function to call the linear regression function
             output=args.output,
             group=args.group,
             path=args.path,
-            save_plots=args.save_plots,
+            save_plots=args.chunksize is None if args.save_plots is None else args.save_plots,
             point_color=args.point_color,
-            line_color=args.line_color)
+            line_color=args.line_color,
+            chunksize=args.chunksize,
+            workers=args.workers,
+            combined=args.combined,
+            density=args.density,
+            resampling=args.resampling,
+            n_resamples=args.n_resamples,
+            seed=args.seed,
+            log_titers=args.log_titers,
+            zeros=args.zeros,
+            lod=args.lod,
+            offset=args.offset)
+
+    if isinstance(results, pd.DataFrame): # The group table is only formatted for the command line
+        print(results.to_string())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
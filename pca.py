@@ -0,0 +1,489 @@
+"""
+Principal component analysis of antibody panels and sequence alignments.
+
+The data matrix has one row per subject (or sequence) and one column per feature, e.g.
+the titers of every animal at every timepoint or antigen, or the one-hot encoded
+residues of an alignment. Three solvers are available:
+
+    'full'         exact SVD of the centered matrix
+    'randomized'   randomized truncated SVD (Halko, Martinsson and Tropp, 2011); only the
+                   requested components are computed, which is much faster for large or
+                   wide matrices
+    'incremental'  the matrix is read from a CSV file chunk by chunk and the SVD is
+                   updated with every chunk, so memory use is bounded by the chunk size
+
+'auto' picks the randomized solver when fewer than 80% of min(rows, columns) components
+are requested from a matrix with more than 500 rows and columns, and the full SVD
+otherwise. Component signs are fixed so that the largest loading of every component is
+positive, which makes results comparable between runs and solvers.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import instrumentation
+
+SOLVERS = ["auto", "full", "randomized", "incremental"]
+
+
+def _flip_signs(components):
+    """Make the largest absolute loading of every component (row) positive."""
+    signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+    signs[signs == 0] = 1
+    return components * signs[:, np.newaxis]
+
+
+def randomized_svd(matrix, n_components, n_oversamples=10, n_iter=4, seed=None):
+    """
+    Truncated SVD by random projection with power iterations.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        The (centered) data matrix.
+    n_components : int
+        Number of singular vectors to compute.
+    n_oversamples : int
+        Extra random directions sampled to improve accuracy. Default is 10.
+    n_iter : int
+        Number of power iterations. Default is 4.
+    seed : int
+        Seed for the random projection. Default is None.
+
+    Returns
+    -------
+    singular_values : numpy.ndarray
+    components : numpy.ndarray
+        The right singular vectors, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    size = min(n_components + n_oversamples, min(matrix.shape))
+    basis = matrix @ rng.standard_normal((matrix.shape[1], size))
+    for _ in range(n_iter): # Power iterations, re-orthonormalized to keep them stable
+        basis, _ = np.linalg.qr(basis)
+        basis, _ = np.linalg.qr(matrix.T @ basis)
+        basis = matrix @ basis
+    basis, _ = np.linalg.qr(basis)
+    _, singular_values, components = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+    return singular_values[:n_components], components[:n_components]
+
+
+def _result(scores, components, singular_values, total_variance, n, index, features, mean, scale, solver):
+    """Collect the output of a solver into labelled tables."""
+    names = [f"PC{number + 1}" for number in range(len(components))]
+    explained = singular_values**2 / max(1, n - 1)
+    return {"scores": pd.DataFrame(scores, index=index, columns=names),
+            "loadings": pd.DataFrame(components.T, index=features, columns=names),
+            "explained_variance": pd.Series(explained, index=names),
+            "explained_variance_ratio": pd.Series(explained / total_variance if total_variance > 0 else np.nan,
+                                                  index=names),
+            "mean": pd.Series(mean, index=features),
+            "scale": pd.Series(scale, index=features),
+            "solver": solver}
+
+
+def pca(data, n_components=2, scale=True, solver="auto", seed=None):
+    """
+    Principal component analysis of an in-memory matrix.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame or numpy.ndarray
+        One row per observation and one numeric column per feature. Rows with missing
+        values are left out.
+    n_components : int
+        Number of components. Default is 2.
+    scale : bool
+        Scale every feature to unit variance (correlation PCA). Default is True.
+    solver : str
+        'auto', 'full' or 'randomized', see the module docstring. Default is 'auto'.
+    seed : int
+        Seed of the randomized solver. Default is None.
+
+    Returns
+    -------
+    result : dict
+        scores (observations x components), loadings (features x components),
+        explained_variance and explained_variance_ratio per component, the feature mean
+        and scale used, and the solver.
+    """
+    if solver not in SOLVERS or solver == "incremental":
+        raise ValueError(f"Invalid solver: {solver}")
+    data = pd.DataFrame(data).dropna()
+    matrix = data.to_numpy(dtype=float)
+    n, p = matrix.shape
+    n_components = min(int(n_components), n, p)
+    if n_components < 1:
+        raise ValueError("No complete observations to analyze")
+
+    mean = matrix.mean(axis=0)
+    spread = matrix.std(axis=0, ddof=1) if scale and n > 1 else np.ones(p)
+    spread[spread == 0] = 1 # Constant features stay 0 after centering
+    matrix = (matrix - mean) / spread
+
+    if solver == "auto":
+        solver = "randomized" if min(n, p) > 500 and n_components < 0.8 * min(n, p) else "full"
+    if solver == "randomized":
+        singular_values, components = randomized_svd(matrix, n_components, seed=seed)
+    else:
+        _, singular_values, components = np.linalg.svd(matrix, full_matrices=False)
+        singular_values, components = singular_values[:n_components], components[:n_components]
+    components = _flip_signs(components)
+
+    total_variance = np.sum(matrix**2) / max(1, n - 1)
+    return _result(matrix @ components.T, components, singular_values, total_variance, n,
+                   data.index, data.columns, mean, spread, solver)
+
+
+def incremental_pca(path, columns=None, index=None, n_components=2, scale=True, chunksize=100_000):
+    """
+    Principal component analysis of a CSV file too large to load, chunk by chunk.
+
+    The file is read three times, chunksize rows at a time: once for the feature means
+    and variances, once to update the SVD with every chunk (the previous components,
+    weighted by their singular values, are stacked on top of the new rows and the leading
+    components of the stack are kept), and once to project the rows onto the components.
+
+    Parameters
+    ----------
+    path : str
+        The path to the CSV file, one row per observation.
+    columns : list of str
+        The feature columns. Default is None (all numeric columns except index).
+    index : str
+        Column labelling the rows. Default is None (row numbers).
+    n_components : int
+        Number of components. Default is 2.
+    scale : bool
+        Scale every feature to unit variance. Default is True.
+    chunksize : int
+        Number of rows read at a time. Default is 100,000.
+
+    Returns
+    -------
+    result : dict
+        See pca.
+    """
+    if columns is None:
+        header = pd.read_csv(path, nrows=100)
+        columns = [column for column in header.select_dtypes("number").columns if column != index]
+    columns = list(columns)
+    usecols = columns if index is None else columns + [index]
+
+    def chunks():
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+            chunk = chunk.dropna(subset=columns)
+            yield chunk, chunk[columns].to_numpy(dtype=float)
+
+    # Pass 1: means and variances, merging the centered sums of squares of the chunks
+    # (Chan, Golub and LeVeque), so large feature means do not cancel the variance out
+    n, mean, m2 = 0, np.zeros(len(columns)), np.zeros(len(columns))
+    for _, matrix in chunks():
+        size = len(matrix)
+        if size == 0:
+            continue
+        chunk_mean = matrix.mean(axis=0)
+        delta = chunk_mean - mean
+        m2 += np.sum((matrix - chunk_mean)**2, axis=0) + delta**2 * n * size / (n + size)
+        mean += delta * size / (n + size)
+        n += size
+    if n < 2:
+        raise ValueError(f"Not enough complete rows in {path}")
+    variance = m2 / (n - 1)
+    spread = np.sqrt(variance) if scale else np.ones(len(columns))
+    spread[spread == 0] = 1
+    n_components = min(int(n_components), n, len(columns))
+
+    # Pass 2: update the SVD chunk by chunk, keeping up to chunksize components in between
+    # (all of them, and so the exact result, whenever chunksize is at least the number of features)
+    keep = max(n_components, min(len(columns), chunksize))
+    weighted = np.zeros((0, len(columns)))
+    for _, matrix in chunks():
+        stacked = np.vstack([weighted, (matrix - mean) / spread])
+        _, singular_values, components = np.linalg.svd(stacked, full_matrices=False)
+        weighted = singular_values[:keep, np.newaxis] * components[:keep]
+    singular_values = np.linalg.norm(weighted[:n_components], axis=1)
+    components = _flip_signs(weighted[:n_components] / singular_values[:, np.newaxis])
+
+    # Pass 3: project every row
+    scores, labels = [], []
+    for chunk, matrix in chunks():
+        scores.append(((matrix - mean) / spread) @ components.T)
+        labels.append(chunk[index].to_numpy() if index is not None else chunk.index.to_numpy())
+
+    total_variance = np.sum(variance / spread**2)
+    return _result(np.vstack(scores), components, singular_values, total_variance, n,
+                   np.concatenate(labels), columns, mean, spread, "incremental")
+
+
+def antibody_matrix(data, index="Animal", columns="Timepoint", values="Antibody", log_titers=False):
+    """
+    Pivot long-format antibody data to one row per subject and one column per timepoint/antigen.
+
+    Replicate measurements are averaged. With log_titers the titers are converted to log2
+    titers first (see preprocess.log_titers), so the average is a geometric mean.
+    """
+    if log_titers:
+        import preprocess
+        data = preprocess.log_titer_columns(data, values)
+    matrix = data.pivot_table(index=index, columns=columns, values=values, aggfunc="mean", observed=True)
+    matrix.columns = [f"{values}_{column}" for column in matrix.columns]
+    return matrix
+
+
+def one_hot_alignment(alignment, variable_only=True):
+    """
+    One-hot encode an alignment: one column per residue seen at a site.
+
+    Parameters
+    ----------
+    alignment : alignment_matrix.AlignmentMatrix
+        The alignment.
+    variable_only : bool
+        Only encode sites with more than one residue; constant sites add nothing to a PCA. Default is True.
+
+    Returns
+    -------
+    encoded : pandas.DataFrame
+        float32 indicators, one row per sequence, columns named site number + residue (e.g. "57G").
+        Gaps and unknown residues are 0 in every column of their site.
+    """
+    counts = alignment.site_counts()
+    counts[:, np.frombuffer(alignment.missing.encode("ascii"), dtype=np.uint8)] = 0
+    if variable_only:
+        counts[(counts > 0).sum(axis=1) < 2] = 0
+    sites, codes = np.nonzero(counts)
+    encoded = np.asarray(alignment.matrix)[:, sites] == codes.astype(np.uint8)[np.newaxis, :]
+    names = [f"{site + 1}{chr(code)}" for site, code in zip(sites, codes)]
+    return pd.DataFrame(encoded.astype(np.float32), index=alignment.names, columns=names)
+
+
+def plot_pca(result, output="pca", groups=None, n_loadings=10):
+    """
+    Save a score plot of the first two components ("{output}_scores.png") and a plot of the
+    largest loadings of each of them ("{output}_loadings.png").
+
+    Parameters
+    ----------
+    result : dict
+        The output of pca or incremental_pca.
+    output : str
+        The output file prefix. Default is "pca".
+    groups : pandas.Series
+        Group of every observation, indexed like the scores, used to color the points. Default is None.
+    n_loadings : int
+        Number of loadings shown per component. Default is 10.
+
+    Returns
+    -------
+    files : list of str
+        The files that were written.
+    """
+    from plotting import _figure
+
+    scores = result["scores"]
+    ratio = result["explained_variance_ratio"]
+    labels = [f"{name} ({ratio[name] * 100:.1f}%)" for name in scores.columns]
+
+    fig = _figure()
+    ax = fig.add_subplot()
+    y_scores = scores.iloc[:, 1] if scores.shape[1] > 1 else np.zeros(len(scores))
+    if groups is None:
+        ax.scatter(scores.iloc[:, 0], y_scores, s=12)
+    else:
+        groups = pd.Series(groups).reindex(scores.index)
+        for name in pd.unique(groups.dropna()): # One color per group
+            selected = (groups == name).to_numpy()
+            ax.scatter(scores.iloc[selected, 0], np.asarray(y_scores)[selected], s=12, label=str(name))
+        ax.legend(title=groups.name)
+    ax.set_xlabel(labels[0]) # Set the x-axis label
+    ax.set_ylabel(labels[1] if len(labels) > 1 else "") # Set the y-axis label
+    fig.savefig(f"{output}_scores.png")
+
+    loadings = result["loadings"]
+    shown = loadings.columns[:2]
+    fig = _figure()
+    fig.set_size_inches(4 * len(shown) + 2, 4.8)
+    for number, name in enumerate(shown):
+        ax = fig.add_subplot(1, len(shown), number + 1)
+        top = loadings[name].reindex(loadings[name].abs().sort_values(ascending=False).index[:n_loadings])
+        ax.barh([str(feature) for feature in top.index[::-1]], top.to_numpy()[::-1])
+        ax.set_title(labels[number])
+    fig.tight_layout()
+    fig.savefig(f"{output}_loadings.png")
+    return [f"{output}_scores.png", f"{output}_loadings.png"]
+
+
+def analyze(path="data.csv",
+            index="Animal",
+            columns="Timepoint",
+            values="Antibody",
+            group="Group",
+            n_components=2,
+            scale=True,
+            solver="auto",
+            chunksize=None,
+            log_titers=False,
+            output="pca",
+            save_plots=True,
+            seed=None):
+    """
+    Run a PCA on a data file and save the scores, loadings and plots.
+
+    Parameters
+    ----------
+    path : str
+        A CSV file, or an aligned fasta file (its sequences are one-hot encoded). Default is "data.csv".
+    index : str
+        Column identifying the observations (e.g. the animals). Default is "Animal".
+    columns : str or list of str
+        With values: the column whose levels become the features (long format, e.g. "Timepoint").
+        Without values: the feature columns of a wide file; None uses every numeric column. Default is "Timepoint".
+    values : str
+        Column holding the measurements of a long-format file, or None for a wide file. Default is "Antibody".
+    group : str
+        Column used to color the score plot. Default is "Group".
+    n_components : int
+        Number of components. Default is 2.
+    scale : bool
+        Scale every feature to unit variance. Default is True.
+    solver : str
+        See the module docstring. Default is 'auto'; 'incremental' (or a chunksize) reads a wide CSV in chunks.
+    chunksize : int
+        Rows per chunk for the incremental solver, which needs a wide file (values None). Default is None.
+    log_titers : bool
+        Use log2 titers (long-format antibody data). Default is False.
+    output : str
+        The output file prefix. Default is "pca".
+    save_plots : bool
+        Save the score and loading plots. Default is True.
+    seed : int
+        Seed of the randomized solver. Default is None.
+
+    Returns
+    -------
+    summary : dict
+        The solver, the matrix size, the explained variance ratio per component and the files written.
+    """
+    from alignment import FASTA_EXTENSIONS
+
+    groups = None
+    if os.path.splitext(path)[1].lower() in FASTA_EXTENSIONS: # Sequence data
+        from alignment_matrix import AlignmentMatrix
+        with instrumentation.stage("load"):
+            alignment = AlignmentMatrix.from_fasta(path)
+        with instrumentation.stage("preprocess"):
+            data = one_hot_alignment(alignment)
+        with instrumentation.stage("fit"):
+            result = pca(data, n_components, scale, "auto" if solver == "incremental" else solver, seed)
+    elif solver == "incremental" or chunksize:
+        if values is not None: # Pivoting needs every row of a subject, which a chunk does not have
+            raise ValueError("The incremental solver reads a wide CSV file with one column per feature; "
+                             "use values=None and pass the feature columns")
+        feature_columns = [columns] if isinstance(columns, str) else columns
+        data = None
+        with instrumentation.stage("fit"): # Reading and fitting alternate chunk by chunk
+            result = incremental_pca(path, feature_columns, index, n_components, scale, chunksize or 100_000)
+    else:
+        from data_cache import load_csv
+        with instrumentation.stage("load"):
+            table = load_csv(path)
+        with instrumentation.stage("preprocess"):
+            if values is not None: # Long format
+                data = antibody_matrix(table, index, columns, values, log_titers)
+            else:
+                feature_columns = [columns] if isinstance(columns, str) else columns
+                if feature_columns is None:
+                    feature_columns = [column for column in table.select_dtypes("number").columns
+                                       if column not in [index, group]]
+                data = table.set_index(index)[feature_columns] if index is not None else table[feature_columns]
+            if group is not None and group in table.columns:
+                groups = table.groupby(index, observed=True)[group].first() if index is not None else table[group]
+        with instrumentation.stage("fit"):
+            result = pca(data, n_components, scale, solver, seed)
+    instrumentation.count(rows=len(result["scores"]), features=len(result["loadings"]))
+
+    result["scores"].to_csv(f"{output}_scores.csv")
+    result["loadings"].to_csv(f"{output}_loadings.csv")
+    pd.DataFrame({"explained_variance": result["explained_variance"],
+                  "explained_variance_ratio": result["explained_variance_ratio"]}).to_csv(f"{output}_variance.csv")
+    files = [f"{output}_scores.csv", f"{output}_loadings.csv", f"{output}_variance.csv"]
+    if save_plots:
+        with instrumentation.stage("render"):
+            files += plot_pca(result, output, groups)
+
+    return {"solver": result["solver"],
+            "observations": len(result["scores"]),
+            "features": len(result["loadings"]),
+            "explained_variance_ratio": result["explained_variance_ratio"].round(4).to_dict(),
+            "files": files}
+
+
+def main():
+    import argparse
+
+    # Create a command-line parser object
+    parser = argparse.ArgumentParser(description="Principal component analysis of antibody or sequence data.")
+    parser.add_argument("-d", "--data",
+                        help="A CSV file, or an aligned fasta file",
+                        default="data.csv")
+    parser.add_argument("-i", "--index",
+                        help="Column identifying the observations (default: Animal)",
+                        default="Animal")
+    parser.add_argument("-c", "--columns",
+                        help="Feature column(s): the column to pivot with --values (default: Timepoint), or the columns of a wide file (default: all numeric)",
+                        nargs="+",
+                        default=None)
+    parser.add_argument("-v", "--values",
+                        help="Column holding the measurements of a long-format file; 'none' for a wide file",
+                        default="Antibody")
+    parser.add_argument("-g", "--group",
+                        help="Column used to color the score plot (default: Group)",
+                        default="Group")
+    parser.add_argument("-n", "--n_components",
+                        help="Number of components (default: 2)",
+                        type=int,
+                        default=2)
+    parser.add_argument("-s", "--solver",
+                        help="auto, full, randomized or incremental (default: auto)",
+                        default="auto")
+    parser.add_argument("--chunksize",
+                        help="Read a wide CSV this many rows at a time (incremental solver)",
+                        type=int,
+                        default=None)
+    parser.add_argument("--no_scale",
+                        help="Do not scale the features to unit variance",
+                        action="store_true")
+    parser.add_argument("-l", "--log_titers",
+                        help="Use log2 titers",
+                        action="store_true")
+    parser.add_argument("-o", "--output",
+                        help="The output file prefix (default: pca)",
+                        default="pca")
+    parser.add_argument("--no_plots",
+                        help="Do not save the score and loading plots",
+                        action="store_true")
+    parser.add_argument("--seed",
+                        help="Seed of the randomized solver",
+                        type=int,
+                        default=None)
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+
+    values = None if args.values.lower() == "none" else args.values
+    index = None if args.index.lower() == "none" else args.index
+    columns = (args.columns or ["Timepoint"])[0] if values is not None else args.columns
+    if values is not None and (args.solver == "incremental" or args.chunksize):
+        parser.error("--chunksize and the incremental solver read a wide CSV file; use -v none and the feature columns in -c")
+    summary = analyze(args.data, index, columns, values, args.group, args.n_components, not args.no_scale,
+                      args.solver, args.chunksize, args.log_titers, args.output, not args.no_plots, args.seed)
+
+    print(f"{summary['observations']} observations, {summary['features']} features ({summary['solver']} solver)")
+    for name, ratio in summary["explained_variance_ratio"].items():
+        print(f"{name}: {ratio * 100:.1f}% of the variance")
+    print(f"Written: {', '.join(summary['files'])}")
+
+
+if __name__ == "__main__":
+    main()
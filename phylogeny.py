@@ -0,0 +1,420 @@
+"""
+Maximum-likelihood tree building with RAxML.
+
+The aligned fasta file is converted to (relaxed) PHYLIP once and that file is what RAxML
+reads. The number of RAxML threads is chosen from the available cores and the number of
+distinct alignment columns (site patterns): RAxML gains little from more than one thread
+per ~500 DNA patterns, so small alignments run with few threads and the remaining cores
+go to running independent searches and bootstrap replicates side by side.
+
+Every run writes checkpoints (-j). A run whose final tree already exists is skipped, and
+an interrupted run is restarted from its latest checkpoint tree, so a pipeline that was
+stopped part-way only redoes the unfinished searches. Run names carry a hash of the
+PHYLIP alignment and of the run's settings (model, seeds, number of replicates), so
+finished runs and checkpoints are only reused for the same job, even when several
+alignments share one working directory.
+
+The RAxML executable is taken from the RAXML_EXECUTABLE environment variable (default
+"raxmlHPC-PTHREADS"), so any executable with the same command line can stand in for it,
+e.g. a stub script in tests.
+"""
+
+import os
+import glob
+import json
+import shutil
+import time
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PATTERNS_PER_THREAD = 500
+
+
+def available_cores():
+    """Number of cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def fasta_to_phylip(input_file, output_file):
+    """
+    Convert an aligned fasta file to relaxed PHYLIP.
+
+    Parameters
+    ----------
+    input_file : str
+        The aligned fasta file.
+    output_file : str
+        Where to write the PHYLIP file.
+
+    Returns
+    -------
+    summary : dict
+        The number of taxa, sites and site patterns of the alignment.
+    """
+    from alignment import read_fasta
+
+    if not os.path.isfile(input_file): # Check if the file exists
+        raise FileNotFoundError(f"File not found: {input_file}")
+
+    records = list(read_fasta(input_file))
+    lengths = {len(sequence) for _, sequence in records}
+    if len(records) < 4:
+        raise ValueError(f"RAxML needs at least 4 sequences, {input_file} has {len(records)}")
+    if len(lengths) != 1:
+        raise ValueError(f"The sequences of {input_file} are not aligned (lengths {sorted(lengths)})")
+    sites = lengths.pop()
+
+    width = max(len(name) for name, _ in records) + 1
+    with open(output_file, "w") as handle:
+        handle.write(f"{len(records)} {sites}\n")
+        for name, sequence in records:
+            handle.write(f"{name.split()[0]:<{width}}{sequence}\n") # RAxML names end at the first space
+
+    matrix = np.frombuffer("".join(sequence.upper() for _, sequence in records).encode(), dtype=np.uint8)
+    columns = np.ascontiguousarray(matrix.reshape(len(records), sites).T)
+    patterns = len(np.unique(columns.view(np.dtype((np.void, len(records)))))) # Distinct columns
+    return {"taxa": len(records), "sites": sites, "patterns": patterns}
+
+
+def autotune_threads(patterns, concurrent=1, cores=None, min_threads=2):
+    """
+    Number of RAxML threads per run.
+
+    Parameters
+    ----------
+    patterns : int
+        Number of site patterns of the alignment.
+    concurrent : int
+        Number of runs sharing the cores. Default is 1.
+    cores : int
+        Number of cores to use. Default is None (all available cores).
+    min_threads : int
+        Smallest thread count; the PTHREADS build of RAxML needs at least 2. Default is 2.
+
+    Returns
+    -------
+    threads : int
+    """
+    cores = cores or available_cores()
+    useful = max(1, -(-patterns // PATTERNS_PER_THREAD)) # One thread per PATTERNS_PER_THREAD patterns
+    return max(min_threads, min(useful, cores // max(1, concurrent)))
+
+
+def raxml_command(phylip_file, name, working_dir, threads=2, model="GTRGAMMA", seed=12345,
+                  bootstrap_seed=None, replicates=None, starting_tree=None, extra=(), executable=None):
+    """
+    Build the RAxML command line.
+
+    Parameters
+    ----------
+    phylip_file : str
+        The PHYLIP alignment.
+    name : str
+        The run name (-n); output files are named "RAxML_<kind>.<name>".
+    working_dir : str
+        Directory for the output files (-w).
+    threads : int
+        Number of threads (-T). Default is 2.
+    model : str
+        The substitution model (-m). Default is "GTRGAMMA".
+    seed : int
+        The parsimony seed (-p). Default is 12345.
+    bootstrap_seed : int
+        The bootstrap seed (-b); None runs a maximum-likelihood search. Default is None.
+    replicates : int
+        Number of bootstrap replicates (-N). Default is None.
+    starting_tree : str
+        A tree to start the search from (-t), e.g. a checkpoint. Default is None.
+    extra : sequence of str
+        Further RAxML options. Default is ().
+    executable : str
+        The RAxML executable. Default is None (RAXML_EXECUTABLE or "raxmlHPC-PTHREADS").
+
+    Returns
+    -------
+    command : list of str
+    """
+    executable = executable or os.environ.get("RAXML_EXECUTABLE", "raxmlHPC-PTHREADS")
+    command = [executable, "-T", str(threads), "-m", model, "-s", os.path.abspath(phylip_file),
+               "-n", name, "-p", str(seed), "-w", os.path.abspath(working_dir), "-j"]
+    if bootstrap_seed is not None:
+        command += ["-b", str(bootstrap_seed), "-N", str(replicates or 1)]
+    if starting_tree is not None:
+        command += ["-t", os.path.abspath(starting_tree)]
+    return command + list(extra)
+
+
+def _run_name(stem, alignment_key, kind, number, **settings):
+    """A run name that is unique to the alignment and the settings of the run."""
+    key = hashlib.sha256(json.dumps(dict(settings, alignment=alignment_key), sort_keys=True).encode()).hexdigest()[:10]
+    return f"{stem}_{kind}{number}_{key}"
+
+
+def _result_file(run):
+    """The file a finished run leaves behind."""
+    kind = "bootstrap" if run["kind"] == "bootstrap" else "bestTree"
+    return os.path.join(run["working_dir"], f"RAxML_{kind}.{run['name']}")
+
+
+def _latest_checkpoint(working_dir, name):
+    """The most recent checkpoint tree of a run, or None."""
+    checkpoints = glob.glob(os.path.join(working_dir, f"RAxML_checkpoint.{name}.*"))
+    if not checkpoints:
+        return None
+    return max(checkpoints, key=lambda path: int(path.rsplit(".", 1)[1]) if path.rsplit(".", 1)[1].isdigit() else -1)
+
+
+def run_raxml(run, executable=None, resume=True):
+    """
+    Execute one RAxML run, resuming from its checkpoint when it was interrupted.
+
+    Parameters
+    ----------
+    run : dict
+        The keys phylip_file, name, working_dir, kind ("search" or "bootstrap"), threads,
+        model, seed and, for bootstraps, bootstrap_seed and replicates.
+    executable : str
+        See raxml_command.
+    resume : bool
+        Skip finished runs and restart interrupted ones from their latest checkpoint. Default is True.
+
+    Returns
+    -------
+    result : dict
+        The run, its status ("done", "skipped" or "failed"), whether it resumed from a
+        checkpoint, the return code, the result file and the wall time in seconds.
+    """
+    result_file = _result_file(run)
+    info_file = os.path.join(run["working_dir"], f"RAxML_info.{run['name']}")
+    if resume and os.path.isfile(result_file):
+        return dict(run, status="skipped", resumed=False, returncode=0, tree=result_file, wall_time=0.0)
+
+    checkpoint = _latest_checkpoint(run["working_dir"], run["name"]) if resume and run["kind"] == "search" else None
+    if os.path.isfile(info_file): # RAxML refuses to overwrite the files of an earlier run
+        os.replace(info_file, f"{info_file}.{int(time.time())}.interrupted")
+
+    command = raxml_command(run["phylip_file"], run["name"], run["working_dir"], run["threads"], run["model"],
+                            run["seed"], run.get("bootstrap_seed"), run.get("replicates"), checkpoint,
+                            executable=executable)
+    start = time.perf_counter()
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    wall_time = time.perf_counter() - start
+
+    status = "done" if process.returncode == 0 and os.path.isfile(result_file) else "failed"
+    error = "" if status == "done" else " ".join(process.stderr.decode(errors="replace").strip().splitlines()[-5:])
+    return dict(run, status=status, resumed=checkpoint is not None, returncode=process.returncode,
+                tree=result_file if status == "done" else None, wall_time=wall_time, error=error)
+
+
+def _log_likelihood(working_dir, name):
+    """The final log likelihood reported in a run's info file, or None."""
+    info_file = os.path.join(working_dir, f"RAxML_info.{name}")
+    if not os.path.isfile(info_file):
+        return None
+    with open(info_file) as handle:
+        for line in handle:
+            if line.startswith("Final") and "Score of best tree" in line:
+                return float(line.split()[-1])
+    return None
+
+
+def build_tree(input_file="alignment.fasta",
+               output_file="tree.txt",
+               working_dir="raxml",
+               searches=1,
+               bootstraps=0,
+               workers=None,
+               threads=None,
+               model="GTRGAMMA",
+               seed=12345,
+               resume=True,
+               executable=None):
+    """
+    Build a maximum-likelihood tree from an aligned fasta file.
+
+    Independent searches (different parsimony seeds) and chunks of bootstrap replicates
+    run concurrently. The best-scoring tree is copied to output_file; with bootstraps, the
+    support values are drawn on it and all bootstrap trees are collected next to it.
+
+    Parameters
+    ----------
+    input_file : str
+        The aligned fasta file. Default is "alignment.fasta".
+    output_file : str
+        Where to write the final tree (Newick). Default is "tree.txt".
+    working_dir : str
+        Directory for the PHYLIP file, the RAxML output and the checkpoints. Default is "raxml".
+    searches : int
+        Number of maximum-likelihood searches from different starting trees. Default is 1.
+    bootstraps : int
+        Number of bootstrap replicates. Default is 0.
+    workers : int
+        Number of RAxML runs at the same time. Default is None (as many as the cores allow
+        with the autotuned thread count).
+    threads : int
+        Number of threads per run. Default is None (autotuned, see autotune_threads).
+    model : str
+        The substitution model. Default is "GTRGAMMA".
+    seed : int
+        Seed of the first run; the others use seed + 1, seed + 2, ... Default is 12345.
+    resume : bool
+        Skip finished runs and resume interrupted ones. Default is True.
+    executable : str
+        See raxml_command.
+
+    Returns
+    -------
+    summary : dict
+        The alignment summary (taxa, sites, patterns), the threads and workers used, the
+        output file and one entry per run with its status and wall time.
+    """
+    os.makedirs(working_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(output_file))[0]
+    temporary = os.path.join(working_dir, f"{stem}.{os.getpid()}.phy.tmp")
+    try:
+        summary = fasta_to_phylip(input_file, temporary)
+    except (OSError, ValueError):
+        if os.path.isfile(temporary):
+            os.remove(temporary)
+        raise
+    with open(temporary, "rb") as handle:
+        alignment_key = hashlib.sha256(handle.read()).hexdigest()[:16]
+    phylip_file = os.path.join(working_dir, f"{stem}_{alignment_key}.phy") # One PHYLIP file per alignment
+    os.replace(temporary, phylip_file)
+
+    # Share the cores between concurrent runs; every search is one run and the bootstrap
+    # replicates can be split over as many runs as there are workers
+    cores = available_cores()
+    searches, bootstraps = max(1, int(searches)), int(bootstraps)
+    if not workers:
+        per_run = int(threads) if threads else autotune_threads(summary["patterns"], 1, cores)
+        workers = max(1, min(searches + bootstraps, cores // per_run))
+    workers = int(workers)
+    if not threads:
+        threads = autotune_threads(summary["patterns"], workers, cores)
+
+    base = {"phylip_file": phylip_file, "working_dir": working_dir, "threads": int(threads), "model": model}
+    runs = [dict(base, kind="search", seed=seed + number,
+                 name=_run_name(stem, alignment_key, "search", number, model=model, seed=seed + number))
+            for number in range(searches)]
+    if bootstraps:
+        chunks = min(bootstraps, workers)
+        sizes = [bootstraps // chunks + (number < bootstraps % chunks) for number in range(chunks)]
+        runs += [dict(base, kind="bootstrap", seed=seed + 1000 + number, bootstrap_seed=seed + 2000 + number,
+                      replicates=size,
+                      name=_run_name(stem, alignment_key, "bootstrap", number, model=model, seed=seed + 1000 + number,
+                                     bootstrap_seed=seed + 2000 + number, replicates=size))
+                 for number, size in enumerate(sizes)]
+
+    # The work happens in RAxML processes, so threads are enough to keep them running
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda run: run_raxml(run, executable, resume), runs))
+
+    failed = [result for result in results if result["status"] == "failed"]
+    if failed:
+        raise RuntimeError(f"RAxML failed for {', '.join(result['name'] for result in failed)}: {failed[0]['error']}")
+
+    # Keep the best-scoring search; without scores (e.g. one search) the first one
+    searches_done = [result for result in results if result["kind"] == "search"]
+    scores = [_log_likelihood(working_dir, result["name"]) for result in searches_done]
+    best = max(range(len(searches_done)), key=lambda number: -np.inf if scores[number] is None else scores[number])
+    best_tree = searches_done[best]["tree"]
+
+    if bootstraps:
+        # The support depends on the best tree and on every bootstrap chunk
+        support = dict(base, kind="support", seed=seed,
+                       name=_run_name(stem, alignment_key, "support", 0, model=model, seed=seed,
+                                      runs=[result["name"] for result in results if result["kind"] == "bootstrap"],
+                                      best=searches_done[best]["name"]))
+        bootstrap_file = os.path.join(working_dir, f"RAxML_bootstrap.{support['name']}")
+        with open(bootstrap_file, "w") as handle:
+            for result in results:
+                if result["kind"] == "bootstrap":
+                    with open(result["tree"]) as trees:
+                        shutil.copyfileobj(trees, handle)
+
+        # Draw the bootstrap support on the best tree (-f b)
+        support_file = os.path.join(working_dir, f"RAxML_bipartitions.{support['name']}")
+        if not (resume and os.path.isfile(support_file)):
+            command = raxml_command(phylip_file, support["name"], working_dir, threads, model, seed,
+                                    extra=["-f", "b", "-t", os.path.abspath(best_tree), "-z", os.path.abspath(bootstrap_file)],
+                                    executable=executable)
+            command.remove("-j") # Nothing to checkpoint
+            start = time.perf_counter()
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            results.append(dict(support, status="done" if process.returncode == 0 else "failed", resumed=False,
+                                returncode=process.returncode, tree=support_file,
+                                wall_time=time.perf_counter() - start))
+            if process.returncode != 0 or not os.path.isfile(support_file):
+                raise RuntimeError("RAxML failed to draw the bootstrap support: "
+                                   + " ".join(process.stderr.decode(errors="replace").strip().splitlines()[-5:]))
+        best_tree = support_file
+        shutil.copyfile(bootstrap_file, f"{os.path.splitext(output_file)[0]}_bootstrap.txt")
+
+    shutil.copyfile(best_tree, output_file)
+    return dict(summary, threads=int(threads), workers=workers, output=output_file, best=searches_done[best]["name"],
+                log_likelihood=scores[best], runs=[{key: result[key] for key in
+                                                    ["name", "kind", "seed", "threads", "status", "resumed", "wall_time"]}
+                                                   for result in results])
+
+
+def main():
+    import argparse
+
+    # Create a command-line parser object
+    parser = argparse.ArgumentParser(description="Build a maximum-likelihood tree with RAxML.")
+    parser.add_argument("-i", "--input",
+                        help="The aligned fasta file",
+                        default="alignment.fasta")
+    parser.add_argument("-o", "--output",
+                        help="The output tree file",
+                        default="tree.txt")
+    parser.add_argument("-d", "--working_dir",
+                        help="Directory for the RAxML files and checkpoints (default: raxml)",
+                        default="raxml")
+    parser.add_argument("-s", "--searches",
+                        help="Number of maximum-likelihood searches (default: 1)",
+                        type=int,
+                        default=1)
+    parser.add_argument("-b", "--bootstraps",
+                        help="Number of bootstrap replicates (default: 0)",
+                        type=int,
+                        default=0)
+    parser.add_argument("-w", "--workers",
+                        help="Number of RAxML runs at the same time (default: from the available cores)",
+                        type=int,
+                        default=None)
+    parser.add_argument("-t", "--threads",
+                        help="Number of threads per run (default: from the cores and site patterns)",
+                        type=int,
+                        default=None)
+    parser.add_argument("-m", "--model",
+                        help="The substitution model (default: GTRGAMMA)",
+                        default="GTRGAMMA")
+    parser.add_argument("-p", "--seed",
+                        help="The random seed (default: 12345)",
+                        type=int,
+                        default=12345)
+    parser.add_argument("--restart",
+                        help="Ignore finished runs and checkpoints and start over",
+                        action="store_true")
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+
+    summary = build_tree(args.input, args.output, args.working_dir, args.searches, args.bootstraps, args.workers,
+                         args.threads, args.model, args.seed, resume=not args.restart)
+
+    print(f"{summary['taxa']} taxa, {summary['sites']} sites, {summary['patterns']} patterns; "
+          f"{summary['workers']} runs at a time with {summary['threads']} threads each")
+    for run in summary["runs"]:
+        print(f"{run['name']}: {run['status']}{' (resumed)' if run['resumed'] else ''} ({run['wall_time']:.2f} s)")
+    print(f"Tree written to {summary['output']}")
+
+
+if __name__ == "__main__":
+    main()
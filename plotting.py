@@ -0,0 +1,243 @@
+"""
+Rendering stage for the regression plots.
+
+Plots are drawn with matplotlib's object-oriented Figure API on an Agg canvas, so
+no pyplot global state is shared between plots (nothing leaks from one group to the
+next) and groups can be rendered in separate processes. A small manifest next to
+the images remembers a hash of each group's input, so groups whose data has not
+changed since the last run are not rendered again.
+
+Rendering cost is bounded regardless of dataset size: groups larger than
+max_points are drawn from a deterministic subsample (or as a hexbin density), the
+combined plot shares max_points between all groups and leaves the legend out past
+MAX_LEGEND groups, and trendlines are drawn between their two endpoints instead of
+through every sample.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+MAX_POINTS = 20000
+MAX_LEGEND = 20 # Groups named in the legend of the combined plot
+
+
+def _downsample(x_data, y_data, max_points=MAX_POINTS):
+    """Keep at most max_points evenly spaced points, always the same ones for the same data."""
+    if max_points is None or len(x_data) <= max_points:
+        return x_data, y_data
+    keep = np.linspace(0, len(x_data) - 1, max_points).astype(int)
+    return x_data[keep], y_data[keep]
+
+
+def _trendline(x_data, slope, intercept):
+    """The two endpoints of the fitted line over the range of x_data."""
+    ends = np.array([np.nanmin(x_data), np.nanmax(x_data)])
+    return ends, slope * ends + intercept
+
+
+def _figure():
+    """Create a Figure with its own Agg canvas, independent of pyplot."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_group_plot(task):
+    """
+    Draw and save the scatter plot and trendline of one group.
+
+    Parameters
+    ----------
+    task : dict
+        The keys x_data, y_data, slope, intercept, name, x_lab, y_lab, point_color,
+        line_color, max_points and filename.
+
+    Returns
+    -------
+    filename : str
+        The file that was written.
+    """
+    fig = _figure()
+    ax = fig.add_subplot()
+    x_points, y_points = _downsample(task["x_data"], task["y_data"], task["max_points"])
+    ax.scatter(x_points, y_points, c=task["point_color"], label=task["name"]) # Plot the data
+    ax.plot(*_trendline(task["x_data"], task["slope"], task["intercept"]), c=task["line_color"]) # Plot the trendline
+    ax.set_xlabel(task["x_lab"]) # Set the x-axis label
+    ax.set_ylabel(task["y_lab"]) # Set the y-axis label
+    ax.legend() # Show the legend
+    fig.savefig(task["filename"])
+    return task["filename"]
+
+
+def _task_hash(task):
+    """Hash of everything that determines how a group plot looks."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(task["x_data"], dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(task["y_data"], dtype=float).tobytes())
+    style = {key: str(value) for key, value in task.items() if key not in ["x_data", "y_data"]}
+    digest.update(json.dumps(style, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def render_group_plots(dataframe,
+                       results,
+                       x,
+                       y,
+                       group,
+                       x_lab=None,
+                       y_lab=None,
+                       output="linear_regression",
+                       point_color="b",
+                       line_color="r",
+                       workers=None,
+                       skip_unchanged=True,
+                       max_points=MAX_POINTS):
+    """
+    Render one PNG per group across a pool of worker processes.
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        The data that was fitted.
+    results : pandas.DataFrame
+        The fitted regressions, one row per group (see linear_regression.grouped_regression).
+    x, y, group : str
+        The x, y and group columns of dataframe.
+    x_lab, y_lab : str
+        The axis labels. Default is None (the column names).
+    output : str
+        The output file prefix; plots are saved as "{output}_{group}.png". Default is "linear_regression".
+    point_color, line_color : str
+        The color of the scatter points and of the trendline.
+    workers : int
+        Number of worker processes. Default is None (one per CPU). 1 renders in this process.
+    skip_unchanged : bool
+        Skip groups whose data and styling are unchanged since the last run and whose
+        plot still exists. Default is True.
+    max_points : int
+        Largest number of points drawn per group; larger groups are subsampled. Default is 20000.
+
+    Returns
+    -------
+    rendered : list of str
+        The files that were (re)written. Skipped files are not listed.
+    """
+    manifest_path = f"{output}_plots.json"
+    manifest = {}
+    if skip_unchanged and os.path.isfile(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+
+    tasks = []
+    hashes = {}
+    for name, group_data in dataframe.groupby(group, observed=True): # Loop through each group
+        if name not in results.index:
+            continue
+        task = {"x_data": group_data[x].to_numpy(dtype=float),
+                "y_data": group_data[y].to_numpy(dtype=float),
+                "slope": float(results.loc[name, "slope"]),
+                "intercept": float(results.loc[name, "intercept"]),
+                "name": str(name),
+                "x_lab": x if x_lab is None else x_lab,
+                "y_lab": y if y_lab is None else y_lab,
+                "point_color": point_color,
+                "line_color": line_color,
+                "max_points": max_points,
+                "filename": f"{output}_{name}.png"}
+        hashes[task["filename"]] = _task_hash(task)
+        if manifest.get(task["filename"]) == hashes[task["filename"]] and os.path.isfile(task["filename"]):
+            continue # Unchanged since the last run
+        tasks.append(task)
+
+    if workers == 1 or len(tasks) <= 1:
+        rendered = [render_group_plot(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(render_group_plot, tasks))
+
+    if skip_unchanged:
+        manifest.update(hashes)
+        with open(manifest_path, "w") as handle:
+            json.dump(manifest, handle, indent=1, sort_keys=True)
+
+    return rendered
+
+
+def render_combined_plot(dataframe,
+                         results,
+                         x,
+                         y,
+                         group,
+                         x_lab=None,
+                         y_lab=None,
+                         output="linear_regression",
+                         density="sample",
+                         max_points=MAX_POINTS):
+    """
+    Draw every group and its trendline on one plot and save it as "{output}_all.png".
+
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        The data that was fitted.
+    results : pandas.DataFrame
+        The fitted regressions, one row per group (see linear_regression.grouped_regression).
+    x, y, group : str
+        The x, y and group columns of dataframe.
+    x_lab, y_lab : str
+        The axis labels. Default is None (the column names).
+    output : str
+        The output file prefix. Default is "linear_regression".
+    density : str
+        How the points are drawn when there are more than max_points. 'sample' (default)
+        scatters a deterministic subsample of each group; 'hexbin' draws all points of the
+        plot as a hexagonal density underneath the trendlines.
+    max_points : int
+        Largest number of points scattered on the plot, shared equally between the groups
+        (at least one point per group). Default is 20000.
+
+    Returns
+    -------
+    filename : str
+        The file that was written.
+    """
+    if density not in ["sample", "hexbin"]:
+        raise ValueError(f"Invalid density mode: {density}")
+
+    fig = _figure()
+    ax = fig.add_subplot()
+    from matplotlib import rcParams
+    colors = rcParams["axes.prop_cycle"].by_key()["color"] # One color per group
+
+    groups = [(name, group_data) for name, group_data in dataframe.groupby(group, observed=True)
+              if name in results.index]
+    per_group = max(1, max_points // max(1, len(groups))) # The point budget is shared by all groups
+    large = any(len(group_data) > per_group for _, group_data in groups)
+    if density == "hexbin" and large: # Density of all points, drawn once
+        ax.hexbin(dataframe[x].to_numpy(dtype=float), dataframe[y].to_numpy(dtype=float),
+                  gridsize=100, mincnt=1, cmap="Greys", bins="log")
+
+    for number, (name, group_data) in enumerate(groups): # Loop through each group
+        color = colors[number % len(colors)]
+        x_data = group_data[x].to_numpy(dtype=float)
+        y_data = group_data[y].to_numpy(dtype=float)
+        if not (density == "hexbin" and large):
+            x_points, y_points = _downsample(x_data, y_data, per_group)
+            ax.scatter(x_points, y_points, color=color, s=8, alpha=0.6) # Plot the data
+        ax.plot(*_trendline(x_data, results.loc[name, "slope"], results.loc[name, "intercept"]),
+                color=color, label=str(name)) # Plot the trendline
+
+    ax.set_xlabel(x if x_lab is None else x_lab) # Set the x-axis label
+    ax.set_ylabel(y if y_lab is None else y_lab) # Set the y-axis label
+    if len(groups) <= MAX_LEGEND: # Show the legend
+        ax.legend(title=group)
+    else: # Too many groups to name them all
+        ax.set_title(f"{len(groups)} groups of {group}")
+    filename = f"{output}_all.png"
+    fig.savefig(filename)
+    return filename
@@ -1,7 +1,16 @@
+import os
+import hashlib
+import json
+import sys
+import logging
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from statsmodels.stats.power import TTestPower, FTestAnovaPower
+from scipy import stats
+import instrumentation
+from data_cache import load_csv
+
+# matplotlib and statsmodels are imported where they are used, so solving a sample
+# size does not pay for loading the plotting library and vice versa.
 
 """
 I get an error when run t-test. From what I can tell online, this is due to an error with numby and statsmodels. It still completes, so there isnt anything to worry about. 
@@ -10,11 +19,388 @@ I need to create a two-sample t-test dataset to test the two-sample t-test funct
 I would like to have the function plot a power curve like what is in g-power.
 """
 
+GRID_TESTS = ['ANOVA', 't-test', 'two-sample-t', 'chi-squared']
+
+logger = logging.getLogger(__name__)
+
+def _min_nobs(test, k_groups):
+    """Smallest sample size for which the test has positive error degrees of freedom."""
+    if test == 'ANOVA':
+        return k_groups # total sample size must exceed the number of groups
+    if test == 'chi-squared':
+        return 0 # the noncentral chi-squared is defined for any positive sample size
+    return 1 # t-tests need at least two observations (per group)
+
+def grid_power(effect_size, nobs, alpha, k_groups=2, test='ANOVA', dof=1):
+    """Evaluate statistical power for arrays of parameters in one vectorized call.
+
+    All array arguments are broadcast against each other, so a whole grid of
+    (effect size, sample size, alpha, k) combinations is evaluated at once.
+
+    Parameters
+    ----------
+    effect_size : array_like
+        Cohen's f for ANOVA, Cohen's d for the t-tests, Cohen's w for chi-squared.
+    nobs : array_like
+        Total sample size for ANOVA and the one-sample t-test, sample size per group for
+        the two-sample t-test.
+    alpha : array_like
+        The significance level.
+    k_groups : array_like
+        Number of groups (ANOVA only). Default is 2.
+    test : str
+        One of 'ANOVA', 't-test', 'two-sample-t' or 'chi-squared'.
+    dof : array_like
+        Degrees of freedom (chi-squared only). Default is 1.
+
+    Returns
+    -------
+    power : numpy.ndarray
+        The power of the test for every broadcast combination of the inputs.
+    """
+    effect_size, nobs, alpha, k_groups, dof = np.broadcast_arrays(
+        np.asarray(effect_size, dtype=float),
+        np.asarray(nobs, dtype=float),
+        np.asarray(alpha, dtype=float),
+        np.asarray(k_groups, dtype=float),
+        np.asarray(dof, dtype=float))
+
+    if test == 'chi-squared': # noncentral chi-squared with noncentrality w^2 * n
+        crit = stats.chi2.isf(alpha, dof)
+        return stats.ncx2.sf(crit, dof, effect_size**2 * nobs)
+    elif test == 'ANOVA': # noncentral F, same parametrization as FTestAnovaPower
+        df_num = k_groups - 1
+        df_denom = nobs - k_groups
+        crit = stats.f.isf(alpha, df_num, df_denom)
+        return stats.ncf.sf(crit, df_num, df_denom, effect_size**2 * nobs)
+    elif test == 't-test': # noncentral t, two-sided, same as TTestPower
+        dof = nobs - 1
+        nc = effect_size * np.sqrt(nobs)
+    elif test == 'two-sample-t': # noncentral t, two-sided, equal group sizes as TTestIndPower
+        dof = 2 * nobs - 2
+        nc = effect_size * np.sqrt(nobs / 2)
+    else:
+        raise ValueError("invalid test type")
+
+    crit = stats.t.isf(alpha / 2, dof)
+    return stats.nct.sf(crit, dof, nc) + stats.nct.cdf(-crit, dof, nc)
+
+def solve_sample_size(effect_size, power, alpha, k_groups=2, test='ANOVA', dof=1, tol=1e-6, max_iter=200):
+    """Solve for the sample size of every parameter combination with one shared bisection.
+
+    The bracket for all combinations is widened and bisected together, so each
+    iteration is a single vectorized power evaluation over the whole grid.
+
+    Parameters
+    ----------
+    effect_size, power, alpha, k_groups, dof : array_like
+        Broadcastable arrays of the study parameters, see grid_power.
+    test : str
+        One of 'ANOVA', 't-test', 'two-sample-t' or 'chi-squared'.
+    tol : float
+        Absolute tolerance on the sample size. Default is 1e-6.
+    max_iter : int
+        Maximum number of bisection steps. Default is 200.
+
+    Returns
+    -------
+    nobs : numpy.ndarray
+        The (non-integer) sample size at which the requested power is reached. Entries
+        that cannot be solved (e.g. a zero effect size) are NaN.
+    """
+    effect_size, power, alpha, k_groups, dof = np.broadcast_arrays(
+        np.asarray(effect_size, dtype=float),
+        np.asarray(power, dtype=float),
+        np.asarray(alpha, dtype=float),
+        np.asarray(k_groups, dtype=float),
+        np.asarray(dof, dtype=float))
+
+    lower = np.broadcast_to(_min_nobs(test, k_groups), power.shape).astype(float) + 1e-8
+    upper = lower + 2.0
+
+    # Widen the bracket by doubling until every combination reaches the target power
+    solvable = (effect_size != 0) & (power > alpha) & (power < 1)
+    for _ in range(64):
+        short = solvable & (grid_power(effect_size, upper, alpha, k_groups, test, dof) < power)
+        if not short.any():
+            break
+        lower = np.where(short, upper, lower)
+        upper = np.where(short, upper * 2, upper)
+    else:
+        solvable &= ~short
+
+    # Bisect all brackets at the same time
+    for _ in range(max_iter):
+        if np.all((upper - lower)[solvable] <= tol):
+            break
+        middle = (lower + upper) / 2
+        reached = grid_power(effect_size, middle, alpha, k_groups, test, dof) >= power
+        upper = np.where(reached, middle, upper)
+        lower = np.where(reached, lower, middle)
+
+    return np.where(solvable, upper, np.nan)
+
+def simulate_chi_squared_power(effect_size, nobs, dof=1, alpha=0.05, n_sim=10000, seed=None, batch_size=10000):
+    """Estimate the power of a chi-squared goodness-of-fit test by Monte Carlo simulation.
+
+    Tables are drawn in vectorized batches from a multinomial alternative whose
+    deviation from the uniform null has Cohen's w equal to effect_size. Useful to
+    validate the noncentral chi-squared approximation for small samples.
+
+    Parameters
+    ----------
+    effect_size : float
+        Cohen's w.
+    nobs : int
+        The sample size (total count of each simulated table).
+    dof : int
+        Degrees of freedom; the tables have dof + 1 categories. Default is 1.
+    alpha : float
+        The significance level. Default is 0.05.
+    n_sim : int
+        Number of simulated tables. Default is 10000.
+    seed : int
+        Seed for the random number generator. Default is None.
+    batch_size : int
+        Number of tables drawn per batch. Default is 10000.
+
+    Returns
+    -------
+    power : float
+        The fraction of simulated tables for which the null hypothesis is rejected.
+    """
+    categories = int(dof) + 1
+    null = np.full(categories, 1 / categories)
+
+    # Alternative proportions: a centered linear trend scaled to Cohen's w
+    trend = np.arange(categories) - (categories - 1) / 2
+    trend *= effect_size / np.sqrt(np.sum(trend**2 / null))
+    alternative = null + trend
+    if np.any(alternative < 0):
+        raise ValueError("effect size too large for the number of categories")
+    alternative /= alternative.sum() # guard against rounding before sampling
+
+    rng = np.random.default_rng(seed)
+    expected = int(nobs) * null
+    crit = stats.chi2.isf(alpha, dof)
+
+    rejected = 0
+    for start in range(0, n_sim, batch_size):
+        counts = rng.multinomial(int(nobs), alternative, size=min(batch_size, n_sim - start))
+        statistic = np.sum((counts - expected)**2 / expected, axis=1)
+        rejected += np.count_nonzero(statistic > crit)
+
+    return rejected / n_sim
+
+def sample_size_table(table, test='ANOVA', output=None):
+    """Solve the sample size for every row of a table of study parameters.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        Must contain 'effect_size', 'power' and 'alpha' columns. Optional 'k' (number of
+        groups), 'df' (chi-squared degrees of freedom) and 'test' columns override the
+        defaults per row.
+    test : str
+        Test used for rows without a 'test' column. Default is 'ANOVA'.
+    output : str
+        Path to write the results as a CSV file. Default is None (not written).
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        The input parameters with the exact ('nobs') and rounded up ('sample_size')
+        sample sizes appended.
+    """
+    for column in ['effect_size', 'power', 'alpha']:
+        if column not in table.columns:
+            raise ValueError(f"missing column '{column}'")
+
+    results = table.copy()
+    if 'k' not in results.columns:
+        results['k'] = 2
+    if 'df' not in results.columns:
+        results['df'] = 1
+    if 'test' not in results.columns:
+        results['test'] = test
+
+    if not results['alpha'].between(0, 1).all(): # Check that alpha is between 0 and 1
+        raise ValueError("alpha must be between 0 and 1")
+    if not results['power'].between(0, 1).all(): # Check that power is between 0 and 1
+        raise ValueError("power must be between 0 and 1")
+    if not results['test'].isin(GRID_TESTS).all(): # Check that the test type is valid
+        raise ValueError("invalid test type")
+
+    # One vectorized solve per test type
+    results['nobs'] = np.nan
+    for name, rows in results.groupby('test').groups.items():
+        subset = results.loc[rows]
+        results.loc[rows, 'nobs'] = solve_sample_size(subset['effect_size'].to_numpy(),
+                                                      subset['power'].to_numpy(),
+                                                      subset['alpha'].to_numpy(),
+                                                      subset['k'].to_numpy(),
+                                                      test=name,
+                                                      dof=subset['df'].to_numpy())
+    results['sample_size'] = np.ceil(results['nobs']).astype('Int64')
+
+    if output is not None:
+        results.to_csv(output, index=False)
+        logger.info(f"Results saved to {output}")
+
+    return results
+
+def sample_size_grid(effect_sizes, powers, alphas, k_groups=(2,), test='ANOVA', output=None):
+    """Solve the sample size for every combination of effect size, power, alpha and k.
+
+    Parameters
+    ----------
+    effect_sizes, powers, alphas, k_groups : sequence of float
+        The values to sweep. The full cartesian product is evaluated.
+    test : str
+        The type of test. Valid options are 'ANOVA', 't-test', 'two-sample-t' or 'chi-squared'.
+    output : str
+        Path to write the results as a CSV file. Default is None (not written).
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per combination, see sample_size_table.
+    """
+    index = pd.MultiIndex.from_product([effect_sizes, powers, alphas, k_groups],
+                                       names=['effect_size', 'power', 'alpha', 'k'])
+    return sample_size_table(index.to_frame(index=False), test=test, output=output)
+
+def power_surface(test='ANOVA', nobs=None, effect_sizes=(0.5,), alpha=0.05, k_groups=2, dof=1, cache_dir='.power_cache'):
+    """Compute power over a grid of sample sizes and effect sizes, memoized on disk.
+
+    The whole surface is evaluated with one vectorized grid_power call. Surfaces are
+    stored in cache_dir keyed by the test, alpha, k, degrees of freedom and grid, so
+    re-plotting the same study does not recompute them.
+
+    Parameters
+    ----------
+    test : str
+        One of 'ANOVA', 't-test', 'two-sample-t' or 'chi-squared'.
+    nobs : array_like
+        Sample sizes to evaluate. Default is None (every integer from the smallest valid
+        sample size up to 200).
+    effect_sizes : sequence of float
+        Effect sizes to evaluate, one curve each. Default is (0.5,).
+    alpha : float
+        The significance level. Default is 0.05.
+    k_groups : int
+        Number of groups (ANOVA only). Default is 2.
+    dof : int
+        Degrees of freedom (chi-squared only). Default is 1.
+    cache_dir : str
+        Directory holding cached surfaces. Default is '.power_cache'. None disables caching.
+
+    Returns
+    -------
+    surface : pandas.DataFrame
+        Power indexed by sample size with one column per effect size.
+    """
+    if test not in GRID_TESTS: # Check that the test type is valid
+        raise ValueError("invalid test type")
+    if nobs is None:
+        nobs = np.arange(int(_min_nobs(test, k_groups)) + 1, 201)
+    nobs = np.asarray(nobs, dtype=float)
+    effect_sizes = np.asarray(effect_sizes, dtype=float)
+
+    cache_path = None
+    if cache_dir is not None:
+        key = json.dumps({'test': test, 'alpha': float(alpha), 'k': float(k_groups), 'df': float(dof),
+                          'nobs': nobs.tolist(), 'effect_sizes': effect_sizes.tolist()}, sort_keys=True)
+        cache_path = os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest()[:16] + '.npy')
+        if os.path.isfile(cache_path): # Reuse a surface computed by an earlier run
+            values = np.load(cache_path)
+            return pd.DataFrame(values, index=pd.Index(nobs, name='nobs'), columns=effect_sizes)
+
+    # Evaluate every (n, effect size) pair in one call
+    values = grid_power(effect_sizes[np.newaxis, :], nobs[:, np.newaxis], alpha, k_groups, test, dof)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_path, values)
+
+    return pd.DataFrame(values, index=pd.Index(nobs, name='nobs'), columns=effect_sizes)
+
+def power_curve(test='ANOVA',
+                nobs=None,
+                effect_sizes=(0.5,),
+                alpha=0.05,
+                k_groups=2,
+                dof=1,
+                target_power=0.8,
+                output='power_curve',
+                save_plots=True,
+                cache_dir='.power_cache',
+                **plot_kwargs):
+    """Plot power as a function of sample size, like the power curves in G*Power.
+
+    Parameters
+    ----------
+    test, nobs, effect_sizes, alpha, k_groups, dof, cache_dir
+        See power_surface.
+    target_power : float
+        Draw a horizontal reference line at this power. Default is 0.8. None omits it.
+    output : str
+        The output file name, without extension. Default is "power_curve".
+    save_plots : bool
+        Whether to save the plot or not. Default is True.
+    **plot_kwargs
+        Passed on to matplotlib's plot for every curve (e.g. linestyle, linewidth).
+
+    Returns
+    -------
+    surface : pandas.DataFrame
+        The power surface that was plotted, see power_surface.
+    """
+    with instrumentation.stage('fit'):
+        surface = power_surface(test, nobs, effect_sizes, alpha, k_groups, dof, cache_dir)
+
+    with instrumentation.stage('render'):
+        _plot_power_curve(surface, test, alpha, target_power, output, save_plots, plot_kwargs)
+
+    return surface
+
+
+def _plot_power_curve(surface, test, alpha, target_power, output, save_plots, plot_kwargs):
+    """Draw the power curves of power_curve and save them."""
+    if "matplotlib.pyplot" not in sys.modules: # The curve is only saved, use the non-interactive backend
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for effect_size in surface.columns: # One curve per effect size
+        ax.plot(surface.index, surface[effect_size], label=f"effect size {effect_size:g}", **plot_kwargs)
+    if target_power is not None:
+        ax.axhline(target_power, c='0.5', linestyle='--', linewidth=1)
+    ax.set_xlabel("Sample size")
+    ax.set_ylabel("Power")
+    ax.set_title(f"{test} power curve (alpha = {alpha:g})")
+    ax.set_ylim(0, 1)
+    ax.legend()
+
+    if save_plots: # Save the plot if save_plots is True
+        fig.savefig(f"{output}.png")
+        logger.info(f"Plot saved as {output}.png")
+    plt.close(fig)
+
+def _round_up(sample_size):
+    """Round a solved sample size up to a whole number, or NaN when it could not be solved."""
+    sample_size = float(np.squeeze(sample_size))
+    return int(np.ceil(sample_size)) if np.isfinite(sample_size) else np.nan
+
 def power_analysis(effect_size=0.5,
                    power=0.8,
                    alpha=0.05,
                    test='ANOVA',
-                   path_to_power=None):
+                   path_to_power=None,
+                   dof=1,
+                   simulations=0,
+                   seed=None):
     """Perform power analysis for one-sample t-test or ANOVA test.
 
     Parameters
@@ -29,6 +415,17 @@ def power_analysis(effect_size=0.5,
         The type of test to perform. Valid options are 'ANOVA', 't-test', 'chi-squared', or 'two-sample-t'.
     path_to_power : str
         The path to a CSV file containing relevant variables. Default is None.
+    dof : int
+        Degrees of freedom for the chi-squared test. Overridden by a 'df' column in the CSV file. Default is 1.
+    simulations : int
+        Number of Monte Carlo tables used to validate the chi-squared result. Default is 0 (no simulation).
+    seed : int
+        Seed for the Monte Carlo simulation. Default is None.
+
+    Returns
+    -------
+    sample_size : int
+        The minimum sample size, rounded up. NaN when no sample size reaches the power.
     """
     # Error handling
     if not 0 <= alpha <= 1: # Check that alpha is between 0 and 1
@@ -40,70 +437,56 @@ def power_analysis(effect_size=0.5,
 
     if path_to_power is not None: # If a path is supplied, read the CSV file
         # read csv file as a dataframe
-        df = pd.read_csv(path_to_power)
-        print("\nopening " + path_to_power + "\n")
+        with instrumentation.stage('load'):
+            df = load_csv(path_to_power)
+        logger.info("opening " + path_to_power)
 
         # extract the variables from the dataframe
         effect_size = df['effect_size'][0] # extract the effect size
-        print("the effect size is " + str(effect_size) + "\n")
+        logger.info("the effect size is " + str(effect_size))
         power = df['power'][0] # extract the power
-        print("the power is " + str(power) + "\n")
+        logger.info("the power is " + str(power))
         alpha = df['alpha'][0] # extract the alpha
-        print("the alpha is " + str(alpha) + "\n")
+        logger.info("the alpha is " + str(alpha))
     else:
-        print("\nPath not supplied. Using input values\n")
-        print("the effect size is " + str(effect_size) + "\n")
-        print("the power is " + str(power) + "\n")
-        print("the alpha is " + str(alpha) + "\n")
+        logger.info("Path not supplied. Using input values")
+        logger.info("the effect size is " + str(effect_size))
+        logger.info("the power is " + str(power))
+        logger.info("the alpha is " + str(alpha))
 
-    # Calculate the minimum sample size for the chosen test type
-    if test == 'ANOVA':
-        ftest = FTestAnovaPower()
-        sample_size = ftest.solve_power(effect_size=effect_size, alpha=alpha, power=power)
-        print("Minimum sample size required for ANOVA test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, int(np.ceil(sample_size))))
-    elif test == 't-test':
-        ttest = TTestPower()
-        sample_size = ttest.solve_power(effect_size=effect_size, alpha=alpha, power=power)
-        print("Minimum sample size required for one-sample t-test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, int(np.ceil(sample_size))))
-    elif test == 'two-sample-t':
-        ttest = TTestPower()
-        sample_size = ttest.solve_power(effect_size=effect_size, alpha=alpha, power=power, ratio=1.0, alternative='two-sided')
-        print("Minimum sample size required for two-sample t-test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, int(np.ceil(sample_size))))
-    elif test == 'chi-squared':
-        from scipy.stats import chi2_contingency
-
-        # Calculate the minimum expected cell count for the chi-squared test
-        # Expected cell count should be greater than or equal to 5 for accurate results
-        min_expected_count = 5
-
-        # Get degrees of freedom for the test
-        df = df['df'][0] if path_to_power is not None else None
-
-        # Calculate the minimum sample size required for the chi-squared test
-        sample_size = None
-        while sample_size is None or sample_size % 1 != 0:
-            # Increase sample size until expected cell count is greater than or equal to the minimum expected cell count
-            if sample_size is None:
-                sample_size = 1
-            else:
-                sample_size += 1
-            
-            # Generate random data based on the expected proportions
-            proportions = np.random.dirichlet([1] * len(df))
-            data = np.array([np.random.multinomial(sample_size, p) for p in proportions])
-            
-            # Check that the expected cell count is greater than or equal to the minimum expected cell count
-            obs_count = data.sum()
-            exp_count = data.mean() * data.size
-            if exp_count < min_expected_count:
-                continue
-            
-            # Perform chi-squared test and check for statistical significance
-            _, p, _, _ = chi2_contingency(data)
-            if p <= alpha:
-                break
-        
-        print("Minimum sample size required for chi-squared test with effect size {}, power {}, alpha {}, and degrees of freedom {}: {}".format(effect_size, power, alpha, df, sample_size))
+    with instrumentation.stage('fit'):
+        # Calculate the minimum sample size for the chosen test type
+        if test in ['ANOVA', 't-test', 'two-sample-t']:
+            from statsmodels.stats.power import TTestPower, TTestIndPower, FTestAnovaPower
+
+        if test == 'ANOVA':
+            ftest = FTestAnovaPower()
+            sample_size = ftest.solve_power(effect_size=effect_size, alpha=alpha, power=power)
+            logger.info("Minimum sample size required for ANOVA test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, _round_up(sample_size)))
+        elif test == 't-test':
+            ttest = TTestPower()
+            sample_size = ttest.solve_power(effect_size=effect_size, alpha=alpha, power=power)
+            logger.info("Minimum sample size required for one-sample t-test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, _round_up(sample_size)))
+        elif test == 'two-sample-t':
+            ttest = TTestIndPower()
+            sample_size = ttest.solve_power(effect_size=effect_size, alpha=alpha, power=power, ratio=1.0, alternative='two-sided')
+            logger.info("Minimum sample size required for two-sample t-test with effect size {}, power {}, and alpha {}: {}".format(effect_size, power, alpha, _round_up(sample_size)))
+        elif test == 'chi-squared':
+            # Get degrees of freedom for the test
+            if path_to_power is not None and 'df' in df.columns:
+                dof = df['df'][0]
+
+            # Solve the noncentral chi-squared power equation for the sample size
+            sample_size = solve_sample_size(effect_size, power, alpha, test='chi-squared', dof=dof).item()
+            logger.info("Minimum sample size required for chi-squared test with effect size {}, power {}, alpha {}, and degrees of freedom {}: {}".format(effect_size, power, alpha, dof, _round_up(sample_size)))
+
+            if simulations and np.isfinite(sample_size): # Validate the analytic result by simulation
+                simulated = simulate_chi_squared_power(effect_size, np.ceil(sample_size), dof, alpha, simulations, seed)
+                logger.info("Simulated power at that sample size ({} tables): {:.3f}".format(simulations, simulated))
+
+    if not np.isfinite(sample_size): # The solver found no sample size that reaches the power
+        logger.warning("No sample size reaches power {} with effect size {} and alpha {}".format(power, effect_size, alpha))
+    return _round_up(sample_size)
 
 def main():
     import argparse
@@ -131,16 +514,88 @@ def main():
             type=str, 
             default=None,
             help='path csv file containing relevent variables (default: power.csv)')
+    parser.add_argument('-df', '--dof',
+            type=int,
+            default=1,
+            help='degrees of freedom for the chi-squared test (default: 1)')
+    parser.add_argument('-s', '--simulations',
+            type=int,
+            default=0,
+            help='number of Monte Carlo tables to validate the chi-squared result (default: 0)')
+    parser.add_argument('--seed',
+            type=int,
+            default=None,
+            help='seed for the Monte Carlo simulation (default: None)')
+    parser.add_argument('-g', '--grid',
+            action='store_true',
+            help='solve the sample size for every row of the csv file instead of only the first')
+    parser.add_argument('-o', '--output',
+            type=str,
+            default=None,
+            help='path to save the grid results as a csv file (default: not saved)')
+    parser.add_argument('-c', '--curve',
+            action='store_true',
+            help='plot power as a function of sample size instead of solving for the sample size')
+    parser.add_argument('-ce', '--curve_effect_sizes',
+            type=float,
+            nargs='+',
+            default=None,
+            help='effect sizes to draw on the power curve (default: the effect size)')
+    parser.add_argument('-n', '--max_n',
+            type=int,
+            default=200,
+            help='largest sample size on the power curve (default: 200)')
+    parser.add_argument('-k', '--k_groups',
+            type=int,
+            default=2,
+            help='number of groups for the ANOVA power curve (default: 2)')
+    parser.add_argument('-po', '--plot_output',
+            type=str,
+            default='power_curve',
+            help='name of the power curve plot, without extension (default: power_curve)')
+
+    instrumentation.add_arguments(parser)
 
     # Parse the command line arguments
     args = parser.parse_args()
 
+    with instrumentation.from_arguments(args, f'power_analysis {args.test}'):
+        _run(parser, args)
+
+
+def _run(parser, args):
+    """Run the mode selected on the command line."""
+    if args.grid: # Solve every row of the csv file in one pass
+        if args.path is None:
+            parser.error("--grid requires a csv file (-pp/--path)")
+        with instrumentation.stage('load'):
+            table = load_csv(args.path)
+        with instrumentation.stage('fit'):
+            results = sample_size_table(table, test=args.test, output=args.output)
+        print(results.to_string(index=False))
+        return
+
+    if args.curve: # Plot the power curve
+        first_n = int(_min_nobs(args.test, args.k_groups)) + 1
+        power_curve(args.test,
+                    nobs=np.arange(first_n, max(args.max_n, first_n) + 1),
+                    effect_sizes=args.curve_effect_sizes or [args.effect_size],
+                    alpha=args.alpha,
+                    k_groups=args.k_groups,
+                    dof=args.dof,
+                    target_power=args.power,
+                    output=args.plot_output)
+        return
+
     # Perform power analysis
     power_analysis(args.effect_size,
                    args.power,
                    args.alpha,
                    args.test,
-                   args.path)
+                   args.path,
+                   args.dof,
+                   args.simulations,
+                   args.seed)
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Preprocessing of antibody titer data.
+
+Titers are log-normally distributed, so they are summarized as geometric mean titers
+(GMT) and compared on the log scale. All aggregation happens in log2 space with a
+single groupby on categorical-encoded keys, which stays fast on millions of rows.
+Titers of zero (or below the limit of detection) have no logarithm; how they are
+handled is set by the `zeros` option:
+
+    'half_lod'  replace values below the limit of detection by half of it (default)
+    'lod'       replace values below the limit of detection by the limit itself
+    'drop'      leave values below the limit of detection out
+    'offset'    use log2(titer + offset) for every value (offset is 1 by default)
+"""
+
+import numpy as np
+import pandas as pd
+
+ZERO_HANDLING = ['half_lod', 'lod', 'drop', 'offset']
+
+
+def log_titers(values, zeros='half_lod', lod=None, offset=1):
+    """
+    Convert titers to log2 titers.
+
+    Parameters
+    ----------
+    values : array_like
+        The titers.
+    zeros : str
+        How values below the limit of detection are handled, see the module docstring. Default is 'half_lod'.
+    lod : float
+        The limit of detection. Default is None (the smallest positive titer).
+    offset : float
+        The value added to every titer with zeros='offset'. Default is 1.
+
+    Returns
+    -------
+    logs : numpy.ndarray
+        The log2 titers; NaN for missing values and for dropped values.
+    """
+    if zeros not in ZERO_HANDLING:
+        raise ValueError(f"Invalid zero handling: {zeros}")
+    values = np.asarray(values, dtype=float)
+
+    if zeros == 'offset':
+        return np.log2(values + offset)
+
+    if lod is None:
+        positive = values[values > 0]
+        if positive.size == 0:
+            raise ValueError("No positive titers to derive the limit of detection from")
+        lod = positive.min()
+
+    below = values < lod
+    if zeros == 'half_lod':
+        values = np.where(below, lod / 2, values)
+    elif zeros == 'lod':
+        values = np.where(below, lod, values)
+    else: # drop
+        values = np.where(below, np.nan, values)
+    return np.log2(values)
+
+
+def log_titer_columns(data, columns, zeros='half_lod', lod=None, offset=1):
+    """
+    Return a copy of data with the titer columns replaced by their log2 titers.
+
+    Testing log titers (e.g. in an ANOVA) compares geometric mean titers. See log_titers
+    for the parameters; the limit of detection is derived per column when not given.
+    """
+    data = data.copy()
+    for column in [columns] if isinstance(columns, str) else columns:
+        data[column] = log_titers(data[column], zeros, lod, offset)
+    return data
+
+
+def _categorical_keys(data, by):
+    """The grouping columns as categoricals, so grouping works on integer codes."""
+    return [data[column] if isinstance(data[column].dtype, pd.CategoricalDtype)
+            else data[column].astype('category') for column in by]
+
+
+def geometric_mean_titers(data, value='Antibody', by=('Group', 'Timepoint'), zeros='half_lod', lod=None, offset=1):
+    """
+    Compute geometric mean titers per group (e.g. per group and timepoint).
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The titer data in long format.
+    value : str
+        The column holding the titers. Default is 'Antibody'.
+    by : sequence of str
+        The columns to group by. Default is ('Group', 'Timepoint').
+    zeros : str
+        How values below the limit of detection are handled, see the module docstring. Default is 'half_lod'.
+    lod : float
+        The limit of detection. Default is None (the smallest positive titer).
+    offset : float
+        The value added to every titer with zeros='offset'. Default is 1.
+
+    Returns
+    -------
+    gmt : pandas.DataFrame
+        One row per group with n, log2_mean, log2_sd, GMT and the 95% confidence interval of the GMT
+        (GMT_low, GMT_high).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    logs = pd.Series(log_titers(data[value], zeros, lod, offset), index=data.index)
+    summary = logs.groupby(_categorical_keys(data, by), observed=True, sort=True).agg(['count', 'mean', 'std'])
+    summary.index.names = by
+    summary.columns = ['n', 'log2_mean', 'log2_sd']
+
+    from scipy import stats
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margin = stats.t.ppf(0.975, summary['n'] - 1) * summary['log2_sd'] / np.sqrt(summary['n'])
+    summary['GMT'] = np.exp2(summary['log2_mean'])
+    summary['GMT_low'] = np.exp2(summary['log2_mean'] - margin)
+    summary['GMT_high'] = np.exp2(summary['log2_mean'] + margin)
+    return summary
+
+
+def fold_change(data,
+                value='Antibody',
+                timepoint='Timepoint',
+                by='Group',
+                subject='Animal',
+                baseline=None,
+                zeros='half_lod',
+                lod=None,
+                offset=1):
+    """
+    Compute the geometric mean fold change of the titers relative to a baseline timepoint.
+
+    With a subject column, the fold change of every subject is computed first and the
+    geometric mean of those is reported (geometric mean fold rise). Without one, the ratio
+    of the group GMTs to the baseline GMT is reported.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The titer data in long format.
+    value : str
+        The column holding the titers. Default is 'Antibody'.
+    timepoint : str
+        The column holding the timepoints. Default is 'Timepoint'.
+    by : str
+        The column holding the groups. Default is 'Group'. None treats all subjects as one group.
+    subject : str
+        The column identifying the subjects. Default is 'Animal'. None compares GMTs.
+    baseline : object
+        The baseline timepoint. Default is None (the first timepoint).
+    zeros, lod, offset
+        See geometric_mean_titers.
+
+    Returns
+    -------
+    fold_change : pandas.DataFrame
+        One row per group and timepoint with n, log2_fold_change and fold_change.
+    """
+    if baseline is None:
+        baseline = data[timepoint].min()
+    keys = [timepoint] if by is None else [by, timepoint]
+    logs = pd.Series(log_titers(data[value], zeros, lod, offset), index=data.index)
+
+    if subject is None or subject not in data.columns: # Ratio of GMTs
+        means = logs.groupby(_categorical_keys(data, keys), observed=True, sort=True).agg(['count', 'mean'])
+        means.index.names = keys
+        base = means.xs(baseline, level=timepoint)['mean']
+        difference = means['mean'] - (base.reindex(means.index.droplevel(timepoint)).to_numpy() if by is not None
+                                      else base.iloc[0])
+        result = pd.DataFrame({'n': means['count'], 'log2_fold_change': difference})
+    else: # Geometric mean of the per-subject fold changes
+        subject_logs = logs.groupby(_categorical_keys(data, [subject] + keys), observed=True, sort=True).mean()
+        subject_logs.index.names = [subject] + keys
+        base = subject_logs.xs(baseline, level=timepoint)
+        base_index = subject_logs.index.droplevel(timepoint)
+        changes = subject_logs - base.reindex(base_index).to_numpy()
+        result = changes.groupby(level=keys, observed=True, sort=True).agg(['count', 'mean'])
+        result.columns = ['n', 'log2_fold_change']
+
+    result['fold_change'] = np.exp2(result['log2_fold_change'])
+    return result
@@ -0,0 +1,228 @@
+"""
+Permutation and bootstrap inference for the ANOVA F statistic and the regression slope.
+
+Resamples are generated as batched index arrays and the statistic of a whole block of
+resamples is computed with a few array operations. The block size follows from a memory
+budget, and the resamples are spread over worker processes, each with its own random
+stream spawned from one seed. Results are reproducible for a given seed, number of
+workers and memory budget. The seed can also be a numpy SeedSequence, e.g. a child
+spawned per group when several regressions are resampled, and the slope functions can
+share one process pool (executor) between calls.
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+MEMORY_BUDGET = 256_000_000 # bytes per worker
+
+
+def _block_size(n, arrays, memory_budget):
+    """Number of resamples per block so that `arrays` float64/int64 arrays of n values fit the budget."""
+    return max(1, int(memory_budget // (8 * n * arrays)))
+
+
+def _f_statistics(samples, onehot, counts):
+    """1-way ANOVA F statistic for every row of samples (resamples x observations)."""
+    n = samples.shape[1]
+    k = onehot.shape[1]
+    total = samples.sum(axis=1)
+    ss_total = np.sum(samples**2, axis=1) - total**2 / n
+    ss_between = np.sum((samples @ onehot)**2 / counts, axis=1) - total**2 / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (ss_between / (k - 1)) / ((ss_total - ss_between) / (n - k))
+
+
+def _slopes(x_samples, y_samples):
+    """Least-squares slope for every row of x_samples and y_samples."""
+    x_centered = x_samples - x_samples.mean(axis=1, keepdims=True)
+    y_centered = y_samples - y_samples.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(x_centered * y_centered, axis=1) / np.sum(x_centered**2, axis=1)
+
+
+def _resample_worker(task):
+    """Compute the statistic for task['n_resamples'] resamples, one block at a time."""
+    method = task["method"]
+    rng = np.random.default_rng(task["seed"])
+    first, second = task["first"], task["second"]
+    n = len(first)
+    statistics = []
+
+    remaining = task["n_resamples"]
+    while remaining > 0:
+        size = min(task["block_size"], remaining)
+        remaining -= size
+
+        if method in ["anova-permutation", "slope-permutation"]: # Shuffle the values between positions
+            index = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+        else: # Draw with replacement
+            index = rng.integers(0, n, size=(size, n))
+
+        if method in ["anova-permutation", "anova-bootstrap"]: # first: values (residuals), second: group one-hot
+            statistics.append(_f_statistics(first[index], second, task["counts"]))
+        elif method == "slope-permutation": # first: centered x, second: y
+            statistics.append(second[index] @ first / np.sum(first**2))
+        else: # slope-bootstrap, first: x, second: y
+            statistics.append(_slopes(first[index], second[index]))
+
+    return np.concatenate(statistics) if statistics else np.empty(0)
+
+
+def _run(method, first, second, n_resamples, seed, workers, memory_budget, counts=None, arrays=3, executor=None):
+    """Split the resamples over the workers (or the processes of executor) and collect the statistics."""
+    workers = max(1, int(workers or 1))
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(workers)
+    shares = [n_resamples // workers + (number < n_resamples % workers) for number in range(workers)]
+    tasks = [{"method": method,
+              "first": first,
+              "second": second,
+              "counts": counts,
+              "n_resamples": share,
+              "seed": worker_seed,
+              "block_size": _block_size(len(first), arrays, memory_budget)}
+             for share, worker_seed in zip(shares, seeds)]
+
+    if executor is not None:
+        return np.concatenate(list(executor.map(_resample_worker, tasks)))
+    if workers == 1:
+        return _resample_worker(tasks[0])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.concatenate(list(executor.map(_resample_worker, tasks)))
+
+
+def _groups(values, groups):
+    """Drop missing values and return the values, group codes, one-hot matrix and group sizes."""
+    import pandas as pd
+
+    values = np.asarray(values, dtype=float)
+    codes = pd.factorize(np.asarray(groups), sort=True)[0]
+    keep = ~np.isnan(values) & (codes >= 0)
+    values, codes = values[keep], pd.factorize(codes[keep], sort=True)[0]
+    values = values - values.mean() # F does not change with a shift, and centered sums of squares do not cancel
+    k = codes.max() + 1
+    if k < 2:
+        raise ValueError("At least two groups are required")
+    onehot = np.zeros((len(values), k))
+    onehot[np.arange(len(values)), codes] = 1
+    return values, codes, onehot, onehot.sum(axis=0)
+
+
+def anova_permutation_test(values, groups, n_resamples=9999, seed=None, workers=1, memory_budget=MEMORY_BUDGET):
+    """
+    Permutation test of a 1-way ANOVA: the group labels are shuffled n_resamples times.
+
+    Parameters
+    ----------
+    values : array_like
+        The dependent variable.
+    groups : array_like
+        The group of every value.
+    n_resamples : int
+        Number of permutations. Default is 9999.
+    seed : int or numpy.random.SeedSequence
+        Seed for the random number generators. Default is None.
+    workers : int
+        Number of worker processes. Default is 1.
+    memory_budget : float
+        Approximate memory per worker for one block of resamples, in bytes. Default is 256 MB.
+
+    Returns
+    -------
+    result : dict
+        The observed F statistic, the permutation p-value and the number of resamples.
+    """
+    values, codes, onehot, counts = _groups(values, groups)
+    observed = _f_statistics(values[np.newaxis, :], onehot, counts)[0]
+    permuted = _run("anova-permutation", values, onehot, n_resamples, seed, workers, memory_budget, counts)
+    p_value = (np.sum(permuted >= observed) + 1) / (n_resamples + 1)
+    return {"F": observed, "p_value": p_value, "n_resamples": n_resamples, "method": "permutation"}
+
+
+def anova_bootstrap_test(values, groups, n_resamples=9999, seed=None, workers=1, memory_budget=MEMORY_BUDGET):
+    """
+    Bootstrap test of a 1-way ANOVA.
+
+    The null distribution of F is built by resampling the group-centered values (the data
+    with every group shifted to a common mean) with replacement into the observed groups.
+    See anova_permutation_test for the parameters.
+
+    Returns
+    -------
+    result : dict
+        The observed F statistic, the bootstrap p-value and the number of resamples.
+    """
+    values, codes, onehot, counts = _groups(values, groups)
+    observed = _f_statistics(values[np.newaxis, :], onehot, counts)[0]
+    residuals = values - (values @ onehot / counts)[codes]
+    resampled = _run("anova-bootstrap", residuals, onehot, n_resamples, seed, workers, memory_budget, counts)
+    p_value = (np.sum(resampled >= observed) + 1) / (n_resamples + 1)
+    return {"F": observed, "p_value": p_value, "n_resamples": n_resamples, "method": "bootstrap"}
+
+
+def _pairs(x, y):
+    """Drop incomplete (x, y) pairs."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = ~np.isnan(x) & ~np.isnan(y)
+    return x[keep], y[keep]
+
+
+def slope_permutation_test(x, y, n_resamples=9999, seed=None, workers=1, memory_budget=MEMORY_BUDGET, executor=None):
+    """
+    Two-sided permutation test of a regression slope: y is shuffled against x.
+
+    Parameters
+    ----------
+    x, y : array_like
+        The independent and dependent variable.
+    n_resamples, seed, workers, memory_budget
+        See anova_permutation_test.
+    executor : concurrent.futures.Executor
+        Process pool to run the resamples in, shared between calls. Default is None (a pool is
+        started for this call when workers > 1).
+
+    Returns
+    -------
+    result : dict
+        The observed slope, the permutation p-value and the number of resamples.
+    """
+    x, y = _pairs(x, y)
+    x_centered = x - x.mean()
+    observed = _slopes(x[np.newaxis, :], y[np.newaxis, :])[0]
+    permuted = _run("slope-permutation", x_centered, y, n_resamples, seed, workers, memory_budget, arrays=2,
+                    executor=executor)
+    p_value = (np.sum(np.abs(permuted) >= np.abs(observed)) + 1) / (n_resamples + 1)
+    return {"slope": observed, "p_value": p_value, "n_resamples": n_resamples, "method": "permutation"}
+
+
+def slope_bootstrap(x, y, n_resamples=9999, seed=None, workers=1, memory_budget=MEMORY_BUDGET, confidence=0.95,
+                    executor=None):
+    """
+    Bootstrap confidence interval of a regression slope, resampling (x, y) pairs.
+
+    Parameters
+    ----------
+    x, y : array_like
+        The independent and dependent variable.
+    n_resamples, seed, workers, memory_budget
+        See anova_permutation_test.
+    confidence : float
+        Coverage of the percentile interval. Default is 0.95.
+    executor : concurrent.futures.Executor
+        See slope_permutation_test.
+
+    Returns
+    -------
+    result : dict
+        The observed slope, the bootstrap standard error, the interval bounds and the number of resamples.
+    """
+    x, y = _pairs(x, y)
+    observed = _slopes(x[np.newaxis, :], y[np.newaxis, :])[0]
+    resampled = _run("slope-bootstrap", x, y, n_resamples, seed, workers, memory_budget, arrays=4, executor=executor)
+    resampled = resampled[np.isfinite(resampled)] # Resamples with a constant x have no slope
+    tail = (1 - confidence) / 2 * 100
+    ci_low, ci_high = np.percentile(resampled, [tail, 100 - tail])
+    return {"slope": observed, "stderr": resampled.std(ddof=1), "ci_low": ci_low, "ci_high": ci_high,
+            "n_resamples": n_resamples, "method": "bootstrap"}
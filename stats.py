@@ -1,142 +1,533 @@
-import subprocess
-from Bio.Align.Applications import MafftCommandline
-from Bio import AlignIO
-from io import StringIO
-
-print("executing stats.py")
-
-# Get user input
-user_input = input("What test would you like to run? (ANOVA, power analysis, linaer regression, sequence alignment, RAxML tree generation) ")
-
-# Check to see if the user input is valid
-if user_input == "ANOVA":
-        print("executing anova.py")
-        answer = input("Would you like to use the default values? (y/n) ")
-        if answer == "y":
-                path = "data.csv"
-                x_col = "Group"
-                y_col = "Antibody"
-                group = "Group"
-                model = "1-way"
-                subprocess.call(["python", "anova.py", "-d", path, "-x", x_col, "-y", y_col, "-g", group, "-m", model])
-        elif answer == "n":
-                path = input("What is the path to the data file? default is 'data.csv' ")
-                x_col = input("What is the name of the column containing the independent variable? default is 'Group' ")
-                y_col = input("What is the name of the column containing the dependent variable? default is 'Antibody' ")
-                group = input("What is the name of the column containing the group variable? default is 'Group' ")
-                model = input("What is the type of ANOVA to be performed? default is '1-way' ")
-                subprocess.call(["python", "anova.py", "-d", path, "-x", x_col, "-y", y_col, "-g", group, "-m", model])
-        else:
-                print("Invalid input. Please try again.")
-        
-elif user_input == "power analysis":
-        print("executing power_analysis.py")
-        answer = input("Would you like to use the default values? (y/n) ")
-        if answer == "y":
-                effect_size = "0.5"
-                power = "0.8"
-                alpha = "0.05"
-                test = "ANOVA"
-                subprocess.call(["python", "power_analysis.py", "-e", effect_size, "-p", power, "-a", alpha, "-t", test])
-        elif answer == "n":
-                effect_size = input("What is the effect size? default is 0.5 ")
-                power = input("What is the power? default is 0.8 ")
-                alpha = input("What is the alpha? default is 0.05 ")
-                test = input("What is the test? default is 'ANOVA' ")
-                subprocess.call(["python", "power_analysis.py", "-e", effect_size, "-p", power, "-a", alpha, "-t", test])
-        else:
-                print("Invalid input. Please try again.")
-
-elif user_input == "linear regression":
-        print("executing linear_regression.py")
-        answer = input("Would you like to use the default values? (y/n) ")
-        if answer == "y": # Default values
-                x = "petal_length_cm"
-                y = "sepal_length_cm"
-                x_lab = "Petal Length (cm)"
-                y_lab = "Sepal Length (cm)"
-                output = "linear_regression"
-                group = "species"
-                path = "iris.csv"
-                save_plots = "True"
-                point_color = "b"
-                line_color = "r"
-                subprocess.call(["python", "linear_regression.py", "-x", x, "-y", y, "-x_lab", x_lab, "-y_lab", y_lab, "-output", output, "-group", group, "-path", path, "-save_plots", save_plots, "-point_color", point_color, "-line_color", line_color])
-        elif answer == "n": # User defined values
-                x = input("What is the name of the column containing the independent variable? default is 'petal_length_cm' ")
-                y = input("What is the name of the column containing the dependent variable? default is 'sepal_length_cm' ")
-                x_lab = input("What is the label for the x-axis? default is 'Petal Length (cm)' ")
-                y_lab = input("What is the label for the y-axis? default is 'Sepal Length (cm)' ")
-                output = input("What is the name of the output file? default is 'linear_regression' ")
-                group = input("What is the name of the column containing the group variable? default is 'species' ")
-                path = input("What is the path to the data file? default is 'iris.csv' ")
-                save_plots = input("Would you like to save the plots? default is 'True' ")
-                point_color = input("What color would you like the points to be? default is 'b' ")
-                line_color = input("What color would you like the line to be? default is 'r' ")
-                subprocess.call(["python", "linear_regression.py", "-x", x, "-y", y, "-x_lab", x_lab, "-y_lab", y_lab, "-output", output, "-group", group, "-path", path, "-save_plots", save_plots, "-point_color", point_color, "-line_color", line_color])
-        else:
-                print("Invalid input. Please try again.")
-
-elif user_input == "sequence alignment":
-        print("executing sequence_alignment.py")
-        answer = input("Would you like to use the default values? (y/n) ")
-        if answer == "y":
-                input_file = "test.fasta"
-                output_file = "alignment.fasta"
-
-                # Execute Mafft alignment
-                mafft_cline = MafftCommandline(input=input_file)
-                stdout, stderr = mafft_cline()
-                alignment = AlignIO.read(StringIO(stdout), "fasta")
-
-                # Write output to file
-                AlignIO.write(alignment, output_file, "fasta")
-
-        elif answer == "n":
-                # Define input and output file paths
-                input_file = input("What is the path to the fasta file? default is 'test.fasta' ")
-                output_file = input("What is the name of the output file? default is 'alignment' ")
-
-                # Execute Mafft alignment
-                mafft_cline = MafftCommandline(input=input_file)
-                stdout, stderr = mafft_cline()
-                alignment = AlignIO.read(StringIO(stdout), "fasta")
-
-                # Write output to file
-                AlignIO.write(alignment, output_file, "fasta")
-        else:
-                print("Invalid input. Please try again.")
-
-elif user_input == "RAxML tree generation":
-        print("executing RAxML tree generation")
-        answer = input("Would you like to use the default values? (y/n) ")
-        if answer == "y":
-                input_file = "alignment.fasta"
-                output_file = "tree.txt"
-
-                # Read Mafft alignment and write to phylip format
-                alignment = AlignIO.read(input_file, "fasta")
-                AlignIO.write(alignment, output_file, "phylip")
-
-                # Call RAxML from command line
-                cmd = ["raxmlHPC-PTHREADS", "-T", "2", "-m", "GTRGAMMA", "-s", input_file, "-n", "output", "-p", "12345"]
-                subprocess.run(cmd)
-        elif answer == "n":
-                # Define input and output file paths
-                input_file = input("What is the path to the fasta file? default is 'test.fasta' ")
-                output_file = input("What is the name of the output file? default is 'tree' ")
-
-                # Read Mafft alignment and write to phylip format
-                alignment = AlignIO.read(input_file, "fasta")
-                AlignIO.write(alignment, output_file, "phylip")
-
-                # Call RAxML from command line
-                cmd = ["raxmlHPC-PTHREADS", "-T", "2", "-m", "GTRGAMMA", "-s", input_file, "-n", "output", "-p", "12345"]
-                subprocess.run(cmd) 
-        else: 
-                print("Invalid input. Please try again.")
-
-        
-else:
-        print("Invalid input. Please try again.")
+"""
+Driver for the analysis scripts. The analyses are called in-process, so running
+several of them in one session only pays the import cost once. Use run_analyses()
+from python, execute this file for the interactive prompts, or pass a job manifest
+with --jobs to run a batch without prompts.
 
+The analysis modules and pandas are imported by the functions that need them, so the
+prompts appear immediately and e.g. a power analysis never loads matplotlib.
+
+Every analysis runs inside an instrumentation record, so its result comes with the time
+spent loading, preprocessing, fitting, rendering and in external tools (see the
+instrumentation module).
+"""
+
+import os
+import json
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+def _as_bool(value):
+    """Answers from the prompts and job files may arrive as text."""
+    if isinstance(value, str):
+        return value.strip().lower() in ["true", "y", "yes", "1"]
+    return bool(value)
+
+
+def _as_number(value):
+    """A number from the prompts and job files, or None for an empty or 'none' answer."""
+    if value is None or isinstance(value, str) and value.strip().lower() in ["", "none"]:
+        return None
+    return float(value)
+
+
+def run_anova(path="data.csv", x_col="Group", y_col="Antibody", group="Group", model="1-way", correction=None,
+              subject=None, log_titers=False, zeros="half_lod", lod=None, offset=1):
+    """Load a data file and perform an ANOVA on it. See anova.ANOVA."""
+    import anova
+    from data_cache import load_csv
+    with instrumentation.stage("load"):
+        data = load_csv(path)
+    return anova.ANOVA(data, x_col, y_col, group, model, correction, subject, log_titers=_as_bool(log_titers),
+                       zeros=zeros, lod=_as_number(lod), offset=_as_number(offset))
+
+
+def run_power_analysis(effect_size=0.5, power=0.8, alpha=0.05, test="ANOVA", path_to_power=None):
+    """Perform a power analysis. See power_analysis.power_analysis."""
+    import power_analysis
+    return power_analysis.power_analysis(float(effect_size), float(power), float(alpha), test, path_to_power)
+
+
+def run_linear_regression(x="petal_length_cm",
+                          y="sepal_length_cm",
+                          x_lab="Petal Length (cm)",
+                          y_lab="Sepal Length (cm)",
+                          output="linear_regression",
+                          group="species",
+                          path="iris.csv",
+                          save_plots=True,
+                          point_color="b",
+                          line_color="r",
+                          log_titers=False,
+                          zeros="half_lod",
+                          lod=None,
+                          offset=1):
+    """Perform a linear regression. See linear_regression.linear_regression."""
+    import linear_regression
+    return linear_regression.linear_regression(x, y, x_lab, y_lab, output, group, path,
+                                               _as_bool(save_plots), point_color, line_color,
+                                               log_titers=_as_bool(log_titers), zeros=zeros, lod=_as_number(lod),
+                                               offset=_as_number(offset))
+
+
+def run_geometric_means(path="data.csv",
+                        value="Antibody",
+                        group="Group",
+                        timepoint="Timepoint",
+                        subject="Animal",
+                        baseline=None,
+                        output=None,
+                        zeros="half_lod",
+                        lod=None,
+                        offset=1):
+    """
+    Compute geometric mean titers and fold changes per group and timepoint. See the preprocess module.
+
+    zeros, lod and offset set how titers below the limit of detection are handled, see
+    preprocess.log_titers; a lod of None (or "none") uses the smallest positive titer.
+
+    Returns:
+    table: pandas.DataFrame - The GMT table joined with the fold change relative to the baseline timepoint.
+    """
+    import pandas as pd
+    import preprocess
+    from data_cache import load_csv
+    with instrumentation.stage("load"):
+        data = load_csv(path, [value, group, timepoint] + ([subject] if subject else []))
+    instrumentation.count(rows=len(data))
+    if baseline is not None: # Match the type of the timepoint column
+        baseline = pd.Series([baseline]).astype(data[timepoint].dtype).iloc[0]
+    with instrumentation.stage("fit"):
+        lod, offset = _as_number(lod), _as_number(offset)
+        gmt = preprocess.geometric_mean_titers(data, value, [group, timepoint], zeros, lod, offset)
+        change = preprocess.fold_change(data, value, timepoint, group, subject, baseline, zeros, lod, offset)
+        table = gmt.join(change[["log2_fold_change", "fold_change"]])
+    instrumentation.count(groups=len(table))
+    logger.info(table.to_string())
+    if output is not None:
+        table.to_csv(output)
+    return table
+
+
+def run_sequence_alignment(input_file="Test.fasta", output_file="alignment.fasta", threads=1, workers=2, deduplicate=True):
+    """
+    Align fasta file(s) with Mafft. See alignment.align and alignment.align_many.
+
+    Parameters:
+    input_file: str - A fasta file, or a directory of fasta files to align concurrently.
+    output_file: str - The aligned fasta file, or a directory for the alignments of a directory.
+    threads: int - Number of Mafft threads per alignment. Default is 1.
+    workers: int - Number of alignments running at the same time (directories only). Default is 2.
+    deduplicate: bool - Align identical sequences once and reuse cached alignments. Default is True.
+
+    Returns:
+    results: list - The output file and wall time of every alignment.
+    """
+    import alignment
+
+    with instrumentation.stage("external"):
+        if os.path.isdir(input_file):
+            return alignment.align_many(input_file, output_file, int(workers), int(threads),
+                                        deduplicated=_as_bool(deduplicate))
+        if _as_bool(deduplicate):
+            return [alignment.align_deduplicated(input_file, output_file, int(threads))]
+        return [alignment.align(input_file, output_file, int(threads))]
+
+
+def run_raxml(input_file="alignment.fasta", output_file="tree.txt", searches=1, bootstraps=0, workers=None, threads=None,
+              working_dir="raxml"):
+    """
+    Build a tree from an aligned fasta file with RAxML. See phylogeny.build_tree.
+
+    Parameters:
+    input_file: str - The aligned fasta file.
+    output_file: str - The output tree file.
+    searches: int - Number of maximum-likelihood searches run concurrently. Default is 1.
+    bootstraps: int - Number of bootstrap replicates. Default is 0.
+    workers: int - Number of RAxML runs at the same time. Default is None (from the available cores).
+    threads: int - Number of threads per run. Default is None (from the cores and site patterns).
+    working_dir: str - Directory for the RAxML files and checkpoints; finished runs are not redone. Default is "raxml".
+
+    Returns:
+    summary: dict - The alignment size, the threads used, the output file and the wall time of every run.
+    """
+    import phylogeny
+    with instrumentation.stage("external"):
+        return phylogeny.build_tree(input_file, output_file, working_dir, int(searches), int(bootstraps),
+                                    int(workers) if workers else None, int(threads) if threads else None)
+
+
+def run_distance_tree(input_file="alignment.fasta", output="alignment", metric="p", missing="-.?"):
+    """
+    Compute pairwise distances, site statistics and a neighbor-joining tree of an alignment
+    without running RAxML. See alignment_matrix.summarize.
+
+    Parameters:
+    input_file: str - The aligned fasta file.
+    output: str - The output file prefix.
+    metric: str - The distance: p, identity or jc69. Default is p.
+    missing: str - Characters treated as gaps or unknown residues. Default is "-.?".
+
+    Returns:
+    summary: dict - The alignment size, the number of variable sites, the mean identity and the files written.
+    """
+    import alignment_matrix
+    with instrumentation.stage("load"):
+        alignment = alignment_matrix.AlignmentMatrix.from_fasta(input_file, missing)
+    instrumentation.count(sequences=alignment.n_sequences, sites=alignment.n_sites)
+    with instrumentation.stage("fit"):
+        return alignment_matrix.summarize(alignment, metric, output)
+
+
+def run_pca(path="data.csv", index="Animal", columns="Timepoint", values="Antibody", group="Group", n_components=2,
+            scale=True, solver="auto", log_titers=False, output="pca", save_plots=True):
+    """
+    Principal component analysis of antibody data (CSV) or of an aligned fasta file. See pca.analyze.
+
+    Parameters:
+    path: str - A CSV file, or an aligned fasta file whose sequences are one-hot encoded.
+    index: str - Column identifying the animals.
+    columns: str - Column whose levels become the features (e.g. timepoints or antigens).
+    values: str - Column holding the titers; "none" for a wide file with one column per feature.
+    group: str - Column used to color the score plot.
+    n_components: int - Number of components. Default is 2.
+    scale: bool - Scale every feature to unit variance. Default is True.
+    solver: str - auto, full, randomized or incremental. Default is auto.
+    log_titers: bool - Use log2 titers. Default is False.
+    output: str - The output file prefix.
+    save_plots: bool - Save the score and loading plots. Default is True.
+
+    Returns:
+    summary: dict - The solver, the matrix size, the explained variance ratios and the files written.
+    """
+    import pca
+    none = lambda value: None if isinstance(value, str) and value.lower() in ["", "none"] else value
+    return pca.analyze(path, none(index), none(columns), none(values), none(group), int(n_components), _as_bool(scale),
+                       solver, log_titers=_as_bool(log_titers), output=output, save_plots=_as_bool(save_plots))
+
+
+ANALYSES = {
+    "ANOVA": run_anova,
+    "power analysis": run_power_analysis,
+    "linear regression": run_linear_regression,
+    "geometric mean titers": run_geometric_means,
+    "sequence alignment": run_sequence_alignment,
+    "RAxML tree generation": run_raxml,
+    "distance tree": run_distance_tree,
+    "PCA": run_pca,
+}
+
+
+# Options of run_analysis that configure the instrumentation instead of the analysis
+INSTRUMENTATION_OPTIONS = ["timings", "timings_file", "profile", "trace_memory"]
+
+
+def run_analysis(analysis, timings=None, timings_file=None, profile=None, trace_memory=False, **params):
+    """
+    Run a single analysis in this process.
+
+    Parameters:
+    analysis: str - One of the keys of ANALYSES (e.g. 'ANOVA', 'power analysis').
+    timings: str - Log the stage timings at the end: 'table', 'json' or None. Default is None.
+    timings_file: str - Append the stage timings to this JSON-lines file. Default is None.
+    profile: str - Profile the analysis with cProfile and save the statistics to this file. Default is None.
+    trace_memory: bool - Measure the peak memory with tracemalloc. Default is False.
+    params: keyword arguments passed on to the analysis. Missing values use the defaults.
+
+    Returns:
+    result: dict - The analysis name, its parameters, the result it returned and its timings
+                   (wall time, seconds per stage and row/group counts).
+    """
+    if analysis not in ANALYSES:
+        raise ValueError(f"Invalid analysis: {analysis}")
+    with instrumentation.run(analysis, timings, timings_file, profile, _as_bool(trace_memory)) as record:
+        result = ANALYSES[analysis](**params)
+    return {"analysis": analysis, "params": params, "result": result, "timings": record.as_dict()}
+
+
+def run_analyses(jobs, **options):
+    """
+    Run a list of analyses in one session.
+
+    Parameters:
+    jobs: list - Each job is a dict with an 'analysis' key and the parameters for that analysis,
+                 e.g. {'analysis': 'ANOVA', 'model': '2-way'}.
+    options: instrumentation options applied to every job (timings, timings_file, profile, trace_memory),
+             see run_analysis. Options given in a job take precedence. A shared profile file gets the
+             job number and analysis added to its name, e.g. run.3_ANOVA.prof, so every job keeps its profile.
+
+    Returns:
+    results: list - One result dict per job, see run_analysis.
+    """
+    results = []
+    for number, job in enumerate(jobs):
+        params = dict(_job_options(options, number, job), **job)
+        analysis = params.pop("analysis")
+        results.append(run_analysis(analysis, **params))
+    return results
+
+
+def _job_options(options, number, job):
+    """The shared instrumentation options for one job; a shared profile file gets a name per job."""
+    options = dict(options)
+    if options.get("profile") and "profile" not in job:
+        stem, extension = os.path.splitext(options["profile"])
+        options["profile"] = f"{stem}.{number}_{str(job.get('analysis')).replace(' ', '_')}{extension or '.prof'}"
+    return options
+
+
+def read_jobs(path):
+    """
+    Read a job manifest.
+
+    Parameters:
+    path: str - A .json, .yaml/.yml or .csv file. JSON and YAML files hold a list of jobs (or a
+                dict with a 'jobs' list), each a mapping with an 'analysis' key and the same
+                parameters the prompts ask for. CSV files have one job per row, an 'analysis'
+                column and one column per parameter; empty cells use the defaults.
+
+    Returns:
+    jobs: list - The jobs, in the format accepted by run_analyses.
+    """
+    import pandas as pd
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        table = pd.read_csv(path, dtype=str)
+        jobs = [{key: value for key, value in row.items() if pd.notna(value)}
+                for row in table.to_dict(orient="records")]
+    elif extension in [".yaml", ".yml"]:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to read YAML job files (pip install pyyaml)")
+        with open(path) as handle:
+            jobs = yaml.safe_load(handle)
+    elif extension == ".json":
+        with open(path) as handle:
+            jobs = json.load(handle)
+    else:
+        raise ValueError(f"Unsupported job file format: {extension}")
+
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    for number, job in enumerate(jobs): # Check every job before running any of them
+        if job.get("analysis") not in ANALYSES:
+            raise ValueError(f"Invalid analysis in job {number}: {job.get('analysis')}")
+    return jobs
+
+
+def _run_job(job):
+    """Run one job and time it. Failures are recorded instead of raised."""
+    params = dict(job)
+    analysis = params.pop("analysis")
+    options = {key: params.pop(key) for key in INSTRUMENTATION_OPTIONS if key in params}
+    record = None
+    try:
+        with instrumentation.run(analysis, options.get("timings"), options.get("timings_file"), options.get("profile"),
+                                 _as_bool(options.get("trace_memory", False))) as record:
+            result = ANALYSES[analysis](**params)
+        status, error = "ok", ""
+    except Exception as exception:
+        result = None
+        status, error = "failed", f"{type(exception).__name__}: {str(exception).strip()}"
+    if record is None: # The run failed before it started, e.g. a profiler was already active
+        wall_time, timings = None, {"stages": {}, "counts": {}}
+    else:
+        wall_time, timings = record.wall_time, record.as_dict()
+    return {"analysis": analysis, "params": params, "result": result,
+            "status": status, "error": error, "wall_time": wall_time, "timings": timings}
+
+
+def run_batch(jobs, workers=None, output=None, **options):
+    """
+    Run a list of jobs across a pool of worker processes.
+
+    Parameters:
+    jobs: list or str - The jobs (see run_analyses) or the path to a job manifest (see read_jobs).
+    workers: int - Number of worker processes. Default is None (one per CPU). 1 runs the jobs in this process.
+    output: str - Path to save the summary table as a csv file. Default is None (not saved).
+    options: instrumentation options applied to every job, see run_analyses.
+
+    Returns:
+    summary: pandas.DataFrame - One row per job with its parameters, status, error, wall time, seconds per stage,
+                                row/group counts and result.
+    results: list - The full result of each job, in the order of the jobs.
+    """
+    import pandas as pd
+    if isinstance(jobs, str):
+        jobs = read_jobs(jobs)
+    jobs = [dict(_job_options(options, number, job), **job) for number, job in enumerate(jobs)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_job, jobs))
+    total_time = time.perf_counter() - start
+
+    summary = pd.DataFrame({
+        "job": range(len(results)),
+        "analysis": [result["analysis"] for result in results],
+        "params": [json.dumps(result["params"], default=str) for result in results],
+        "status": [result["status"] for result in results],
+        "error": [result["error"] for result in results],
+        "wall_time": [result["wall_time"] for result in results],
+        **{f"{stage}_time": [result["timings"]["stages"].get(stage, 0.0) for result in results]
+           for stage in instrumentation.STAGES},
+        "counts": [json.dumps(result["timings"]["counts"], default=str) for result in results],
+        "result": [str(result["result"]).replace("\n", " ") for result in results],
+    })
+
+    logger.info(f"Ran {len(results)} jobs in {total_time:.2f} s "
+                f"({(summary['status'] != 'ok').sum()} failed)")
+    if output is not None:
+        summary.to_csv(output, index=False)
+        logger.info(f"Summary saved to {output}")
+
+    return summary, results
+
+
+# Interactive prompts for each analysis: (parameter, question, default)
+PROMPTS = {
+    "ANOVA": [
+        ("path", "What is the path to the data file?", "data.csv"),
+        ("x_col", "What is the name of the column containing the independent variable?", "Group"),
+        ("y_col", "What is the name of the column containing the dependent variable?", "Antibody"),
+        ("group", "What is the name of the column containing the group variable?", "Group"),
+        ("model", "What is the type of ANOVA to be performed?", "1-way"),
+    ],
+    "power analysis": [
+        ("effect_size", "What is the effect size?", "0.5"),
+        ("power", "What is the power?", "0.8"),
+        ("alpha", "What is the alpha?", "0.05"),
+        ("test", "What is the test?", "ANOVA"),
+    ],
+    "linear regression": [
+        ("x", "What is the name of the column containing the independent variable?", "petal_length_cm"),
+        ("y", "What is the name of the column containing the dependent variable?", "sepal_length_cm"),
+        ("x_lab", "What is the label for the x-axis?", "Petal Length (cm)"),
+        ("y_lab", "What is the label for the y-axis?", "Sepal Length (cm)"),
+        ("output", "What is the name of the output file?", "linear_regression"),
+        ("group", "What is the name of the column containing the group variable?", "species"),
+        ("path", "What is the path to the data file?", "iris.csv"),
+        ("save_plots", "Would you like to save the plots?", "True"),
+        ("point_color", "What color would you like the points to be?", "b"),
+        ("line_color", "What color would you like the line to be?", "r"),
+    ],
+    "geometric mean titers": [
+        ("path", "What is the path to the data file?", "data.csv"),
+        ("value", "What is the name of the column containing the titers?", "Antibody"),
+        ("group", "What is the name of the column containing the group variable?", "Group"),
+        ("timepoint", "What is the name of the column containing the timepoints?", "Timepoint"),
+        ("subject", "What is the name of the column identifying the animals?", "Animal"),
+        ("zeros", "How should titers below the limit of detection be handled (half_lod, lod, drop or offset)?", "half_lod"),
+        ("lod", "What is the limit of detection ('none' for the smallest positive titer)?", "none"),
+    ],
+    "sequence alignment": [
+        ("input_file", "What is the path to the fasta file (or a directory of fasta files)?", "Test.fasta"),
+        ("output_file", "What is the name of the output file (or directory)?", "alignment.fasta"),
+        ("threads", "How many threads should Mafft use?", "1"),
+    ],
+    "RAxML tree generation": [
+        ("input_file", "What is the path to the aligned fasta file?", "alignment.fasta"),
+        ("output_file", "What is the name of the output file?", "tree.txt"),
+        ("searches", "How many maximum-likelihood searches should be run?", "1"),
+        ("bootstraps", "How many bootstrap replicates should be run?", "0"),
+    ],
+    "distance tree": [
+        ("input_file", "What is the path to the aligned fasta file?", "alignment.fasta"),
+        ("output", "What is the prefix of the output files?", "alignment"),
+        ("metric", "Which distance should be used (p, identity or jc69)?", "p"),
+    ],
+    "PCA": [
+        ("path", "What is the path to the data file (csv or aligned fasta)?", "data.csv"),
+        ("index", "What is the name of the column identifying the animals?", "Animal"),
+        ("columns", "What is the name of the column whose levels become the features?", "Timepoint"),
+        ("values", "What is the name of the column containing the titers ('none' for one column per feature)?", "Antibody"),
+        ("group", "What is the name of the column containing the group variable?", "Group"),
+        ("n_components", "How many components should be computed?", "2"),
+        ("scale", "Should the features be scaled to unit variance?", "True"),
+        ("output", "What is the prefix of the output files?", "pca"),
+    ],
+}
+
+
+def prompt_parameters(analysis):
+    """Ask the user for the parameters of an analysis. Empty answers use the default."""
+    answer = input("Would you like to use the default values? (y/n) ")
+    if answer == "y":
+        return {}
+    elif answer == "n":
+        return {name: input(f"{question} default is '{default}' ") or default
+                for name, question, default in PROMPTS[analysis]}
+    raise ValueError("Invalid input. Please try again.")
+
+
+def main():
+    import argparse
+
+    # Create a command-line parser object
+    parser = argparse.ArgumentParser(description="Run analyses interactively or from a job manifest.")
+    parser.add_argument("-j", "--jobs",
+                        help="Job manifest (.json, .yaml or .csv). Runs the jobs without prompts.",
+                        default=None,
+                        required=False)
+    parser.add_argument("-w", "--workers",
+                        help="Number of worker processes for the batch. Default is one per CPU.",
+                        type=int,
+                        default=None,
+                        required=False)
+    parser.add_argument("-o", "--output",
+                        help="Path to save the batch summary table as a csv file.",
+                        default=None,
+                        required=False)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure_logging(args.log_level, args.log_json)
+    options = {"timings": args.timings, "timings_file": args.timings_file, "profile": args.profile,
+               "trace_memory": args.trace_memory}
+
+    if args.jobs is not None: # Non-interactive batch mode
+        summary, results = run_batch(args.jobs, args.workers, args.output, **options)
+        print(summary[["job", "analysis", "status", "wall_time", "result"]].to_string(index=False))
+        return results
+
+    print("executing stats.py")
+
+    jobs = []
+    while True:
+        # Get user input
+        user_input = input("What test would you like to run? (ANOVA, power analysis, linear regression, geometric mean titers, sequence alignment, RAxML tree generation, distance tree, PCA) ")
+
+        # Check to see if the user input is valid
+        if user_input not in ANALYSES:
+            print("Invalid input. Please try again.")
+            continue
+
+        try:
+            params = prompt_parameters(user_input)
+        except ValueError as error:
+            print(error)
+            continue
+        jobs.append(dict(params, analysis=user_input))
+
+        if input("Would you like to run another test? (y/n) ") != "y":
+            break
+
+    results = run_analyses(jobs, **options)
+    for result in results: # Show every result, as the scripts do when run on their own
+        print(f"{result['analysis']}:")
+        print(result["result"], "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
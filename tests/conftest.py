@@ -0,0 +1,24 @@
+import os
+import sys
+import stat
+import pytest
+
+# The analysis modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_executable(tmp_path):
+    """
+    Write a Python script that stands in for an external program (MAFFT, RAxML).
+
+    Returns a function taking the script name and its body (Python source, with sys
+    and os imported) and returning the path of the executable.
+    """
+    def write(name, body):
+        path = tmp_path / "bin" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"#!{sys.executable}\nimport os\nimport sys\n{body}")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+        return str(path)
+    return write
@@ -0,0 +1,119 @@
+import os
+import glob
+import pytest
+import alignment
+
+# Stands in for MAFFT: echoes the input file (the last argument) to stdout. Inputs whose
+# name contains "fail" get half of the output and a non-zero exit code.
+ECHO = """
+with open(sys.argv[-1]) as handle:
+    text = handle.read()
+if "fail" in os.path.basename(sys.argv[-1]):
+    sys.stdout.write(text[:len(text) // 2])
+    sys.stderr.write("stub failure")
+    sys.exit(3)
+sys.stdout.write(text)
+"""
+
+FASTA = ">a\nACGU\n>b\nACGG\n>c\nACGU\n"
+
+
+@pytest.fixture
+def mafft(stub_executable, monkeypatch):
+    executable = stub_executable("mafft", ECHO)
+    monkeypatch.setenv("MAFFT_EXECUTABLE", executable)
+    return executable
+
+
+def test_mafft_command_uses_environment(mafft):
+    assert alignment.mafft_command("in.fasta", 4, ["--auto"]) == [mafft, "--thread", "4", "--auto", "in.fasta"]
+
+
+def test_align_writes_output_atomically(mafft, tmp_path):
+    source = tmp_path / "input.fasta"
+    source.write_text(FASTA)
+    output = tmp_path / "output.fasta"
+
+    result = alignment.align(str(source), str(output))
+
+    assert output.read_text() == FASTA
+    assert result["output"] == str(output)
+    assert result["wall_time"] >= 0
+    assert not glob.glob(str(tmp_path / "*.tmp"))
+
+
+def test_failed_alignment_keeps_previous_output(mafft, tmp_path):
+    source = tmp_path / "fail.fasta"
+    source.write_text(FASTA)
+    output = tmp_path / "output.fasta"
+    output.write_text("previous alignment\n")
+
+    with pytest.raises(RuntimeError, match="stub failure"):
+        alignment.align(str(source), str(output))
+
+    assert output.read_text() == "previous alignment\n" # The partial output never replaced it
+    assert not glob.glob(str(tmp_path / "*.tmp"))
+
+
+def test_missing_executable_leaves_no_temporary_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("MAFFT_EXECUTABLE", str(tmp_path / "no-mafft"))
+    source = tmp_path / "input.fasta"
+    source.write_text(FASTA)
+
+    with pytest.raises(OSError):
+        alignment.align(str(source), str(tmp_path / "output.fasta"))
+
+    assert not glob.glob(str(tmp_path / "*.tmp"))
+
+
+def test_align_missing_input(mafft, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        alignment.align(str(tmp_path / "missing.fasta"), str(tmp_path / "output.fasta"))
+
+
+def test_align_many_collects_results_in_input_order(mafft, tmp_path):
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    for name in ["one.fasta", "fail.fasta", "two.fa"]:
+        (inputs / name).write_text(FASTA)
+    (inputs / "notes.txt").write_text("not a fasta file")
+    outputs = tmp_path / "outputs"
+
+    results = alignment.align_many(str(inputs), str(outputs), workers=3)
+
+    assert [os.path.basename(result["input"]) for result in results] == ["fail.fasta", "one.fasta", "two.fa"]
+    failed, one, two = results
+    assert failed["output"] is None and "exit code 3" in failed["error"]
+    assert one["error"] == "" and two["error"] == ""
+    assert (outputs / "one_aligned.fasta").read_text() == FASTA
+    assert (outputs / "two_aligned.fa").read_text() == FASTA
+    assert sorted(os.listdir(outputs)) == ["one_aligned.fasta", "two_aligned.fa"]
+
+
+# Stands in for MAFFT with --reorder: pads every sequence with a gap and writes the
+# records in reverse order.
+REVERSE = """
+records = open(sys.argv[-1]).read().split(">")[1:]
+if "--reorder" in sys.argv:
+    records = records[::-1]
+for record in records:
+    name, sequence = record.split()
+    sys.stdout.write(f">{name}\\n-{sequence}\\n")
+"""
+
+
+def test_deduplicated_alignment_matches_sequences_by_name(stub_executable, monkeypatch, tmp_path):
+    monkeypatch.setenv("MAFFT_EXECUTABLE", stub_executable("mafft", REVERSE))
+    source = tmp_path / "input.fasta"
+    source.write_text(">a\nACGU\n>b\nACGG\n>c\nACGU\n>d\nAAAA\n")
+    output = tmp_path / "output.fasta"
+    cache = str(tmp_path / "cache")
+
+    result = alignment.align_deduplicated(str(source), str(output), options=["--reorder"], cache_dir=cache)
+    expected = [("a", "-ACGU"), ("b", "-ACGG"), ("c", "-ACGU"), ("d", "-AAAA")]
+    assert list(alignment.read_fasta(str(output))) == expected
+    assert (result["sequences"], result["unique"], result["cached"]) == (4, 3, False)
+
+    result = alignment.align_deduplicated(str(source), str(output), options=["--reorder"], cache_dir=cache)
+    assert result["cached"]
+    assert list(alignment.read_fasta(str(output))) == expected
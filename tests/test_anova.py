@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from anova import AnovaDesign, _design_formula
+
+sm = pytest.importorskip("statsmodels.api")
+smf = pytest.importorskip("statsmodels.formula.api")
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.csv")
+
+
+@pytest.fixture
+def data():
+    data = pd.read_csv(DATA, encoding="utf-8-sig")
+    data["Group"] = data["Group"].astype(str) # The repeated-measures formula references group '1'
+    data["Time"] = data["Timepoint"]
+    data["Noise"] = np.random.default_rng(0).normal(size=len(data))
+    return data
+
+
+@pytest.mark.parametrize("model, x_col", [("2-way", "Timepoint"), ("repeated-measures", "Group")])
+def test_design_matches_anova_lm(data, model, x_col):
+    # The repeated-measures formula is rank deficient: C(Group) and its Treatment coding alias
+    formula = _design_formula(model, x_col, "Group")
+    tables = AnovaDesign(data, formula).anova_tables(data[["Antibody", "Noise"]])
+    for response in ["Antibody", "Noise"]:
+        expected = sm.stats.anova_lm(smf.ols(f"{response} ~ {formula}", data).fit(), typ=2)
+        table = tables.loc[response]
+        assert list(table.index) == list(expected.index)
+        np.testing.assert_allclose(table.to_numpy(), expected.to_numpy(), rtol=1e-8, equal_nan=True)
+
+
+def _long_data(n_subjects=12, k=4, seed=1):
+    """Balanced repeated measurements of two groups with unequal variances over time."""
+    rng = np.random.default_rng(seed)
+    subjects = np.repeat(np.arange(n_subjects), k)
+    times = np.tile(np.arange(k), n_subjects)
+    groups = subjects % 2
+    values = (rng.normal(size=n_subjects)[subjects] + 0.5 * times + groups * times * 0.3
+              + rng.normal(size=n_subjects * k) * (1 + times))
+    return pd.DataFrame({"Animal": subjects, "Timepoint": times, "Group": groups, "Antibody": values})
+
+
+def test_anova_many_matches_f_oneway():
+    from scipy import stats
+    from anova import anova_many
+
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame({"Group": rng.integers(0, 4, 200), "a": rng.normal(size=200), "b": rng.normal(size=200) + 1e6})
+    data.loc[::7, "a"] = np.nan # Missing values are left out per response
+    results = anova_many(data, "Group", ["a", "b"])
+    for column in ["a", "b"]:
+        groups = [group[column].dropna() for _, group in data.groupby("Group")]
+        expected = stats.f_oneway(*groups)
+        assert results.loc[column, "F"] == pytest.approx(expected.statistic, rel=1e-9)
+        assert results.loc[column, "p_value"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_repeated_measures_matches_ols_sums_of_squares():
+    from anova import repeated_measures_anova
+
+    data = _long_data()
+    result = repeated_measures_anova(data, "Animal", "Timepoint", "Antibody", between="Group")
+    data["Nested"] = data["Animal"] // 2 # Subjects are numbered within their group
+    model = smf.ols("Antibody ~ C(Group) + C(Group):C(Nested) + C(Timepoint) + C(Group):C(Timepoint)", data).fit()
+    expected = sm.stats.anova_lm(model, typ=1)
+    for row, term in [("Group", "C(Group)"), ("Subject", "C(Group):C(Nested)"), ("Timepoint", "C(Timepoint)"),
+                      ("Group:Timepoint", "C(Group):C(Timepoint)"), ("Residual", "Residual")]:
+        assert result.loc[row, "SS"] == pytest.approx(expected.loc[term, "sum_sq"], rel=1e-9)
+        assert result.loc[row, "DF"] == expected.loc[term, "df"]
+
+
+def test_repeated_measures_matches_anova_rm_and_epsilon():
+    from statsmodels.stats.anova import AnovaRM
+    from anova import repeated_measures_anova
+
+    data = _long_data()
+    result = repeated_measures_anova(data, "Animal", "Timepoint", "Antibody")
+    expected = AnovaRM(data, "Antibody", "Animal", ["Timepoint"]).fit().anova_table
+    assert result.loc["Timepoint", "F"] == pytest.approx(expected.loc["Timepoint", "F Value"], rel=1e-9)
+    assert result.loc["Timepoint", "p-unc"] == pytest.approx(expected.loc["Timepoint", "Pr > F"], rel=1e-9)
+
+    # Greenhouse-Geisser from the double-centered covariance, Huynh-Feldt from it
+    matrix = data.pivot(index="Animal", columns="Timepoint", values="Antibody").to_numpy()
+    n, k = matrix.shape
+    covariance = np.cov(matrix, rowvar=False)
+    centered = (covariance - covariance.mean(axis=0) - covariance.mean(axis=1)[:, np.newaxis]
+                + covariance.mean())
+    gg = np.trace(centered)**2 / ((k - 1) * np.sum(centered**2))
+    hf = min(1.0, (n * (k - 1) * gg - 2) / ((k - 1) * (n - 1 - (k - 1) * gg)))
+    assert result.loc["Timepoint", "eps-GG"] == pytest.approx(gg, rel=1e-9)
+    assert result.loc["Timepoint", "eps-HF"] == pytest.approx(max(gg, hf), rel=1e-9)
+
+
+@pytest.mark.parametrize("model, y_col", [("2-way", "Antibody"), ("repeated-measures", "Antibody"),
+                                          ("1-way", ["Antibody", "Noise"]), ("1-way", "all")])
+def test_resampling_rejects_other_models(data, model, y_col):
+    from anova import ANOVA
+
+    with pytest.raises(ValueError, match="Resampling"):
+        ANOVA(data, "Group", y_col, "Group", model, resampling="permutation")
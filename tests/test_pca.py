@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pca import pca, incremental_pca
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(3)
+    latent = rng.normal(size=(600, 3)) * [5, 2, 1]
+    matrix = latent @ rng.normal(size=(3, 40)) + rng.normal(size=(600, 40)) * 0.1 + 1e4 # Large feature means
+    return pd.DataFrame(matrix, columns=[f"f{number}" for number in range(40)])
+
+
+def _reference(data, n_components):
+    """Explained variance and components from the full SVD of the standardized matrix."""
+    matrix = data.to_numpy()
+    matrix = (matrix - matrix.mean(axis=0)) / matrix.std(axis=0, ddof=1)
+    _, singular_values, components = np.linalg.svd(matrix, full_matrices=False)
+    return singular_values[:n_components]**2 / (len(matrix) - 1), components[:n_components]
+
+
+def _assert_matches(result, data, n_components, rtol):
+    variance, components = _reference(data, n_components)
+    np.testing.assert_allclose(result["explained_variance"], variance, rtol=rtol)
+    # Components are unique up to their sign
+    overlap = np.abs(np.sum(result["loadings"].to_numpy().T * components, axis=1))
+    np.testing.assert_allclose(overlap, 1, atol=rtol)
+
+
+@pytest.mark.parametrize("solver", ["full", "randomized"])
+def test_pca_solvers_match_svd(data, solver):
+    _assert_matches(pca(data, n_components=3, solver=solver, seed=0), data, 3, 1e-6)
+
+
+def test_incremental_pca_matches_svd(data, tmp_path):
+    path = tmp_path / "data.csv"
+    data.to_csv(path, index=False)
+    result = incremental_pca(str(path), n_components=3, chunksize=100)
+    _assert_matches(result, data, 3, 1e-6)
+    np.testing.assert_allclose(np.abs(result["scores"].to_numpy()),
+                               np.abs(pca(data, n_components=3, solver="full")["scores"].to_numpy()), atol=1e-6)
@@ -0,0 +1,100 @@
+import os
+import pytest
+import phylogeny
+
+# Stands in for RAxML. Every call is logged to STUB_LOG. The "tree" lists the taxa of the
+# PHYLIP file, so a tree of another alignment is recognized. A search interrupted with
+# STUB_INTERRUPT leaves a checkpoint and fails; bootstraps write one tree per replicate;
+# -f b draws the support on the -t tree.
+RAXML = """
+arguments = sys.argv[1:]
+option = lambda flag: arguments[arguments.index(flag) + 1] if flag in arguments else None
+name, directory = option("-n"), option("-w")
+with open(os.environ["STUB_LOG"], "a") as log:
+    log.write(" ".join(arguments) + "\\n")
+with open(option("-s")) as handle:
+    taxa = [line.split()[0] for line in handle.readlines()[1:]]
+tree = "(" + ",".join(taxa) + ");\\n"
+output = lambda kind: os.path.join(directory, f"RAxML_{kind}.{name}")
+
+if option("-f") == "b":
+    open(output("bipartitions"), "w").write(open(option("-t")).read().replace(");", ")100;"))
+elif "-b" in arguments:
+    open(output("bootstrap"), "w").write(tree * int(option("-N")))
+elif os.environ.get("STUB_INTERRUPT"):
+    open(output("checkpoint") + ".0", "w").write(tree)
+    sys.exit(1)
+else:
+    open(output("bestTree"), "w").write(tree)
+    open(output("info"), "w").write(f"Final GAMMA-based Score of best tree -{len(name)}.0\\n")
+"""
+
+
+def write_alignment(path, names):
+    sequences = ["ACGUACGUAA", "ACGUACGUAC", "ACGAACGUAG", "ACGAUCGUAU", "UCGAUCGUAU"]
+    path.write_text("".join(f">{name}\n{sequence}\n" for name, sequence in zip(names, sequences)))
+    return str(path)
+
+
+@pytest.fixture
+def raxml(stub_executable, monkeypatch, tmp_path):
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("RAXML_EXECUTABLE", stub_executable("raxml", RAXML))
+    monkeypatch.setenv("STUB_LOG", str(log))
+    monkeypatch.delenv("STUB_INTERRUPT", raising=False)
+    return lambda: log.read_text().splitlines() if log.exists() else []
+
+
+def build(tmp_path, alignment, **options):
+    return phylogeny.build_tree(alignment, str(tmp_path / "tree.txt"), str(tmp_path / "raxml"), threads=2,
+                                workers=2, **options)
+
+
+def test_finished_runs_are_skipped(raxml, tmp_path):
+    alignment = write_alignment(tmp_path / "alignment.fasta", "ABCD")
+    first = build(tmp_path, alignment, searches=2, bootstraps=4)
+    assert {run["status"] for run in first["runs"]} == {"done"}
+    calls = len(raxml())
+
+    second = build(tmp_path, alignment, searches=2, bootstraps=4)
+    assert {run["status"] for run in second["runs"]} == {"skipped"}
+    assert len(raxml()) == calls # Not even the support is drawn again
+    assert (tmp_path / "tree.txt").read_text() == "(A,B,C,D)100;\n"
+
+
+def test_interrupted_search_resumes_from_checkpoint(raxml, tmp_path, monkeypatch):
+    alignment = write_alignment(tmp_path / "alignment.fasta", "ABCD")
+    monkeypatch.setenv("STUB_INTERRUPT", "1")
+    with pytest.raises(RuntimeError, match="RAxML failed"):
+        build(tmp_path, alignment)
+
+    monkeypatch.delenv("STUB_INTERRUPT")
+    summary = build(tmp_path, alignment)
+    (run,) = summary["runs"]
+    assert run["status"] == "done" and run["resumed"]
+    checkpoint = os.path.join(str(tmp_path / "raxml"), f"RAxML_checkpoint.{run['name']}.0")
+    assert raxml()[-1].endswith(f"-t {checkpoint}")
+
+
+def test_changed_alignment_is_not_skipped(raxml, tmp_path):
+    alignment = tmp_path / "alignment.fasta"
+    build(tmp_path, write_alignment(alignment, "ABCD"), bootstraps=2)
+
+    summary = build(tmp_path, write_alignment(alignment, "ABCDE"), bootstraps=2)
+    assert {run["status"] for run in summary["runs"]} == {"done"}
+    assert (tmp_path / "tree.txt").read_text() == "(A,B,C,D,E)100;\n"
+    assert (tmp_path / "tree_bootstrap.txt").read_text() == "(A,B,C,D,E);\n" * 2
+
+
+def test_changed_settings_are_not_skipped(raxml, tmp_path):
+    alignment = write_alignment(tmp_path / "alignment.fasta", "ABCD")
+    build(tmp_path, alignment, bootstraps=2)
+
+    # More replicates: a chunk with the same seeds and size is reused, the support is redrawn
+    summary = build(tmp_path, alignment, bootstraps=3)
+    assert [run["status"] for run in summary["runs"] if run["kind"] == "support"] == ["done"]
+    assert (tmp_path / "tree_bootstrap.txt").read_text() == "(A,B,C,D);\n" * 3
+
+    for options in [{"seed": 1}, {"model": "GTRCAT"}]:
+        summary = build(tmp_path, alignment, bootstraps=2, **options)
+        assert {run["status"] for run in summary["runs"]} == {"done"}, options
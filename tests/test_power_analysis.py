@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from power_analysis import grid_power, solve_sample_size
+
+smp = pytest.importorskip("statsmodels.stats.power")
+
+
+@pytest.mark.parametrize("test, reference, keyword", [
+    ("ANOVA", smp.FTestAnovaPower, {"k_groups": 3}),
+    ("t-test", smp.TTestPower, {}),
+    ("two-sample-t", smp.TTestIndPower, {}),
+    ("chi-squared", smp.GofChisquarePower, {"n_bins": 3}),
+])
+def test_power_and_sample_size_match_statsmodels(test, reference, keyword):
+    solver = reference()
+    k_groups = keyword.get("k_groups", 2)
+    dof = keyword.get("n_bins", 2) - 1
+    for effect_size, nobs, alpha in [(0.25, 60, 0.05), (0.5, 30, 0.01), (0.8, 12, 0.1)]:
+        expected = solver.power(effect_size, nobs, alpha, **keyword)
+        assert grid_power(effect_size, nobs, alpha, k_groups, test, dof) == pytest.approx(expected, rel=1e-6)
+
+        solved = solve_sample_size(effect_size, expected, alpha, k_groups, test, dof) # Reached at exactly nobs
+        assert solved == pytest.approx(nobs, abs=1e-4)
+
+
+def test_solve_sample_size_grid():
+    effect_sizes = np.array([0.1, 0.25, 0.4])[:, np.newaxis]
+    powers = np.array([0.8, 0.9])[np.newaxis, :]
+    solved = solve_sample_size(effect_sizes, powers, 0.05, k_groups=4)
+    expected = [[smp.FTestAnovaPower().solve_power(effect, nobs=None, alpha=0.05, power=power, k_groups=4)
+                 for power in powers[0]] for effect in effect_sizes[:, 0]]
+    np.testing.assert_allclose(solved, expected, rtol=1e-4)
+
+
+def test_unsolvable_sample_size_is_nan():
+    solved = solve_sample_size([0.0, 0.5], 0.8, 0.05, test="chi-squared")
+    assert np.isnan(solved[0]) and np.isfinite(solved[1])
@@ -0,0 +1,22 @@
+import os
+from unittest import mock
+import instrumentation
+import stats
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.csv")
+
+
+def test_job_that_fails_before_its_run_starts_is_reported():
+    with mock.patch.object(instrumentation, "Run", side_effect=RuntimeError("no record")):
+        summary, results = stats.run_batch([{"analysis": "power analysis", "test": "t-test"}], workers=1)
+    assert summary.loc[0, "status"] == "failed"
+    assert "no record" in summary.loc[0, "error"]
+    assert results[0]["wall_time"] is None
+
+
+def test_pca_job_reports_its_stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Keeps the data cache out of the repository
+    job = {"analysis": "PCA", "path": DATA, "save_plots": False, "output": str(tmp_path / "pca")}
+    summary, _ = stats.run_batch([job], workers=1)
+    assert summary.loc[0, "status"] == "ok"
+    assert summary.loc[0, "fit_time"] > 0 and summary.loc[0, "load_time"] > 0